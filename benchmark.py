@@ -0,0 +1,648 @@
+"""
+性能基准脚本
+用法: python benchmark.py [基准名称 ...]，不指定名称时运行全部基准
+"""
+
+import copy
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from difflib import SequenceMatcher
+from itertools import accumulate
+from typing import Any, Callable, Dict, List
+
+# 在临时目录中运行：导入logger时创建的日志文件（logs/app.log）和各基准的相对路径都不会写入仓库
+WORK_DIR = tempfile.mkdtemp(prefix="maa-benchmark-")
+os.chdir(WORK_DIR)
+
+from chapter_reader import ChapterReader
+from chapter_scheduler import ChapterScheduler
+from chapter_store import FolderChapterStore, SegmentChapterStore
+from coin_ledger import CoinLedger
+from config_manager import ConfigManager
+from novel_processor import NovelProcessor
+from page_stitcher import PageStitcher
+from scroll_controller import ScrollController
+
+
+def _prefill_progress(config_manager: ConfigManager, novel_name: str, chapter_count: int) -> None:
+    """预先填充指定数量的章节进度（不触发写盘）"""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with config_manager._hold_all_locks():
+        config_manager.stats["novel_progress"][novel_name] = {
+            f"第{i}章": {"device_id": "device_001", "timestamp": timestamp}
+            for i in range(1, chapter_count + 1)
+        }
+
+
+def bench_stats_persist(chapter_count: int = 10000, sync_updates: int = 100, coalesced_updates: int = 10000) -> None:
+    """对比同步全量写入、合并写入与日志追加在大量章节进度下的吞吐"""
+    print(f"== stats_persist: 已有 {chapter_count} 章进度 ==")
+    modes = (
+        # 名称, 存储后端, 合并窗口, 日志压缩阈值（0表示每次修改都写完整快照）, 更新次数
+        ("同步全量写入", "json", 0, 0, sync_updates),
+        ("合并全量写入", "json", 0.2, 0, coalesced_updates),
+        ("日志追加", "json", 0.2, 1024 * 1024, coalesced_updates),
+        ("SQLite", "sqlite", 0, 0, coalesced_updates),
+    )
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for index, (label, backend, flush_interval, journal_max_bytes, updates) in enumerate(modes):
+            config_file = os.path.join(tmp_dir, f"config_{index}.json")
+            stats_file = os.path.join(tmp_dir, f"stats_{index}.json")
+            config_manager = ConfigManager(config_file, stats_file, flush_interval=flush_interval,
+                                           journal_max_bytes=journal_max_bytes, stats_backend=backend)
+            _prefill_progress(config_manager, "测试小说", chapter_count)
+            with config_manager._hold_all_locks():
+                config_manager._save_stats(config_manager.stats)
+            config_manager.flush()
+            writes_before = getattr(config_manager._store, "write_count", 0)
+
+            start = time.perf_counter()
+            for i in range(updates):
+                config_manager.update_novel_progress("测试小说", f"新章节{i}", "device_002")
+            config_manager.close()
+            elapsed = time.perf_counter() - start
+
+            print(f"{label}: {updates} 次更新耗时 {elapsed:.3f}s, {updates / elapsed:.0f} 次更新/秒", end="")
+            if backend == "json":
+                writes = config_manager._store.write_count - writes_before
+                print(f", 快照写盘 {writes} 次", end="")
+            print()
+
+
+def _legacy_use_coins(coins: List[Dict[str, Any]], amount: int) -> bool:
+    """旧版use_coins的扣除逻辑：每次按过期时间字符串全量排序后线性扣除"""
+    if sum(coin["balance"] for coin in coins) < amount:
+        return False
+    coins.sort(key=lambda x: x["expire_time"])
+    remaining = amount
+    for coin in coins:
+        if remaining <= 0:
+            break
+        if coin["balance"] > 0:
+            used = min(coin["balance"], remaining)
+            coin["balance"] -= used
+            remaining -= used
+    return True
+
+
+def bench_coin_ledger(grant_count: int = 100000, legacy_spends: int = 50, ledger_spends: int = 20000) -> None:
+    """对比旧版线性扣除与代币账本在大量代币下的扣除耗时"""
+    print(f"== coin_ledger: {grant_count} 条代币 ==")
+    base = datetime(2030, 1, 1)
+    coins = [
+        {"id": i + 1, "device_serial": f"device_{i % 32:03d}", "amount": 10,
+         "expire_time": (base + timedelta(minutes=(i * 7919) % grant_count)).strftime("%Y-%m-%d %H:%M:%S"),
+         "balance": 10}
+        for i in range(grant_count)
+    ]
+
+    legacy_coins = copy.deepcopy(coins)
+    start = time.perf_counter()
+    for _ in range(legacy_spends):
+        _legacy_use_coins(legacy_coins, 12)
+    elapsed = time.perf_counter() - start
+    print(f"旧版排序+线性扣除: {legacy_spends} 次耗时 {elapsed:.3f}s, 平均 {elapsed / legacy_spends * 1e6:.0f} us/次")
+
+    start = time.perf_counter()
+    ledger = CoinLedger(copy.deepcopy(coins))
+    build_elapsed = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(ledger_spends):
+        ledger.spend(12)
+    elapsed = time.perf_counter() - start
+    print(f"代币账本: 建堆 {build_elapsed:.3f}s, {ledger_spends} 次耗时 {elapsed:.3f}s, "
+          f"平均 {elapsed / ledger_spends * 1e6:.1f} us/次, 剩余有效代币 {len(ledger)} 条, 归档 {len(ledger.archived)} 条")
+
+
+def bench_concurrency(worker_count: int = 32, rounds: int = 200, novel_count: int = 4,
+                      chapter_count: int = 500) -> None:
+    """多个设备线程同时领取章节、添加和使用代币、签到，结束后校验内存和磁盘上的状态是否一致"""
+    print(f"== concurrency: {worker_count} 个线程, 每个线程 {rounds} 轮 ==")
+    expire_time = (datetime.now() + timedelta(days=30)).strftime("%Y-%m-%d %H:%M:%S")
+    today = datetime.now().strftime("%Y-%m-%d")
+    chapters = [(f"小说{n}", f"第{c}章") for c in range(1, chapter_count + 1) for n in range(novel_count)]
+
+    for backend in ("json", "sqlite"):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            config_file = os.path.join(tmp_dir, "config.json")
+            stats_file = os.path.join(tmp_dir, "stats.json")
+            config_manager = ConfigManager(config_file, stats_file, flush_interval=0.05, stats_backend=backend)
+            granted = [0] * worker_count
+            spent = [0] * worker_count
+            completed: List[List[tuple]] = [[] for _ in range(worker_count)]
+            sign_ins = [0] * worker_count
+            barrier = threading.Barrier(worker_count)
+
+            def worker(index: int) -> None:
+                device_serial = f"device_{index:03d}"
+                barrier.wait()
+                for round_index in range(rounds):
+                    config_manager.add_coin(device_serial, 5, expire_time)
+                    granted[index] += 5
+                    if config_manager.use_coins(7, device_serial):
+                        spent[index] += 7
+                    if config_manager.claim_sign_in(device_serial, today):
+                        config_manager.finish_sign_in(device_serial, today, True)
+                        sign_ins[index] += 1
+                    # 每轮从不同位置开始领取，制造同一章节上的竞争
+                    for offset in range(len(chapters) // rounds + 1):
+                        novel_name, chapter = chapters[(round_index * 7 + offset + index) % len(chapters)]
+                        if config_manager.claim_chapter(novel_name, chapter, device_serial):
+                            config_manager.update_novel_progress(novel_name, chapter, device_serial)
+                            completed[index].append((novel_name, chapter))
+
+            threads = [threading.Thread(target=worker, args=(i,)) for i in range(worker_count)]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+
+            # 关闭前读取内存中的状态，关闭后再从磁盘重新加载比较
+            errors = []
+            expected_total = sum(granted) - sum(spent)
+            if config_manager.get_total_coins() != expected_total:
+                errors.append(f"代币余额 {config_manager.get_total_coins()} != {expected_total}")
+            if sum(coin["balance"] for coin in config_manager.get_stats()["coins"]) != expected_total:
+                errors.append("有效代币余额之和与账本总余额不一致")
+            spend_count = sum(spent) // 7
+            if config_manager._coin_transactions.count() != worker_count * rounds + spend_count:
+                errors.append("代币流水条数与添加、使用次数不一致")
+            all_completed = [item for items in completed for item in items]
+            if len(all_completed) != len(set(all_completed)):
+                errors.append("存在被多个设备重复处理的章节")
+            if sum(sign_ins) != worker_count:
+                errors.append(f"签到记录 {sum(sign_ins)} 次，应为 {worker_count} 次")
+            if any(config_manager._chapter_claims.values()):
+                errors.append("存在未释放的章节领取")
+            config_manager.close()
+
+            reloaded = ConfigManager(config_file, stats_file, stats_backend=backend)
+            progress_count = sum(len(chapters) for chapters in reloaded.get_stats()["novel_progress"].values())
+            if reloaded.get_total_coins() != expected_total:
+                errors.append(f"重新加载后代币余额 {reloaded.get_total_coins()} != {expected_total}")
+            if progress_count != len(all_completed):
+                errors.append(f"重新加载后章节进度 {progress_count} != {len(all_completed)}")
+            reloaded.close()
+
+            operations = worker_count * rounds * 3 + len(all_completed)
+            print(f"{backend}: 耗时 {elapsed:.3f}s, {operations / elapsed:.0f} 次操作/秒, "
+                  f"完成章节 {len(all_completed)}/{len(chapters)}, 剩余代币 {expected_total}")
+            if errors:
+                raise RuntimeError(f"{backend} 并发一致性校验失败: {'; '.join(errors)}")
+
+
+def bench_scheduler(chapter_count: int = 400, chapter_seconds: float = 0.002, slow_factor: float = 4.0) -> None:
+    """模拟多台速度不同的设备（第一台最慢），对比静态平均分配与工作窃取的总耗时"""
+    print(f"== scheduler: {chapter_count} 章, 每章 {chapter_seconds * 1000:.0f}ms, 慢设备慢 {slow_factor:.0f} 倍 ==")
+    chapters = [f"第{i}章" for i in range(1, chapter_count + 1)]
+
+    def process(worker: str, chapter: str) -> None:
+        time.sleep(chapter_seconds * (slow_factor if worker == "device_000" else 1))
+
+    for device_count in (1, 2, 4, 8):
+        workers = [f"device_{i:03d}" for i in range(device_count)]
+        # 静态分配: 每台设备只处理自己的区间
+        static = ChapterScheduler(chapters, workers, work_stealing=False)
+        start = time.perf_counter()
+        static.run(process)
+        static_elapsed = time.perf_counter() - start
+
+        stealing = ChapterScheduler(chapters, workers)
+        start = time.perf_counter()
+        stealing.run(process)
+        stealing_elapsed = time.perf_counter() - start
+
+        # 理想耗时: 所有设备的总处理能力平摊全部章节
+        capacity = 1 / slow_factor + (device_count - 1)
+        ideal = chapter_count * chapter_seconds / capacity
+        print(f"{device_count} 台设备: 静态分配 {static_elapsed:.3f}s, 工作窃取 {stealing_elapsed:.3f}s, "
+              f"理想 {ideal:.3f}s, 窃取章节 {sum(stealing.stolen.values())}")
+
+
+def _legacy_export(novel_dir: str, chapters: List[str], output_path: str) -> None:
+    """旧版导出逻辑：按顺序逐个打开并解析章节文件"""
+    with open(output_path, 'w', encoding='utf-8') as f:
+        for chapter_name in chapters:
+            with open(os.path.join(novel_dir, f"{chapter_name}.json"), 'r', encoding='utf-8') as cf:
+                chapter_data = json.load(cf)
+            f.write(f"\n\n{chapter_name}\n")
+            f.write("-" * 30 + "\n")
+            f.write(chapter_data.get("content", {}).get("text", ""))
+
+
+def _drop_file_cache(directory: str) -> bool:
+    """尽量将目录中的文件移出系统页缓存，模拟冷启动读取（仅支持posix_fadvise的系统）"""
+    if not hasattr(os, "posix_fadvise"):
+        return False
+    for entry in os.scandir(directory):
+        fd = os.open(entry.path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+    return True
+
+
+def bench_export(chapter_count: int = 5000, chapter_chars: int = 3000) -> None:
+    """导出大量章节：对比逐个读取与线程池预读的流式导出"""
+    print(f"== export: {chapter_count} 章, 每章约 {chapter_chars} 字 ==")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cwd = os.getcwd()
+        os.chdir(tmp_dir)
+        try:
+            config_manager = ConfigManager("config.json", "stats.json")
+            processor = NovelProcessor(config_manager)
+            novel_dir = os.path.join(processor.novels_dir, "测试小说")
+            os.makedirs(novel_dir)
+            paragraph = "这是一段用于测试导出速度的章节内容。" * (chapter_chars // 18)
+            for i in range(1, chapter_count + 1):
+                with open(os.path.join(novel_dir, f"第{i}章.json"), 'w', encoding='utf-8') as f:
+                    json.dump({"chapter_name": f"第{i}章", "content": {"text": paragraph}}, f, ensure_ascii=False)
+            chapters = processor.get_novel_chapters("测试小说")
+
+            for cold in (False, True):
+                if cold and not _drop_file_cache(novel_dir):
+                    break
+                label = "冷缓存" if cold else "热缓存"
+                start = time.perf_counter()
+                _legacy_export(novel_dir, chapters, "legacy.txt")
+                legacy_elapsed = time.perf_counter() - start
+                print(f"[{label}] 逐个读取: {legacy_elapsed:.3f}s, {chapter_count / legacy_elapsed:.0f} 章/秒")
+
+                for workers in (1, 4, 8):
+                    if cold:
+                        _drop_file_cache(novel_dir)
+                    start = time.perf_counter()
+                    processor.export_novel_to_txt("测试小说", f"stream_{workers}.txt", max_workers=workers,
+                                                  incremental=False)
+                    elapsed = time.perf_counter() - start
+                    print(f"[{label}] 流式导出({workers} 线程): {elapsed:.3f}s, {chapter_count / elapsed:.0f} 章/秒, "
+                          f"输出 {os.path.getsize(f'stream_{workers}.txt') / 1024 / 1024:.1f}MB")
+
+            # 增量导出: 新增5章后再次导出同一文件
+            for i in range(chapter_count + 1, chapter_count + 6):
+                processor.save_chapter_content("测试小说", f"第{i}章", {"text": paragraph}, "device_001")
+            start = time.perf_counter()
+            processor.export_novel_to_txt("测试小说", "stream_4.txt")
+            elapsed = time.perf_counter() - start
+            print(f"增量导出(新增5章): {elapsed:.3f}s")
+            config_manager.close()
+        finally:
+            os.chdir(cwd)
+
+
+def bench_chapter_store(chapter_count: int = 5000, chapter_chars: int = 3000) -> None:
+    """对比每章一个JSON文件与段文件的保存、冷启动列出章节、随机读取和导出耗时"""
+    print(f"== chapter_store: {chapter_count} 章, 每章约 {chapter_chars} 字 ==")
+    paragraph = "这是一段用于测试章节存储的内容。" * (chapter_chars // 16)
+    for storage in ("folder", "segment"):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cwd = os.getcwd()
+            os.chdir(tmp_dir)
+            try:
+                store_class = SegmentChapterStore if storage == "segment" else FolderChapterStore
+                store = store_class("novels")
+                start = time.perf_counter()
+                for i in range(1, chapter_count + 1):
+                    store.save("测试小说", f"第{i}章", {"chapter_name": f"第{i}章", "content": {"text": paragraph}})
+                save_elapsed = time.perf_counter() - start
+                store.close()
+
+                # 重新打开，模拟程序重启后的首次列出章节
+                store = store_class("novels")
+                start = time.perf_counter()
+                chapters = store.list_chapters("测试小说")
+                list_elapsed = time.perf_counter() - start
+
+                order = list(range(1, chapter_count + 1))
+                random.Random(0).shuffle(order)
+                start = time.perf_counter()
+                for i in order:
+                    store.load("测试小说", f"第{i}章")
+                load_elapsed = time.perf_counter() - start
+                store.close()
+
+                with open("config.json", 'w', encoding='utf-8') as f:
+                    json.dump({"chapter_storage": storage}, f)
+                config_manager = ConfigManager("config.json", "stats.json")
+                processor = NovelProcessor(config_manager)
+                start = time.perf_counter()
+                processor.export_novel_to_txt("测试小说", "export.txt", incremental=False)
+                export_elapsed = time.perf_counter() - start
+                processor.close()
+                config_manager.close()
+
+                disk_files = sum(len(files) for _, _, files in os.walk("novels"))
+                print(f"[{storage}] 保存 {save_elapsed:.3f}s, 列出 {len(chapters)} 章 {list_elapsed * 1000:.1f}ms, "
+                      f"随机读取 {load_elapsed:.3f}s, 导出 {export_elapsed:.3f}s, 文件数 {disk_files}")
+            finally:
+                os.chdir(cwd)
+
+
+# 模拟的常用字表及齐夫分布的累积权重
+_VOCABULARY = [chr(code) for code in random.Random(0).sample(range(0x4E00, 0x9FA5), 2500)]
+_VOCABULARY_CUM_WEIGHTS = list(accumulate(1 / rank for rank in range(1, len(_VOCABULARY) + 1)))
+
+
+def _novel_text(rng: random.Random, chars: int) -> str:
+    """生成近似真实小说的文本：从常用字表中按齐夫分布取字，夹杂标点和换行"""
+    words = rng.choices(_VOCABULARY, cum_weights=_VOCABULARY_CUM_WEIGHTS, k=chars)
+    text = []
+    position = 0
+    while position < chars:
+        length = rng.randint(8, 30)
+        text.extend(words[position:position + length])
+        text.append(rng.choice("，，，。。！？\n"))
+        position += length
+    return "".join(text[:chars])
+
+
+def bench_compression(chapter_count: int = 2000, chapter_chars: int = 3000) -> None:
+    """对比不压缩与zlib/lzma压缩章节内容的磁盘占用、保存和导出耗时"""
+    print(f"== compression: {chapter_count} 章, 每章约 {chapter_chars} 字 ==")
+    rng = random.Random(0)
+    texts = [_novel_text(rng, chapter_chars) for _ in range(chapter_count)]
+    for storage in ("folder", "segment"):
+        for compression, level in (("none", None), ("zlib", 1), ("zlib", 6), ("zlib", 9), ("lzma", 0), ("lzma", 6)):
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                cwd = os.getcwd()
+                os.chdir(tmp_dir)
+                try:
+                    with open("config.json", 'w', encoding='utf-8') as f:
+                        json.dump({"chapter_storage": storage, "chapter_compression": compression,
+                                   "chapter_compression_level": level}, f)
+                    config_manager = ConfigManager("config.json", "stats.json")
+                    processor = NovelProcessor(config_manager)
+                    start = time.perf_counter()
+                    for i, text in enumerate(texts, 1):
+                        processor.chapter_store.save("测试小说", f"第{i}章", {
+                            "novel_name": "测试小说",
+                            "chapter_name": f"第{i}章",
+                            "content": {"text": text},
+                            "device_id": "device_001",
+                            "timestamp": "2024-01-01 00:00:00"
+                        })
+                    save_elapsed = time.perf_counter() - start
+                    disk_bytes = sum(os.path.getsize(os.path.join(root, name))
+                                     for root, _, files in os.walk("novels") for name in files)
+
+                    start = time.perf_counter()
+                    processor.export_novel_to_txt("测试小说", "export.txt", incremental=False)
+                    export_elapsed = time.perf_counter() - start
+                    processor.close()
+                    config_manager.close()
+                    label = compression if level is None else f"{compression}-{level}"
+                    print(f"[{storage}/{label}] 磁盘 {disk_bytes / 1024 / 1024:.1f}MB, 保存 {save_elapsed:.3f}s, "
+                          f"导出 {export_elapsed:.3f}s")
+                finally:
+                    os.chdir(cwd)
+
+
+def _brute_force_overlap(previous: List[str], page: List[str], min_similarity: float = 0.8) -> int:
+    """逐个尝试重叠长度并逐行按相似度比较的朴素做法"""
+    for overlap in range(min(len(previous), len(page)), 0, -1):
+        if all(SequenceMatcher(None, a, b).ratio() >= min_similarity
+               for a, b in zip(previous[len(previous) - overlap:], page[:overlap])):
+            return overlap
+    return 0
+
+
+def bench_stitch(line_count: int = 20000, page_lines: int = 40, step: int = 30, noise: float = 0.05) -> None:
+    """模拟逐屏识别长章节：对比朴素的重叠查找与PageStitcher的耗时和去重准确性"""
+    print(f"== stitch: {line_count} 行, 每屏 {page_lines} 行, 每次滑动 {step} 行, 识别错误率 {noise:.0%} ==")
+    rng = random.Random(0)
+    text = _novel_text(rng, line_count * 20).replace("\n", "")
+    lines = [text[i:i + 16] for i in range(0, len(text), 16)]
+
+    def noisy(line: str) -> str:
+        if rng.random() >= noise:
+            return line
+        position = rng.randrange(len(line))
+        return line[:position] + "口" + line[position + 1:]
+
+    pages = [[noisy(line) for line in lines[start:start + page_lines]] for start in range(0, len(lines), step)]
+
+    start = time.perf_counter()
+    merged: List[str] = []
+    for page in pages:
+        merged.extend(page[_brute_force_overlap(merged, page):])
+    brute_elapsed = time.perf_counter() - start
+    print(f"朴素查找: {brute_elapsed:.3f}s, 拼接后 {len(merged)} 行（多出 {len(merged) - len(lines)} 行）")
+
+    stitcher = PageStitcher()
+    start = time.perf_counter()
+    for page in pages:
+        stitcher.add_page(page)
+    elapsed = time.perf_counter() - start
+    print(f"PageStitcher: {elapsed:.3f}s, 拼接后 {len(stitcher.lines)} 行（多出 {len(stitcher.lines) - len(lines)} 行）")
+
+
+class _SimulatedReaderDevice:
+    """模拟阅读页面的设备: 正文按行距排列，滑动后实际滚动距离 = 滑动距离 x 设备比例（带随机抖动）"""
+
+    def __init__(self, lines: List[str], line_pitch: int, ratio: float, rng: random.Random,
+                 top: int = 80, height: int = 1120):
+        self.lines = lines
+        self.line_pitch = line_pitch
+        self.ratio = ratio
+        self.rng = rng
+        self.top = top
+        self.height = height
+        self.offset = 0.0
+        self.screencaps = 0
+        self.controller = self
+
+    def post_task(self, entry: str):
+        self.screencaps += 1
+        results = []
+        for index, line in enumerate(self.lines):
+            y = self.top + index * self.line_pitch - self.offset
+            if self.top <= y and y + self.line_pitch <= self.top + self.height:
+                results.append(SimpleNamespace(text=line, box=(40, y, 640, self.line_pitch * 0.8)))
+        recognition = SimpleNamespace(all_results=results)
+        return SimpleNamespace(wait=lambda: SimpleNamespace(get=lambda: SimpleNamespace(
+            nodes=[SimpleNamespace(recognition=recognition)])))
+
+    def post_swipe(self, x1: int, y1: int, x2: int, y2: int, duration: int):
+        max_offset = max(len(self.lines) * self.line_pitch - self.height, 0)
+        self.offset = min(self.offset + (y1 - y2) * self.ratio * self.rng.uniform(0.95, 1.05), max_offset)
+        return SimpleNamespace(wait=lambda: None)
+
+
+def bench_scroll(chapter_count: int = 20, chapter_lines: int = 300) -> None:
+    """模拟不同设备和字号逐屏识别章节：对比固定滑动距离与自适应滑动距离的每章屏数和漏行数"""
+    print(f"== scroll: 每种设备 {chapter_count} 章, 每章 {chapter_lines} 行 ==")
+    rng = random.Random(0)
+    for ratio, pitch in ((1.0, 48), (1.4, 48), (0.8, 64)):
+        for adaptive in (False, True):
+            controller = ScrollController() if adaptive else None
+            screens = 0
+            lost = 0
+            for _ in range(chapter_count):
+                text = _novel_text(rng, chapter_lines * 20).replace("\n", "")
+                lines = [f"{number}{text[number * 16:(number + 1) * 16]}" for number in range(chapter_lines)]
+                device = _SimulatedReaderDevice(lines, pitch, ratio, rng)
+                reader = ChapterReader(device, settle=0, scroll_controller=controller, device="device_001")
+                stitched = reader.read().split("\n")
+                screens += device.screencaps
+                lost += len(set(lines) - set(stitched))
+            label = "自适应" if adaptive else "固定600px"
+            print(f"[比例 {ratio}, 行距 {pitch}px] {label}: 平均每章 {screens / chapter_count:.1f} 屏, 漏行 {lost}")
+
+
+def bench_search(chapter_count: int = 3000, chapter_chars: int = 2000, queries: int = 20) -> None:
+    """对比逐个读取章节文件查找与二元组倒排索引检索的耗时"""
+    print(f"== search: {chapter_count} 章, 每章约 {chapter_chars} 字 ==")
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cwd = os.getcwd()
+        os.chdir(tmp_dir)
+        try:
+            config_manager = ConfigManager("config.json", "stats.json")
+            processor = NovelProcessor(config_manager)
+            texts = {}
+            start = time.perf_counter()
+            for i in range(1, chapter_count + 1):
+                text = _novel_text(rng, chapter_chars)
+                texts[f"第{i}章"] = text
+                processor.chapter_store.save("测试小说", f"第{i}章", {"chapter_name": f"第{i}章", "content": {"text": text}})
+                processor.search_index.add("测试小说", f"第{i}章", text)
+            processor.search_index.flush()
+            print(f"保存并索引: {time.perf_counter() - start:.3f}s")
+
+            # 查询词: 从随机章节中截取4到8个字
+            samples = []
+            for _ in range(queries):
+                text = texts[f"第{rng.randint(1, chapter_count)}章"]
+                position = rng.randrange(len(text) - 8)
+                samples.append(text[position:position + rng.randint(4, 8)])
+
+            start = time.perf_counter()
+            linear_hits = 0
+            for query in samples:
+                for chapter_name in processor.get_novel_chapters("测试小说"):
+                    if query in processor._load_chapter_text("测试小说", chapter_name):
+                        linear_hits += 1
+            linear_elapsed = time.perf_counter() - start
+            print(f"逐个读取查找: 每次 {linear_elapsed / queries * 1000:.1f}ms, 命中 {linear_hits} 章")
+
+            start = time.perf_counter()
+            index_hits = sum(len(processor.search_chapters(query, limit=chapter_count)) for query in samples)
+            index_elapsed = time.perf_counter() - start
+            print(f"倒排索引检索: 每次 {index_elapsed / queries * 1000:.1f}ms, 命中 {index_hits} 章")
+
+            # 重新打开索引（冷启动）
+            processor.close()
+            start = time.perf_counter()
+            processor = NovelProcessor(config_manager)
+            print(f"重新打开索引: {time.perf_counter() - start:.3f}s")
+            processor.close()
+            config_manager.close()
+        finally:
+            os.chdir(cwd)
+
+
+def bench_durability(devices: int = 8, chapters_per_device: int = 50, chapter_chars: int = 3000,
+                     read_time: float = 0.05, fsync_latency: float = 0.005) -> None:
+    """
+    对比不同持久化方式下多台设备并发保存章节的耗时和同步次数
+
+    每台设备保存两个章节之间平均间隔read_time秒（模拟识别章节的时间）。
+    虚拟机和内存盘的fsync几乎没有开销，每次fsync额外等待fsync_latency秒，模拟普通硬盘和固态硬盘的刷盘延迟。
+    """
+    print(f"== durability: {devices} 台设备, 每台 {chapters_per_device} 章, 平均识别间隔 {read_time * 1000:.0f}ms, "
+          f"模拟fsync延迟 {fsync_latency * 1000:.0f}ms ==")
+    paragraph = "这是一段用于测试章节持久化的内容。" * (chapter_chars // 17)
+    real_fsync = os.fsync
+    fsync_count = [0]
+
+    def slow_fsync(fd: int) -> None:
+        fsync_count[0] += 1
+        time.sleep(fsync_latency)
+        real_fsync(fd)
+
+    os.fsync = slow_fsync
+    try:
+        for storage in ("folder", "segment"):
+            for durability in ("none", "always", "batch"):
+                fsync_count[0] = 0
+                _bench_durability(storage, durability, devices, chapters_per_device, paragraph, read_time,
+                                  fsync_count)
+    finally:
+        os.fsync = real_fsync
+
+
+def _bench_durability(storage: str, durability: str, devices: int, chapters_per_device: int, paragraph: str,
+                      read_time: float, fsync_count: List[int]) -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cwd = os.getcwd()
+        os.chdir(tmp_dir)
+        try:
+            with open("config.json", 'w', encoding='utf-8') as f:
+                json.dump({"chapter_storage": storage, "chapter_durability": durability}, f)
+            config_manager = ConfigManager("config.json", "stats.json")
+            processor = NovelProcessor(config_manager)
+            save_times: List[float] = []
+
+            def device(index: int) -> None:
+                rng = random.Random(index)
+                for i in range(chapters_per_device):
+                    time.sleep(rng.uniform(0, 2 * read_time))
+                    start = time.perf_counter()
+                    processor.save_chapter_content("测试小说", f"第{index * chapters_per_device + i + 1}章",
+                                                   {"text": paragraph}, f"device-{index}")
+                    save_times.append(time.perf_counter() - start)
+
+            threads = [threading.Thread(target=device, args=(index,)) for index in range(devices)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            saved = len(config_manager.get_novel_progress("测试小说"))
+            batcher = processor.chapter_store.sync_batcher
+            rounds = "" if batcher is None else f", 同步 {batcher.stats.rounds} 轮"
+            print(f"[{storage}/{durability}] 平均保存 {sum(save_times) / len(save_times) * 1000:.1f}ms, "
+                  f"fsync {fsync_count[0]} 次{rounds}, 已记录进度 {saved} 章")
+            processor.close()
+            config_manager.close()
+        finally:
+            os.chdir(cwd)
+
+
+BENCHMARKS: Dict[str, Callable[[], None]] = {
+    "stats_persist": bench_stats_persist,
+    "coin_ledger": bench_coin_ledger,
+    "concurrency": bench_concurrency,
+    "scheduler": bench_scheduler,
+    "export": bench_export,
+    "chapter_store": bench_chapter_store,
+    "compression": bench_compression,
+    "stitch": bench_stitch,
+    "scroll": bench_scroll,
+    "search": bench_search,
+    "durability": bench_durability,
+}
+
+
+def main():
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"未知的基准: {name}，可选: {', '.join(BENCHMARKS)}")
+            sys.exit(1)
+        BENCHMARKS[name]()
+    print(f"日志目录: {os.path.join(WORK_DIR, 'logs')}")
+
+
+if __name__ == "__main__":
+    main()
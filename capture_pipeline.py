@@ -0,0 +1,638 @@
+"""
+先截图后识别模块
+设备只负责翻页和截图，截图写入有容量上限的暂存目录；独立的进程池通过MaaFramework的Resource识别暂存的截图，
+识别结果再交给拼接和保存阶段。设备时间和CPU密集的OCR可以分别扩展
+"""
+
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy
+from maa.controller import CustomController
+
+from chapter_lease import ChapterLease, ChapterLeaseManager
+from chapter_reader import ChapterReader, line_pitch, ocr_results_to_rows
+from logger import app_logger
+from page_stitcher import PageStitcher
+from scroll_controller import ScrollController
+from stats_persister import atomic_write_json
+
+
+# 暂存截图时只保留正文区域（与ocrChapterPage节点的roi一致）的灰度图，识别时还原到原来的位置
+CAPTURE_ROI = (0, 80, 720, 1120)
+# BGR转灰度的权重
+_GRAY_WEIGHTS = numpy.array([0.114, 0.587, 0.299], dtype=numpy.float32)
+
+
+def capture_crop(image: numpy.ndarray, roi: Sequence[int] = CAPTURE_ROI) -> numpy.ndarray:
+    """
+    截取截图中的正文区域并转为灰度图
+
+    Args:
+        image: 截图（BGR，高 x 宽 x 3）
+        roi: 正文区域 (x, y, 宽, 高)
+
+    Returns:
+        numpy.ndarray: 灰度图（uint8）
+    """
+    x, y, width, height = roi
+    region = image[y:y + height, x:x + width, :3]
+    return (region @ _GRAY_WEIGHTS).astype(numpy.uint8)
+
+
+def frame_difference(a: numpy.ndarray, b: numpy.ndarray, step: int = 4) -> float:
+    """
+    两帧灰度图每隔step个像素取样后的平均灰度差，用于判断画面是否变化
+
+    Args:
+        a: 灰度图
+        b: 同样大小的灰度图
+        step: 取样间隔
+
+    Returns:
+        float: 平均灰度差（0-255）
+    """
+    if a.shape != b.shape:
+        return 255.0
+    return float(numpy.abs(a[::step, ::step].astype(numpy.int16) - b[::step, ::step]).mean())
+
+
+@dataclass
+class CaptureJob:
+    """一个章节的暂存截图"""
+    novel_name: str
+    chapter_name: str
+    device: str
+    job_dir: str
+    lease: Optional[ChapterLease] = None
+    # 截图的大小（高, 宽），识别时按此还原画面
+    frame_shape: Tuple[int, int] = (1280, 720)
+    # 每一屏截图之前的滑动距离（第一屏为0）
+    distances: List[int] = field(default_factory=list)
+    # 已识别的屏: {序号: [(行的垂直中心, 文本)]}
+    rows: Dict[int, List[Tuple[float, str]]] = field(default_factory=dict)
+    # 已提交但尚未识别完的屏数
+    in_flight: int = 0
+    sealed: bool = False
+    failed: bool = False
+    abandoned: bool = False
+    queued: bool = False
+
+    @property
+    def pages(self) -> int:
+        return len(self.distances)
+
+    def page_path(self, index: int, suffix: str = ".npy") -> str:
+        return os.path.join(self.job_dir, f"page-{index:04d}{suffix}")
+
+
+class PageSpool:
+    """
+    截图暂存目录
+
+    每个章节一个子目录，每屏截图保存为一个.npy文件，识别后替换为识别结果（.json），截图完成时写入meta.json。
+    等待识别的截图数达到上限时写入方阻塞，直到识别进度跟上（背压）。
+    程序重启后，已写入meta.json的章节继续识别，未截图完成的章节丢弃。
+    """
+
+    def __init__(self, spool_dir: str = "capture_spool", max_pages: int = 200):
+        """
+        Args:
+            spool_dir: 暂存目录
+            max_pages: 等待识别的截图数上限
+        """
+        self.spool_dir = spool_dir
+        self.max_pages = max_pages
+        self._condition = threading.Condition()
+        self._pending = 0
+        # 因暂存目录已满而等待的总时间（秒）
+        self.wait_seconds = 0.0
+        os.makedirs(spool_dir, exist_ok=True)
+
+    def create_job(self, novel_name: str, chapter_name: str, device: str,
+                   lease: Optional[ChapterLease] = None) -> CaptureJob:
+        """为章节创建暂存子目录"""
+        job_dir = os.path.join(self.spool_dir, uuid.uuid4().hex)
+        os.makedirs(job_dir)
+        return CaptureJob(novel_name, chapter_name, device, job_dir, lease)
+
+    def reserve(self, should_stop: Callable[[], bool] = lambda: False) -> bool:
+        """
+        占用一个截图名额，暂存目录已满时等待
+
+        Args:
+            should_stop: 返回True时放弃等待
+
+        Returns:
+            bool: 是否占用成功
+        """
+        start = time.perf_counter()
+        with self._condition:
+            while self._pending >= self.max_pages:
+                if should_stop():
+                    return False
+                self._condition.wait(0.5)
+            self._pending += 1
+            self.wait_seconds += time.perf_counter() - start
+        return True
+
+    def release(self) -> None:
+        """归还一个截图名额（截图已识别或已丢弃）"""
+        with self._condition:
+            self._pending -= 1
+            self._condition.notify()
+
+    def write_page(self, job: CaptureJob, crop: numpy.ndarray, distance: int) -> str:
+        """写入一屏截图，返回文件路径"""
+        file_path = job.page_path(job.pages)
+        numpy.save(file_path, crop)
+        job.distances.append(distance)
+        return file_path
+
+    def store_rows(self, job: CaptureJob, index: int, rows: List[Tuple[float, str]]) -> None:
+        """用识别结果替换截图文件"""
+        atomic_write_json(job.page_path(index, ".json"), rows, indent=None)
+        os.remove(job.page_path(index))
+
+    def seal(self, job: CaptureJob) -> None:
+        """章节截图完成，写入章节信息"""
+        atomic_write_json(os.path.join(job.job_dir, "meta.json"), {
+            "novel_name": job.novel_name,
+            "chapter_name": job.chapter_name,
+            "device": job.device,
+            "frame_shape": list(job.frame_shape),
+            "distances": job.distances
+        })
+
+    def remove(self, job: CaptureJob) -> None:
+        """删除章节的暂存子目录"""
+        shutil.rmtree(job.job_dir, ignore_errors=True)
+
+    def recover(self) -> List[CaptureJob]:
+        """
+        加载上次运行留下的已截图完成的章节，删除未截图完成的章节
+
+        Returns:
+            List[CaptureJob]: 章节列表，未识别的屏在rows中缺失
+        """
+        jobs = []
+        for entry in os.scandir(self.spool_dir):
+            if not entry.is_dir():
+                continue
+            meta_path = os.path.join(entry.path, "meta.json")
+            try:
+                with open(meta_path, 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+                job = CaptureJob(meta["novel_name"], meta["chapter_name"], meta["device"], entry.path,
+                                 frame_shape=tuple(meta["frame_shape"]), distances=meta["distances"], sealed=True)
+                for index in range(job.pages):
+                    if os.path.exists(job.page_path(index, ".json")):
+                        with open(job.page_path(index, ".json"), 'r', encoding='utf-8') as f:
+                            job.rows[index] = [(center, text) for center, text in json.load(f)]
+                    elif not os.path.exists(job.page_path(index)):
+                        raise FileNotFoundError(job.page_path(index))
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                app_logger.warning(f"丢弃未完成的暂存截图: {entry.path} ({e})")
+                shutil.rmtree(entry.path, ignore_errors=True)
+                continue
+            jobs.append(job)
+        return jobs
+
+
+class SpooledImageController(CustomController):
+    """把暂存的截图作为屏幕画面提供给Tasker的控制器，只用于识别，不执行任何操作"""
+
+    def __init__(self):
+        super().__init__()
+        self.image: Optional[numpy.ndarray] = None
+
+    def connect(self) -> bool:
+        return True
+
+    def request_uuid(self) -> str:
+        return "capture-spool"
+
+    def start_app(self, intent: str) -> bool:
+        return True
+
+    def stop_app(self, intent: str) -> bool:
+        return True
+
+    def screencap(self) -> numpy.ndarray:
+        return self.image
+
+    def click(self, x: int, y: int) -> bool:
+        return True
+
+    def swipe(self, x1: int, y1: int, x2: int, y2: int, duration: int) -> bool:
+        return True
+
+    def touch_down(self, contact: int, x: int, y: int, pressure: int) -> bool:
+        return True
+
+    def touch_move(self, contact: int, x: int, y: int, pressure: int) -> bool:
+        return True
+
+    def touch_up(self, contact: int) -> bool:
+        return True
+
+    def press_key(self, keycode: int) -> bool:
+        return True
+
+    def input_text(self, text: str) -> bool:
+        return True
+
+
+# 识别进程中的Tasker和控制器，由init_ocr_worker创建
+_worker_tasker = None
+_worker_controller: Optional[SpooledImageController] = None
+_worker_node = "ocrChapterPage"
+
+
+def init_ocr_worker(resource_path: str, ocr_node: str = "ocrChapterPage") -> None:
+    """
+    识别进程的初始化函数: 加载资源包，用暂存截图控制器创建Tasker
+
+    Args:
+        resource_path: 资源包路径
+        ocr_node: 识别正文的流水线节点
+    """
+    global _worker_tasker, _worker_controller, _worker_node
+    from maa.resource import Resource
+    from maa.tasker import Tasker
+    from maa.toolkit import Toolkit
+
+    Toolkit.init_option("./")
+    resource = Resource()
+    resource.post_bundle(resource_path).wait()
+    _worker_controller = SpooledImageController()
+    _worker_controller.post_connection().wait()
+    _worker_tasker = Tasker()
+    _worker_tasker.bind(resource, _worker_controller)
+    if not _worker_tasker.inited:
+        raise RuntimeError("识别进程初始化Tasker失败")
+    _worker_node = ocr_node
+
+
+def ocr_spooled_page(page_path: str, frame_shape: Tuple[int, int],
+                     roi: Sequence[int] = CAPTURE_ROI) -> Tuple[List[Tuple[float, str]], float]:
+    """
+    在识别进程中识别一屏暂存截图
+
+    Args:
+        page_path: 截图文件路径
+        frame_shape: 原截图大小（高, 宽）
+        roi: 截图保存的区域 (x, y, 宽, 高)
+
+    Returns:
+        Tuple[List[Tuple[float, str]], float]: (从上到下的(行的垂直中心, 文本), 识别耗时)
+    """
+    start = time.perf_counter()
+    crop = numpy.load(page_path)
+    x, y, width, height = roi
+    frame = numpy.zeros((frame_shape[0], frame_shape[1], 3), dtype=numpy.uint8)
+    frame[y:y + height, x:x + width] = crop[:, :, None]
+    _worker_controller.image = frame
+    detail = _worker_tasker.post_task(_worker_node).wait().get()
+    rows = []
+    if detail and detail.nodes and detail.nodes[0].recognition is not None:
+        rows = ocr_results_to_rows(detail.nodes[0].recognition.all_results)
+    return rows, time.perf_counter() - start
+
+
+@dataclass
+class OcrPipelineStats:
+    """识别流水线统计"""
+    pages: int = 0
+    ocr_seconds: float = 0.0
+    chapters: int = 0
+    failed: int = 0
+
+
+class DeferredOcrPipeline:
+    """
+    先截图后识别流水线
+
+    设备线程通过submit_page写入截图后立即继续翻页，截图交给进程池识别；章节截图完成（seal）且所有屏都识别后，
+    由流水线线程按顺序拼接，把重叠行数反馈给滚动控制器，再调用on_chapter保存。
+    等待识别的章节的租约由流水线线程定期续约。
+    """
+
+    def __init__(self, spool: PageSpool, on_chapter: Callable[[CaptureJob, Optional[str]], None],
+                 resource_path: str = "assets/resource", ocr_node: str = "ocrChapterPage",
+                 workers: Optional[int] = None, scroll_controller: Optional[ScrollController] = None,
+                 lease_manager: Optional[ChapterLeaseManager] = None, renew_interval: float = 30.0,
+                 ocr_func: Callable[..., Tuple[List[Tuple[float, str]], float]] = ocr_spooled_page,
+                 initializer: Optional[Callable[..., None]] = init_ocr_worker,
+                 initargs: Optional[Tuple[Any, ...]] = None):
+        """
+        Args:
+            spool: 截图暂存目录
+            on_chapter: 章节识别完成后调用，参数为(章节, 拼接后的文本)，识别失败时文本为None
+            resource_path: 资源包路径
+            ocr_node: 识别正文的流水线节点
+            workers: 识别进程数，默认为CPU核数
+            scroll_controller: 滚动控制器，识别出的重叠行数反馈给它
+            lease_manager: 租约管理器，用于续约等待识别的章节
+            renew_interval: 续约间隔（秒）
+            ocr_func: 在识别进程中执行的识别函数
+            initializer: 识别进程的初始化函数
+            initargs: 初始化函数的参数，默认为(resource_path, ocr_node)
+        """
+        self.spool = spool
+        self.on_chapter = on_chapter
+        self.scroll_controller = scroll_controller
+        self.lease_manager = lease_manager
+        self.renew_interval = renew_interval
+        self.ocr_func = ocr_func
+        self.stats = OcrPipelineStats()
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers, initializer=initializer,
+            initargs=(resource_path, ocr_node) if initargs is None else initargs
+        )
+        self._condition = threading.Condition()
+        self._jobs: Dict[str, CaptureJob] = {}
+        self._ready: "queue.Queue[Optional[CaptureJob]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        recovered = spool.recover()
+        for job in recovered:
+            self._resume(job)
+        if recovered:
+            app_logger.info(f"继续识别上次运行暂存的 {len(recovered)} 个章节")
+
+    def create_job(self, novel_name: str, chapter_name: str, device: str,
+                   lease: Optional[ChapterLease] = None) -> CaptureJob:
+        """
+        开始暂存一个章节的截图
+
+        Args:
+            novel_name: 小说名称
+            chapter_name: 章节名称
+            device: 设备序列号
+            lease: 章节租约，章节保存时提交
+
+        Returns:
+            CaptureJob: 章节
+        """
+        job = self.spool.create_job(novel_name, chapter_name, device, lease)
+        with self._condition:
+            self._jobs[job.job_dir] = job
+        return job
+
+    def submit_page(self, job: CaptureJob, crop: numpy.ndarray, distance: int,
+                    should_stop: Callable[[], bool] = lambda: False) -> bool:
+        """
+        暂存一屏截图并提交识别，暂存目录已满时等待
+
+        Args:
+            job: 章节
+            crop: capture_crop截取的正文区域
+            distance: 截图之前的滑动距离
+            should_stop: 返回True时放弃等待
+
+        Returns:
+            bool: 是否提交成功
+        """
+        if not self.spool.reserve(should_stop):
+            return False
+        try:
+            index = job.pages
+            file_path = self.spool.write_page(job, crop, distance)
+        except BaseException:
+            self.spool.release()
+            raise
+        self._submit(job, index, file_path)
+        return True
+
+    def seal(self, job: CaptureJob) -> None:
+        """章节截图完成，所有屏识别后拼接保存"""
+        self.spool.seal(job)
+        with self._condition:
+            job.sealed = True
+            self._check(job)
+
+    def abandon(self, job: CaptureJob) -> None:
+        """放弃未截图完成的章节（租约由调用方释放），已提交的截图识别后丢弃"""
+        with self._condition:
+            job.abandoned = True
+            job.sealed = True
+            self._check(job)
+
+    def join(self) -> None:
+        """等待所有章节识别并保存"""
+        with self._condition:
+            while self._jobs:
+                self._condition.wait()
+
+    def close(self) -> None:
+        """等待所有章节处理完后关闭识别进程"""
+        self.join()
+        self._ready.put(None)
+        self._thread.join()
+        self._executor.shutdown()
+
+    def report(self) -> Dict[str, float]:
+        """
+        识别统计
+
+        Returns:
+            Dict[str, float]: {pages, average_ocr_ms, chapters, failed, spool_wait_seconds}
+        """
+        with self._condition:
+            return {
+                "pages": self.stats.pages,
+                "average_ocr_ms": self.stats.ocr_seconds / self.stats.pages * 1000 if self.stats.pages else 0.0,
+                "chapters": self.stats.chapters,
+                "failed": self.stats.failed,
+                "spool_wait_seconds": self.spool.wait_seconds
+            }
+
+    def _resume(self, job: CaptureJob) -> None:
+        """继续处理上次运行暂存的章节"""
+        # 提交完所有未识别的屏之前不能交给流水线线程
+        job.sealed = False
+        with self._condition:
+            self._jobs[job.job_dir] = job
+        for index in range(job.pages):
+            if index not in job.rows:
+                self.spool.reserve()
+                self._submit(job, index, job.page_path(index))
+        with self._condition:
+            job.sealed = True
+            self._check(job)
+
+    def _submit(self, job: CaptureJob, index: int, file_path: str) -> None:
+        with self._condition:
+            job.in_flight += 1
+        try:
+            future = self._executor.submit(self.ocr_func, file_path, job.frame_shape)
+        except Exception as e:
+            app_logger.error(f"提交截图识别失败: {e}")
+            self.spool.release()
+            with self._condition:
+                job.in_flight -= 1
+                job.failed = True
+            return
+        future.add_done_callback(lambda done: self._on_page(job, index, done))
+
+    def _on_page(self, job: CaptureJob, index: int, future: Future) -> None:
+        """一屏识别完成（在进程池的结果线程中执行）"""
+        rows = None
+        try:
+            rows, elapsed = future.result()
+            if not job.abandoned:
+                self.spool.store_rows(job, index, rows)
+        except Exception as e:
+            app_logger.error(f"识别暂存截图失败: {job.page_path(index)} ({e})")
+            rows = None
+            elapsed = 0.0
+        finally:
+            self.spool.release()
+        with self._condition:
+            job.in_flight -= 1
+            self.stats.pages += 1
+            self.stats.ocr_seconds += elapsed
+            if rows is None:
+                job.failed = True
+            else:
+                job.rows[index] = rows
+            self._check(job)
+
+    def _check(self, job: CaptureJob) -> None:
+        """章节截图完成且提交的截图都已识别时交给流水线线程，需在持有self._condition时调用"""
+        # 放弃或识别失败的章节同样要等已提交的截图识别完，才能删除暂存目录
+        if job.queued or not job.sealed or job.in_flight:
+            return
+        job.queued = True
+        self._ready.put(job)
+
+    def _run(self) -> None:
+        """流水线线程: 拼接保存识别完成的章节，定期续约等待中的章节"""
+        last_renew = time.monotonic()
+        while True:
+            try:
+                job = self._ready.get(timeout=self.renew_interval)
+            except queue.Empty:
+                job = False
+            if job is None:
+                return
+            if job:
+                self._finish(job)
+            if time.monotonic() - last_renew >= self.renew_interval:
+                last_renew = time.monotonic()
+                self._renew_leases()
+
+    def _finish(self, job: CaptureJob) -> None:
+        """拼接章节并保存，然后删除暂存目录"""
+        try:
+            if job.abandoned:
+                return
+            text = None
+            if not job.failed and len(job.rows) == job.pages:
+                stitcher = PageStitcher()
+                for index in range(job.pages):
+                    rows = job.rows[index]
+                    lines = [text for _, text in rows]
+                    overlap = stitcher.add_page(lines)
+                    if index > 0 and self.scroll_controller is not None:
+                        self.scroll_controller.observe(job.device, line_pitch(rows), job.distances[index],
+                                                       len(lines), overlap)
+                if self.scroll_controller is not None:
+                    self.scroll_controller.record_chapter(job.device, job.pages)
+                text = stitcher.text()
+            try:
+                self.on_chapter(job, text)
+            except Exception as e:
+                app_logger.error(f"保存识别完成的章节失败: {job.chapter_name} ({e})")
+            with self._condition:
+                if text is None:
+                    self.stats.failed += 1
+                else:
+                    self.stats.chapters += 1
+        finally:
+            self.spool.remove(job)
+            with self._condition:
+                self._jobs.pop(job.job_dir, None)
+                self._condition.notify_all()
+
+    def _renew_leases(self) -> None:
+        """续约等待识别的章节的租约"""
+        with self._condition:
+            leases = [job.lease for job in self._jobs.values() if job.lease is not None and not job.abandoned]
+        for lease in leases:
+            if self.lease_manager is not None and not self.lease_manager.renew(lease):
+                app_logger.warning(f"等待识别的章节租约已失效: {lease.novel_name} {lease.chapter}")
+
+
+class ChapterCapturer(ChapterReader):
+    """
+    章节截图器（先截图后识别模式的设备端）
+
+    只截图和翻页，不在设备线程中识别文字；滑动后正文区域的画面没有变化时说明已到章节末尾。
+    滑动距离使用滚动控制器根据之前识别结果得到的布局计算，没有布局时使用固定的滑动距离。
+    """
+
+    def __init__(self, tasker, pipeline: DeferredOcrPipeline, change_threshold: float = 2.0, **kwargs):
+        """
+        Args:
+            tasker: 设备的Tasker实例
+            pipeline: 识别流水线
+            change_threshold: 两帧平均灰度差低于该值时视为画面没有变化
+            **kwargs: ChapterReader的其它参数
+        """
+        super().__init__(tasker, **kwargs)
+        self.pipeline = pipeline
+        self.change_threshold = change_threshold
+
+    def capture(self, job: CaptureJob, should_stop: Callable[[], bool] = lambda: False) -> bool:
+        """
+        从当前位置开始截图到章节末尾
+
+        Args:
+            job: pipeline.create_job创建的章节
+            should_stop: 返回True时停止截图
+
+        Returns:
+            bool: 是否截图完成（完成时已提交流水线拼接保存）
+        """
+        previous = None
+        distance = 0
+        for _ in range(self.max_pages):
+            if should_stop():
+                return False
+            image = self.screencap()
+            crop = capture_crop(image)
+            if previous is not None and frame_difference(previous, crop) < self.change_threshold:
+                # 滑动后画面没有变化，已到章节末尾
+                break
+            job.frame_shape = image.shape[:2]
+            if not self.pipeline.submit_page(job, crop, distance, should_stop):
+                return False
+            previous = crop
+            distance = self.next_distance()
+            self.swipe(distance)
+        else:
+            app_logger.warning(f"章节超过 {self.max_pages} 屏，停止截图")
+        self.pipeline.seal(job)
+        return True
+
+    def screencap(self) -> numpy.ndarray:
+        """截取当前屏幕"""
+        self.tasker.controller.post_screencap().wait()
+        return self.tasker.controller.cached_image
+
+    def next_distance(self) -> int:
+        """下一次滑动的距离"""
+        layout = None if self.scroll_controller is None else self.scroll_controller.layout(self.device)
+        if layout is None:
+            return self.swipe_from - self.swipe_to
+        return self.scroll_controller.distance(self.device, *layout)
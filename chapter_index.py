@@ -0,0 +1,151 @@
+"""
+章节索引模块
+解析章节序号（阿拉伯数字和中文数字），按序号维护有序的章节列表，支持按序号范围查询
+"""
+
+import bisect
+import re
+import threading
+from typing import Callable, Iterable, List, Optional, Tuple
+
+
+CHINESE_DIGITS = {"零": 0, "〇": 0, "一": 1, "二": 2, "两": 2, "三": 3, "四": 4,
+                  "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+CHINESE_UNITS = {"十": 10, "百": 100, "千": 1000}
+CHINESE_SECTION_UNITS = ("万", "亿")
+
+_NUMERAL_PATTERN = "[0-9０-９]+|[零〇一二两三四五六七八九十百千万亿]+"
+_CHAPTER_PATTERN = re.compile(f"第\\s*({_NUMERAL_PATTERN})\\s*[章节回]")
+_LEADING_PATTERN = re.compile(f"^\\s*({_NUMERAL_PATTERN})")
+
+
+def parse_chinese_number(text: str) -> int:
+    """
+    解析中文数字，如"一百零五"、"十二"、"二〇二四"
+
+    Args:
+        text: 中文数字
+
+    Returns:
+        int: 数值
+    """
+    if not any(char in CHINESE_UNITS or char in CHINESE_SECTION_UNITS for char in text):
+        # 没有单位时逐位读取，如"二〇二四"
+        return int("".join(str(CHINESE_DIGITS[char]) for char in text))
+
+    # result: 亿以上的部分, wan: 万到亿之间的部分, section: 万以下已读完单位的部分, digit: 尚未遇到单位的数字
+    result = wan = section = digit = 0
+    for char in text:
+        if char in CHINESE_DIGITS:
+            digit = CHINESE_DIGITS[char]
+        elif char in CHINESE_UNITS:
+            # "十二"中的"十"前面省略了"一"
+            section += (digit or 1) * CHINESE_UNITS[char]
+            digit = 0
+        elif char == "万":
+            wan += (section + digit) * 10000
+            section = digit = 0
+        else:
+            result += (wan + section + digit) * 100000000
+            wan = section = digit = 0
+    return result + wan + section + digit
+
+
+def parse_chapter_number(chapter: str) -> Optional[int]:
+    """
+    从章节名称中解析章节序号
+
+    Args:
+        chapter: 章节名称，如"第12章"、"第一百零五章 标题"、"12"
+
+    Returns:
+        Optional[int]: 章节序号，无法识别时返回None
+    """
+    match = _CHAPTER_PATTERN.search(chapter) or _LEADING_PATTERN.search(chapter)
+    if match is None:
+        return None
+    numeral = match.group(1)
+    if numeral[0] in CHINESE_DIGITS or numeral[0] in CHINESE_UNITS or numeral[0] in CHINESE_SECTION_UNITS:
+        return parse_chinese_number(numeral)
+    # 兼容全角数字
+    return int(numeral.translate(str.maketrans("０１２３４５６７８９", "0123456789")))
+
+
+def chapter_sort_key(chapter: str) -> Tuple[float, str]:
+    """章节的自然排序键：先按序号，无法识别序号的章节排在最后并按名称排序"""
+    number = parse_chapter_number(chapter)
+    return (float("inf") if number is None else number, chapter)
+
+
+class ChapterIndex:
+    """
+    小说的章节索引
+
+    首次使用时扫描一次章节存储，之后随章节保存增量更新；章节按(序号, 名称)保持有序，
+    范围查询通过二分查找完成，不需要重新扫描。线程安全。
+    """
+
+    def __init__(self, scan: Callable[[], Iterable[str]]):
+        """
+        Args:
+            scan: 返回已保存章节名称的函数，首次使用时调用一次
+        """
+        self._scan = scan
+        self._lock = threading.Lock()
+        self._keys: Optional[List[Tuple[float, str]]] = None
+
+    def add(self, chapter: str) -> None:
+        """
+        添加章节（已存在时忽略）
+
+        Args:
+            chapter: 章节名称
+        """
+        key = chapter_sort_key(chapter)
+        with self._lock:
+            self._ensure_loaded()
+            position = bisect.bisect_left(self._keys, key)
+            if position == len(self._keys) or self._keys[position] != key:
+                self._keys.insert(position, key)
+
+    def chapters(self) -> List[str]:
+        """按章节序号排序的章节列表"""
+        with self._lock:
+            self._ensure_loaded()
+            return [name for _, name in self._keys]
+
+    def range(self, start: Optional[int] = None, end: Optional[int] = None) -> List[str]:
+        """
+        获取序号在[start, end]范围内的章节
+
+        Args:
+            start: 起始序号（包含），None表示不限
+            end: 结束序号（包含），None表示不限
+
+        Returns:
+            List[str]: 按序号排序的章节列表
+        """
+        with self._lock:
+            self._ensure_loaded()
+            low = 0 if start is None else bisect.bisect_left(self._keys, (start, ""))
+            high = len(self._keys) if end is None else bisect.bisect_left(self._keys, (end + 1, ""))
+            return [name for _, name in self._keys[low:high]]
+
+    def __contains__(self, chapter: str) -> bool:
+        key = chapter_sort_key(chapter)
+        with self._lock:
+            self._ensure_loaded()
+            position = bisect.bisect_left(self._keys, key)
+            return position < len(self._keys) and self._keys[position] == key
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._ensure_loaded()
+            return len(self._keys)
+
+    def _ensure_loaded(self) -> None:
+        """首次使用时扫描章节存储，需在持有self._lock时调用"""
+        if self._keys is not None:
+            return
+        self._keys = sorted(chapter_sort_key(name) for name in self._scan())
+
@@ -0,0 +1,311 @@
+"""
+章节租约模块
+保证每个章节只由一个设备购买和识别，可跨线程、跨进程使用（共享同一个状态目录）
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, Optional
+from logger import app_logger
+
+
+@dataclass
+class ChapterLease:
+    """章节租约"""
+    novel_name: str
+    chapter: str
+    owner: str
+    token: str
+    expires_at: float
+
+
+class ChapterLeaseManager:
+    """
+    章节租约管理器
+
+    每个章节对应租约目录中的一个租约文件，以原子的"不存在时创建"方式发布，同一时刻只有一个设备能创建成功；
+    租约带有效期，设备处理期间需要续约，进程退出或设备卡死后租约过期，其它设备可以接管。
+    接管时先将过期的租约文件改名为墓碑文件（改名是原子的，只有一个设备能成功），再创建新租约。
+    章节保存后提交租约，写入完成标记，之后任何设备都无法再领取该章节；小说处理完成后可用prune_done清理完成标记。
+    续约同样先把租约文件改名为自己的临时文件再重新创建，不会覆盖其它设备刚接管的租约。
+    """
+
+    def __init__(self, lease_dir: str = "leases", ttl: float = 120.0):
+        """
+        Args:
+            lease_dir: 租约目录，多个进程共享同一目录即可互斥
+            ttl: 租约有效期（秒）
+        """
+        self.lease_dir = lease_dir
+        self.ttl = ttl
+        os.makedirs(self.lease_dir, exist_ok=True)
+
+    def claim(self, novel_name: str, chapter: str, owner: str, ttl: Optional[float] = None) -> Optional[ChapterLease]:
+        """
+        领取章节
+
+        Args:
+            novel_name: 小说名称
+            chapter: 章节名称
+            owner: 领取者（设备ID）
+            ttl: 租约有效期（秒），默认使用管理器的有效期
+
+        Returns:
+            Optional[ChapterLease]: 领取成功时返回租约；章节已完成或被其它设备持有时返回None。
+                                    领取者已持有未过期的租约时续约并返回该租约
+        """
+        ttl = self.ttl if ttl is None else ttl
+        if self.is_done(novel_name, chapter):
+            return None
+        lease_path = self._path(novel_name, chapter, ".lease")
+        lease = ChapterLease(novel_name, chapter, owner, uuid.uuid4().hex, time.time() + ttl)
+
+        # 最多尝试两次：第一次创建失败且原租约已过期时，接管后再创建一次
+        for _ in range(2):
+            if self._create(lease_path, self._to_dict(lease)):
+                # 创建租约前可能有其它设备刚刚完成该章节
+                if self.is_done(novel_name, chapter):
+                    self._remove_if_owned(lease)
+                    return None
+                return lease
+            current = self._read(lease_path)
+            if current is None:
+                # 租约刚被提交或放弃，重新尝试创建
+                continue
+            if current["expires_at"] > time.time():
+                if current["owner"] != owner:
+                    return None
+                held = ChapterLease(novel_name, chapter, owner, current["token"], current["expires_at"])
+                return held if self.renew(held, ttl) else None
+            if not self._take_over(lease_path, current):
+                return None
+        return None
+
+    def renew(self, lease: ChapterLease, ttl: Optional[float] = None) -> bool:
+        """
+        续约
+
+        Args:
+            lease: 租约
+            ttl: 新的有效期（秒），默认使用管理器的有效期
+
+        Returns:
+            bool: 是否续约成功，租约已被其它设备接管时返回False
+        """
+        ttl = self.ttl if ttl is None else ttl
+        lease_path = self._path(lease.novel_name, lease.chapter, ".lease")
+        current = self._read(lease_path)
+        # 已过期的租约可能正在被其它设备接管，不再续约
+        if current is None or current["token"] != lease.token or current["expires_at"] <= time.time():
+            return False
+        # 读取之后租约可能过期并被接管，因此不能直接覆盖：先把租约文件改名（原子操作，只有一个设备能成功），
+        # 确认改名的仍是自己的租约后再以"不存在时创建"的方式写回
+        renewing = f"{lease_path}.{uuid.uuid4().hex}.renew"
+        try:
+            os.rename(lease_path, renewing)
+        except FileNotFoundError:
+            return False
+        try:
+            moved = self._read(renewing)
+            if moved is None or moved["token"] != lease.token:
+                # 改名的是其它设备的新租约，把它放回原处
+                try:
+                    os.link(renewing, lease_path)
+                except FileExistsError:
+                    pass
+                return False
+            expires_at = time.time() + ttl
+            # 改名后到写回之前租约文件不存在，其它设备可能领取成功，此时续约失败
+            if not self._create(lease_path, dict(self._to_dict(lease), expires_at=expires_at)):
+                return False
+            lease.expires_at = expires_at
+            return True
+        finally:
+            os.remove(renewing)
+
+    def commit(self, lease: ChapterLease) -> bool:
+        """
+        提交租约：写入完成标记并删除租约文件
+
+        Args:
+            lease: 租约
+
+        Returns:
+            bool: 是否提交成功，租约已被其它设备接管或章节已被提交时返回False
+        """
+        lease_path = self._path(lease.novel_name, lease.chapter, ".lease")
+        current = self._read(lease_path)
+        if current is None or current["token"] != lease.token:
+            app_logger.warning(f"章节租约已失效，无法提交: {lease.novel_name} {lease.chapter} ({lease.owner})")
+            return False
+        # 完成标记同样只能创建一次：租约在处理期间过期并被接管时，只有先提交的设备成功
+        committed = self._create(self._path(lease.novel_name, lease.chapter, ".done"), {
+            "novel_name": lease.novel_name,
+            "chapter": lease.chapter,
+            "owner": lease.owner,
+            "committed_at": time.time()
+        })
+        self._remove_if_owned(lease)
+        if not committed:
+            app_logger.warning(f"章节已被其它设备提交: {lease.novel_name} {lease.chapter} ({lease.owner})")
+        return committed
+
+    def release(self, lease: ChapterLease) -> None:
+        """
+        放弃租约（章节未完成），其它设备可以立即领取
+
+        Args:
+            lease: 租约
+        """
+        self._remove_if_owned(lease)
+
+    def prune_done(self, novel_name: str, chapters: Optional[Iterable[str]] = None) -> int:
+        """
+        清理小说的完成标记（小说处理完成、进度已记录后调用）
+
+        Args:
+            novel_name: 小说名称
+            chapters: 只清理这些章节，默认清理小说的所有完成标记
+
+        Returns:
+            int: 清理的完成标记数量
+        """
+        chapters = set(chapters) if chapters is not None else None
+        removed = 0
+        for entry in os.scandir(self.lease_dir):
+            if not entry.name.endswith(".done"):
+                continue
+            marker = self._read(entry.path)
+            if marker is None or marker.get("novel_name") != novel_name:
+                continue
+            if chapters is not None and marker.get("chapter") not in chapters:
+                continue
+            try:
+                os.remove(entry.path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def is_done(self, novel_name: str, chapter: str) -> bool:
+        """章节是否已提交"""
+        return os.path.exists(self._path(novel_name, chapter, ".done"))
+
+    @contextmanager
+    def keep_alive(self, lease: ChapterLease, interval: Optional[float] = None) -> Iterator[threading.Event]:
+        """
+        在后台定期续约，直到退出上下文
+
+        Args:
+            lease: 租约
+            interval: 续约间隔（秒），默认为有效期的三分之一
+
+        Returns:
+            Iterator[threading.Event]: 租约丢失事件，续约失败时被设置，处理方应尽快停止
+        """
+        interval = self.ttl / 3 if interval is None else interval
+        stopped = threading.Event()
+        lost = threading.Event()
+
+        def renew_loop():
+            while not stopped.wait(interval):
+                if not self.renew(lease):
+                    app_logger.warning(f"章节租约续约失败: {lease.novel_name} {lease.chapter} ({lease.owner})")
+                    lost.set()
+                    return
+
+        thread = threading.Thread(target=renew_loop, name=f"lease-{lease.owner}", daemon=True)
+        thread.start()
+        try:
+            yield lost
+        finally:
+            stopped.set()
+            thread.join()
+
+    def _take_over(self, lease_path: str, expired: Dict[str, Any]) -> bool:
+        """将过期的租约改名为墓碑文件，返回是否接管成功"""
+        tombstone = f"{lease_path}.{uuid.uuid4().hex}.expired"
+        try:
+            os.rename(lease_path, tombstone)
+        except FileNotFoundError:
+            # 其它设备已经接管，重新尝试创建
+            return True
+        moved = self._read(tombstone)
+        if moved is not None and moved["token"] != expired["token"]:
+            # 读取过期租约后、改名之前，其它设备已接管并创建了新租约，把它放回原处
+            try:
+                os.link(tombstone, lease_path)
+            except FileExistsError:
+                pass
+            os.remove(tombstone)
+            return False
+        os.remove(tombstone)
+        app_logger.info(f"接管过期的章节租约: {expired['novel_name']} {expired['chapter']} (原持有者: {expired['owner']})")
+        return True
+
+    def _remove_if_owned(self, lease: ChapterLease) -> None:
+        """租约仍属于自己时删除租约文件"""
+        lease_path = self._path(lease.novel_name, lease.chapter, ".lease")
+        current = self._read(lease_path)
+        if current is not None and current["token"] == lease.token:
+            try:
+                os.remove(lease_path)
+            except FileNotFoundError:
+                pass
+
+    def _path(self, novel_name: str, chapter: str, suffix: str) -> str:
+        """章节对应的文件路径（以哈希命名，避免章节名中的特殊字符）"""
+        key = hashlib.sha1(f"{novel_name}\0{chapter}".encode('utf-8')).hexdigest()
+        return os.path.join(self.lease_dir, key + suffix)
+
+    def _create(self, file_path: str, data: Dict[str, Any]) -> bool:
+        """
+        仅在文件不存在时创建文件（原子操作）
+
+        先写入临时文件再以硬链接发布：链接目标已存在时失败，读取方也不会看到内容不完整的租约。
+        """
+        tmp_path = self._write_tmp(data)
+        try:
+            os.link(tmp_path, file_path)
+            return True
+        except FileExistsError:
+            return False
+        finally:
+            os.remove(tmp_path)
+
+    def _write_tmp(self, data: Dict[str, Any]) -> str:
+        """将数据写入租约目录中的临时文件，返回临时文件路径"""
+        fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=self.lease_dir)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        return tmp_path
+
+    @staticmethod
+    def _read(file_path: str) -> Optional[Dict[str, Any]]:
+        """读取租约文件，文件不存在或内容不完整时返回None"""
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    @staticmethod
+    def _to_dict(lease: ChapterLease) -> Dict[str, Any]:
+        return {
+            "novel_name": lease.novel_name,
+            "chapter": lease.chapter,
+            "owner": lease.owner,
+            "token": lease.token,
+            "expires_at": lease.expires_at
+        }
@@ -0,0 +1,171 @@
+"""
+章节阅读模块
+在设备上逐屏识别已打开的章节，拼接为完整的章节文本
+"""
+
+import time
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+from logger import app_logger
+from page_stitcher import PageStitcher
+from scroll_controller import ScrollController
+
+
+def ocr_results_to_lines(results: Sequence[Any]) -> List[str]:
+    """
+    将OCR结果按位置合并为从上到下的文本行
+
+    同一行的文字可能被识别为多个结果，垂直中心相差不到半个行高的结果视为同一行，行内按从左到右拼接。
+
+    Args:
+        results: OCR结果列表，每项包含text和box(x, y, w, h)
+
+    Returns:
+        List[str]: 文本行
+    """
+    return [text for _, text in ocr_results_to_rows(results)]
+
+
+def ocr_results_to_rows(results: Sequence[Any]) -> List[Tuple[float, str]]:
+    """
+    将OCR结果按位置合并为从上到下的文本行，并保留每行的垂直中心
+
+    Args:
+        results: OCR结果列表，每项包含text和box(x, y, w, h)
+
+    Returns:
+        List[Tuple[float, str]]: (行的垂直中心, 文本)
+    """
+    items = sorted(
+        ((result.box[1] + result.box[3] / 2, result.box[0], result.box[3], result.text) for result in results
+         if result.text and result.text.strip()),
+        key=lambda item: item[0]
+    )
+    rows: List[List[Any]] = []
+    for center, x, height, text in items:
+        if rows and center - rows[-1][0] < max(height, rows[-1][1]) / 2:
+            rows[-1][2].append((x, text))
+        else:
+            rows.append([center, height, [(x, text)]])
+    return [(center, "".join(text for _, text in sorted(parts))) for center, _, parts in rows]
+
+
+def line_pitch(rows: Sequence[Tuple[float, str]]) -> float:
+    """
+    行距: 相邻两行垂直中心距离的中位数（段落间距较大，用中位数排除）
+
+    Args:
+        rows: ocr_results_to_rows的结果
+
+    Returns:
+        float: 行距（像素），少于两行时返回0
+    """
+    gaps = sorted(b[0] - a[0] for a, b in zip(rows, rows[1:]))
+    return gaps[len(gaps) // 2] if gaps else 0.0
+
+
+class ChapterReader:
+    """
+    章节阅读器
+
+    识别当前屏幕的正文，向上滑动一屏后继续识别，相邻两屏重叠的行由PageStitcher去重；
+    滑动后识别不到新内容时说明已到章节末尾。指定滚动控制器时，滑动距离根据实际重叠行数自适应调整。
+    """
+
+    def __init__(self, tasker, ocr_node: str = "ocrChapterPage", swipe_from: int = 1000, swipe_to: int = 400,
+                 swipe_x: int = 360, swipe_duration: int = 300, settle: float = 0.3, max_pages: int = 200,
+                 scroll_controller: Optional[ScrollController] = None, device: str = ""):
+        """
+        Args:
+            tasker: 设备的Tasker实例
+            ocr_node: 识别正文的流水线节点
+            swipe_from: 滑动起点的纵坐标
+            swipe_to: 滑动终点的纵坐标，两者之差即固定的滑动距离（需小于正文区域高度，保证相邻两屏有重叠）
+            swipe_x: 滑动的横坐标
+            swipe_duration: 滑动时长（毫秒）
+            settle: 滑动后等待画面静止的时间（秒）
+            max_pages: 单个章节最多识别的屏数
+            scroll_controller: 滚动控制器，为None时使用固定的滑动距离
+            device: 设备序列号（滚动控制器按设备区分）
+        """
+        self.tasker = tasker
+        self.ocr_node = ocr_node
+        self.swipe_from = swipe_from
+        self.swipe_to = swipe_to
+        self.swipe_x = swipe_x
+        self.swipe_duration = swipe_duration
+        self.settle = settle
+        self.max_pages = max_pages
+        self.scroll_controller = scroll_controller
+        self.device = device
+
+    def read(self, should_stop: Callable[[], bool] = lambda: False) -> str:
+        """
+        从当前位置开始识别到章节末尾
+
+        Args:
+            should_stop: 返回True时停止识别
+
+        Returns:
+            str: 拼接后的章节文本
+        """
+        stitcher = PageStitcher()
+        distance = 0
+        for page in range(self.max_pages):
+            if should_stop():
+                break
+            rows = self.ocr_page()
+            lines = [text for _, text in rows]
+            pitch = line_pitch(rows)
+            overlap = stitcher.add_page(lines)
+            if page > 0:
+                if self.scroll_controller is not None:
+                    self.scroll_controller.observe(self.device, pitch, distance, len(lines), overlap)
+                if overlap == len(lines):
+                    # 滑动后没有新内容，已到章节末尾
+                    break
+                if overlap == 0:
+                    app_logger.warning(f"[{self.device}] 相邻两屏没有重叠，可能漏识别了部分内容，缩小滑动距离")
+            distance = self.scroll(pitch, len(lines))
+        else:
+            app_logger.warning(f"章节超过 {self.max_pages} 屏，停止识别")
+        if self.scroll_controller is not None:
+            self.scroll_controller.record_chapter(self.device, len(stitcher.page_lines))
+        app_logger.debug(f"章节识别完成: {len(stitcher.page_lines)} 屏, {len(stitcher.lines)} 行, "
+                         f"每屏重叠行数 {stitcher.overlaps[1:]}")
+        return stitcher.text()
+
+    def ocr_page(self) -> List[Tuple[float, str]]:
+        """识别当前屏幕的正文，返回从上到下的(行的垂直中心, 文本)"""
+        detail = self.tasker.post_task(self.ocr_node).wait().get()
+        if not detail or not detail.nodes or detail.nodes[0].recognition is None:
+            return []
+        return ocr_results_to_rows(detail.nodes[0].recognition.all_results)
+
+    def scroll(self, pitch: float = 0.0, page_lines: int = 0) -> int:
+        """
+        向上滑动并等待画面静止
+
+        Args:
+            pitch: 当前屏的行距
+            page_lines: 当前屏的行数
+
+        Returns:
+            int: 滑动距离（像素）
+        """
+        if self.scroll_controller is None:
+            distance = self.swipe_from - self.swipe_to
+        else:
+            distance = self.scroll_controller.distance(self.device, pitch, page_lines)
+        self.swipe(distance)
+        return distance
+
+    def swipe(self, distance: int) -> None:
+        """
+        向上滑动指定距离并等待画面静止
+
+        Args:
+            distance: 滑动距离（像素）
+        """
+        self.tasker.controller.post_swipe(self.swipe_x, self.swipe_from, self.swipe_x, self.swipe_from - distance,
+                                          self.swipe_duration).wait()
+        time.sleep(self.settle)
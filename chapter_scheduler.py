@@ -0,0 +1,197 @@
+"""
+章节调度模块
+将章节范围分配给多个设备并行处理，空闲设备从较慢设备的队列尾部窃取章节
+"""
+
+import threading
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, List, Optional
+from chapter_index import parse_chapter_number
+from logger import app_logger
+
+
+def expand_chapter_range(start_chapter: str, end_chapter: str) -> List[str]:
+    """
+    将起止章节展开为章节名称列表
+
+    Args:
+        start_chapter: 起始章节，如"1"、"第1章"或"第一章"
+        end_chapter: 结束章节，如"100"、"第100章"或"第一百章"
+
+    Returns:
+        List[str]: 章节名称列表，如["第1章", "第2章", ...]
+    """
+    start = _chapter_number(start_chapter) if start_chapter else 1
+    end = _chapter_number(end_chapter) if end_chapter else start
+    return [f"第{number}章" for number in range(start, end + 1)]
+
+
+def _chapter_number(chapter: str) -> int:
+    """从章节名称中解析章节序号"""
+    number = parse_chapter_number(chapter)
+    if number is None:
+        raise ValueError(f"无法识别的章节: {chapter}")
+    return number
+
+
+class ChapterScheduler:
+    """
+    工作窃取式章节调度器
+
+    章节按连续区间平均分给每个设备（设备按顺序翻页阅读最快），设备从自己队列的头部取章节；
+    自己的队列为空时，从剩余章节最多的设备队列尾部窃取一半，慢设备不会拖住整体进度。
+    连续失败过多的设备会被移出调度，其剩余章节交给其它设备；没有设备可以接手时记入unassigned。
+    """
+
+    def __init__(self, chapters: Iterable[str], workers: Iterable[str], max_failures: int = 3,
+                 work_stealing: bool = True):
+        """
+        Args:
+            chapters: 待处理的章节（按顺序）
+            workers: 设备序列号列表
+            max_failures: 设备连续失败该次数后移出调度
+            work_stealing: 是否允许空闲设备窃取其它设备的章节，关闭时每台设备只处理分给自己的区间
+        """
+        self.max_failures = max_failures
+        self.work_stealing = work_stealing
+        self._lock = threading.Lock()
+        self._queues: Dict[str, Deque[str]] = {}
+        # 统计信息: 每个设备处理完成和窃取的章节数
+        self.completed: Dict[str, int] = {}
+        self.stolen: Dict[str, int] = {}
+        # 所有设备都已移出调度、没有设备处理的章节
+        self.unassigned: List[str] = []
+        # 处理函数跳过（如正被其它进程处理）、本次没有完成的章节
+        self.skipped: List[str] = []
+
+        chapters = list(chapters)
+        workers = list(workers)
+        for index, worker in enumerate(workers):
+            begin = len(chapters) * index // len(workers)
+            end = len(chapters) * (index + 1) // len(workers)
+            self._queues[worker] = deque(chapters[begin:end])
+            self.completed[worker] = 0
+            self.stolen[worker] = 0
+
+    def next_chapter(self, worker: str) -> Optional[str]:
+        """
+        获取设备的下一个章节
+
+        Args:
+            worker: 设备序列号
+
+        Returns:
+            Optional[str]: 章节名称，所有章节都已分配完时返回None（设备随之退出调度）
+        """
+        with self._lock:
+            queue = self._queues.get(worker)
+            if queue is None:
+                return None
+            if not queue and not (self.work_stealing and self._steal(worker)):
+                # 没有剩余章节，设备退出调度，之后放回的章节只交给仍在运行的设备
+                del self._queues[worker]
+                return None
+            return queue.popleft()
+
+    def requeue(self, worker: str, chapter: str) -> None:
+        """
+        将未完成的章节放回设备队列头部
+
+        Args:
+            worker: 设备序列号
+            chapter: 章节名称
+        """
+        with self._lock:
+            queue = self._queues.get(worker)
+            if queue is None:
+                # 设备已移出调度，交给剩余章节最少的设备
+                queue = self._shortest_queue()
+                if queue is None:
+                    app_logger.warning(f"没有可用的设备，章节未处理: {chapter}")
+                    self.unassigned.append(chapter)
+                    return
+            queue.appendleft(chapter)
+
+    def remove_worker(self, worker: str) -> None:
+        """
+        将设备移出调度，剩余章节依次分给其它设备
+
+        Args:
+            worker: 设备序列号
+        """
+        with self._lock:
+            queue = self._queues.pop(worker, None)
+            if not queue:
+                return
+            if not self._queues:
+                app_logger.warning(f"没有可用的设备，{len(queue)} 个章节未处理")
+                self.unassigned.extend(queue)
+                return
+            for chapter in queue:
+                self._shortest_queue().append(chapter)
+
+    def remaining(self) -> int:
+        """尚未处理的章节数（包括没有设备处理的章节）"""
+        with self._lock:
+            return sum(len(queue) for queue in self._queues.values()) + len(self.unassigned)
+
+    def run(self, process: Callable[[str, str], None], should_stop: Callable[[], bool] = lambda: False) -> None:
+        """
+        每个设备一个线程并行处理章节，全部完成（或停止）后返回
+
+        Args:
+            process: 处理函数，参数为(设备序列号, 章节名称)，抛出异常表示处理失败，返回False表示跳过（不计入完成）
+            should_stop: 返回True时各设备处理完当前章节后停止
+        """
+        threads = [
+            threading.Thread(target=self._work, args=(worker, process, should_stop), name=f"chapter-{worker}")
+            for worker in list(self._queues)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def _work(self, worker: str, process: Callable[[str, str], None], should_stop: Callable[[], bool]) -> None:
+        """单个设备的处理循环"""
+        failures = 0
+        while not should_stop():
+            chapter = self.next_chapter(worker)
+            if chapter is None:
+                return
+            try:
+                result = process(worker, chapter)
+            except Exception as e:
+                failures += 1
+                app_logger.error(f"设备 {worker} 处理章节失败 {chapter}: {e}")
+                self.requeue(worker, chapter)
+                if failures >= self.max_failures:
+                    app_logger.error(f"设备 {worker} 连续失败 {failures} 次，移出调度")
+                    self.remove_worker(worker)
+                    return
+                continue
+            failures = 0
+            with self._lock:
+                if result is False:
+                    self.skipped.append(chapter)
+                else:
+                    self.completed[worker] += 1
+
+    def _steal(self, worker: str) -> bool:
+        """从剩余章节最多的设备队列尾部窃取一半章节，需在持有self._lock时调用"""
+        victim = max(self._queues, key=lambda name: len(self._queues[name]))
+        victim_queue = self._queues[victim]
+        if not victim_queue:
+            return False
+        count = (len(victim_queue) + 1) // 2
+        stolen = [victim_queue.pop() for _ in range(count)]
+        stolen.reverse()
+        self._queues[worker].extend(stolen)
+        self.stolen[worker] += count
+        return True
+
+    def _shortest_queue(self) -> Optional[Deque[str]]:
+        """剩余章节最少的设备队列，需在持有self._lock时调用"""
+        if not self._queues:
+            return None
+        return min(self._queues.values(), key=len)
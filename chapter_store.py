@@ -0,0 +1,652 @@
+"""
+章节存储模块
+提供可替换的章节内容存储格式：每章一个JSON文件的目录格式，或每部小说一个仅追加的段文件加偏移索引；
+两种格式都可以用zlib或lzma压缩章节内容，读取时根据内容开头的标记自动解压
+"""
+
+import json
+import lzma
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from chapter_index import chapter_sort_key
+from logger import app_logger
+from sync_batcher import SyncBatcher
+
+
+# 段文件中每条记录的头部: 内容长度, 内容的crc32
+SEGMENT_RECORD_HEADER = struct.Struct("<II")
+SEGMENT_SUFFIX = ".seg"
+SEGMENT_INDEX_SUFFIX = ".idx"
+# 章节压缩格式，以及目录格式下对应的文件后缀
+CHAPTER_COMPRESSIONS = {"none": ".json", "zlib": ".json.zlib", "lzma": ".json.xz"}
+# 章节写入的持久化方式: none（只保证原子替换，断电可能丢失最近保存的章节）、
+# batch（短时间内保存的章节合并为一轮fsync）、always（每次保存立即fsync，同步期间到达的保存仍会合并）
+CHAPTER_DURABILITIES = ("none", "batch", "always")
+_ZLIB_MAGIC = b"\x78"
+_LZMA_MAGIC = b"\xfd7zXZ\x00"
+
+
+def encode_chapter(chapter_data: Dict[str, Any], compression: str = "none", level: Optional[int] = None,
+                   indent: Optional[int] = None) -> bytes:
+    """
+    将章节数据编码为JSON并按需压缩
+
+    Args:
+        chapter_data: 章节数据
+        compression: 压缩格式，"none"、"zlib"或"lzma"
+        level: 压缩级别（zlib为0-9，lzma为预设0-9），默认均为6
+        indent: 不压缩时JSON的缩进，None时输出紧凑JSON
+
+    Returns:
+        bytes: 编码后的内容
+    """
+    if compression == "none":
+        separators = None if indent is not None else (",", ":")
+        return json.dumps(chapter_data, ensure_ascii=False, indent=indent, separators=separators).encode('utf-8')
+    data = json.dumps(chapter_data, ensure_ascii=False, separators=(",", ":")).encode('utf-8')
+    if compression == "zlib":
+        return zlib.compress(data, 6 if level is None else level)
+    if compression == "lzma":
+        return lzma.compress(data, preset=6 if level is None else level)
+    raise ValueError(f"未知的章节压缩格式: {compression}")
+
+
+def chapter_compression(data: bytes) -> str:
+    """根据内容开头的标记识别章节的压缩格式（JSON以"{"开头，不会与压缩格式的标记冲突）"""
+    if data.startswith(_LZMA_MAGIC):
+        return "lzma"
+    if data.startswith(_ZLIB_MAGIC):
+        return "zlib"
+    return "none"
+
+
+def decode_chapter(data: bytes) -> Dict[str, Any]:
+    """
+    解码章节内容，自动识别是否压缩
+
+    Args:
+        data: encode_chapter编码的内容
+
+    Returns:
+        Dict[str, Any]: 章节数据
+    """
+    compression = chapter_compression(data)
+    if compression == "lzma":
+        data = lzma.decompress(data)
+    elif compression == "zlib":
+        data = zlib.decompress(data)
+    return json.loads(data.decode('utf-8'))
+
+
+class ChapterStore:
+    """章节存储后端基类"""
+
+    def save(self, novel_name: str, chapter_name: str, chapter_data: Dict[str, Any],
+             on_durable: Optional[Callable[[], None]] = None) -> None:
+        """
+        保存章节，章节已存在时覆盖；返回时章节已按持久化设置写入磁盘
+
+        Args:
+            novel_name: 小说名称
+            chapter_name: 章节名称
+            chapter_data: 章节数据
+            on_durable: 章节持久化后调用（与同一轮同步的其它章节一起），用于让进度记录与章节一起持久化
+        """
+        raise NotImplementedError
+
+    def load(self, novel_name: str, chapter_name: str) -> Dict[str, Any]:
+        """
+        读取章节
+
+        Args:
+            novel_name: 小说名称
+            chapter_name: 章节名称
+
+        Returns:
+            Dict[str, Any]: 章节数据，章节不存在时抛出KeyError或FileNotFoundError
+        """
+        raise NotImplementedError
+
+    def list_chapters(self, novel_name: str) -> List[str]:
+        """
+        列出小说已保存的章节（不保证顺序）
+
+        Args:
+            novel_name: 小说名称
+
+        Returns:
+            List[str]: 章节名称列表
+        """
+        raise NotImplementedError
+
+    def list_novels(self) -> List[str]:
+        """
+        列出已保存章节的小说
+
+        Returns:
+            List[str]: 小说名称列表
+        """
+        raise NotImplementedError
+
+    def signature(self, novel_name: str, chapter_name: str) -> List[int]:
+        """
+        章节签名，章节重新保存后签名改变（用于增量导出）
+
+        Args:
+            novel_name: 小说名称
+            chapter_name: 章节名称
+
+        Returns:
+            List[int]: 签名
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """释放打开的文件"""
+
+
+class FolderChapterStore(ChapterStore):
+    """
+    每个章节保存为小说目录下的一个文件: novels/<小说>/<章节>.json（压缩时为.json.zlib或.json.xz）
+
+    切换压缩格式后，已有的章节文件保持原格式，重新保存时才转换，读取时两种格式都能识别。
+    章节先写入临时文件（.tmp后缀，不会被当作章节），持久化后再重命名为章节文件，中途退出不会留下内容不完整的章节。
+    """
+
+    def __init__(self, novels_dir: str = "novels", compression: str = "none", level: Optional[int] = None,
+                 sync_batcher: Optional[SyncBatcher] = None):
+        """
+        Args:
+            novels_dir: 小说根目录
+            compression: 压缩格式，"none"、"zlib"或"lzma"
+            level: 压缩级别
+            sync_batcher: 批量同步器，为None时不fsync（仍然原子替换）
+        """
+        self.novels_dir = novels_dir
+        self.compression = compression
+        self.level = level
+        self.sync_batcher = sync_batcher
+        # 读取时优先尝试当前压缩格式的文件
+        self._suffixes = [CHAPTER_COMPRESSIONS[compression]] + [
+            suffix for name, suffix in CHAPTER_COMPRESSIONS.items() if name != compression
+        ]
+
+    def save(self, novel_name: str, chapter_name: str, chapter_data: Dict[str, Any],
+             on_durable: Optional[Callable[[], None]] = None) -> None:
+        novel_dir = os.path.join(self.novels_dir, novel_name)
+        dirs = [novel_dir]
+        if not os.path.isdir(novel_dir):
+            os.makedirs(novel_dir, exist_ok=True)
+            # 新建的小说目录本身也要持久化
+            dirs.append(self.novels_dir)
+        fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=".tmp", dir=novel_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(encode_chapter(chapter_data, self.compression, self.level, indent=4))
+                if self.sync_batcher is not None:
+                    # 各章节的临时文件由保存线程各自并行fsync，重命名、目录和进度记录再合并同步
+                    f.flush()
+                    os.fsync(f.fileno())
+
+            def publish():
+                os.replace(tmp_path, self._path(novel_name, chapter_name, self._suffixes[0]))
+                # 删除同一章节其它压缩格式的旧文件
+                for suffix in self._suffixes[1:]:
+                    try:
+                        os.remove(self._path(novel_name, chapter_name, suffix))
+                    except FileNotFoundError:
+                        pass
+
+            if self.sync_batcher is None:
+                publish()
+                if on_durable is not None:
+                    on_durable()
+            else:
+                self.sync_batcher.sync(publish=publish, dirs=dirs, on_durable=on_durable)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def load(self, novel_name: str, chapter_name: str) -> Dict[str, Any]:
+        with open(self._find(novel_name, chapter_name), 'rb') as f:
+            return decode_chapter(f.read())
+
+    def list_chapters(self, novel_name: str) -> List[str]:
+        novel_dir = os.path.join(self.novels_dir, novel_name)
+        if not os.path.isdir(novel_dir):
+            return []
+        chapters: Dict[str, None] = {}
+        for entry in os.scandir(novel_dir):
+            if not entry.is_file():
+                continue
+            for suffix in self._suffixes:
+                if entry.name.endswith(suffix):
+                    chapters[entry.name[:-len(suffix)]] = None
+                    break
+        return list(chapters)
+
+    def list_novels(self) -> List[str]:
+        if not os.path.isdir(self.novels_dir):
+            return []
+        return [entry.name for entry in os.scandir(self.novels_dir) if entry.is_dir()]
+
+    def signature(self, novel_name: str, chapter_name: str) -> List[int]:
+        """章节文件的修改时间和大小"""
+        stat = os.stat(self._find(novel_name, chapter_name))
+        return [stat.st_mtime_ns, stat.st_size]
+
+    def _find(self, novel_name: str, chapter_name: str) -> str:
+        """查找章节文件，当前压缩格式的文件不存在时尝试其它格式"""
+        for suffix in self._suffixes:
+            file_path = self._path(novel_name, chapter_name, suffix)
+            if os.path.exists(file_path):
+                return file_path
+        raise FileNotFoundError(f"章节文件不存在: {novel_name} {chapter_name}")
+
+    def _path(self, novel_name: str, chapter_name: str, suffix: str) -> str:
+        return os.path.join(self.novels_dir, novel_name, chapter_name + suffix)
+
+
+class ChapterSegment:
+    """
+    单部小说的段文件和偏移索引
+
+    段文件由连续的记录组成，每条记录为 头部(长度, crc32) + 紧凑JSON（可压缩）；重新保存章节时追加新记录，旧记录成为垃圾，
+    由compact()清理。索引文件每行一个 [章节, 偏移, 长度, crc32]，同一章节以最后一行为准。
+    先写段文件再写索引：打开时若段文件比索引记录的更长，从索引末尾开始扫描段文件补齐索引，
+    末尾不完整的记录（写入中途退出）会被截断。读取通过mmap按偏移直接切片，不需要逐个打开文件。
+    指定批量同步器时，同一轮同步中追加的所有记录只需fsync一次段文件和索引。
+    仅支持单个进程写入。线程安全。
+    """
+
+    def __init__(self, segment_path: str, index_path: str, compression: str = "none", level: Optional[int] = None,
+                 sync_batcher: Optional[SyncBatcher] = None):
+        """
+        Args:
+            segment_path: 段文件路径
+            index_path: 索引文件路径
+            compression: 新记录的压缩格式，"none"、"zlib"或"lzma"
+            level: 压缩级别
+            sync_batcher: 批量同步器，为None时不fsync
+        """
+        self.segment_path = segment_path
+        self.index_path = index_path
+        self.compression = compression
+        self.level = level
+        self.sync_batcher = sync_batcher
+        # 新建的段文件还需要持久化所在目录
+        self._created = not os.path.exists(segment_path)
+        self._lock = threading.Lock()
+        # {章节: (记录偏移, 内容长度, crc32)}
+        self._index: Dict[str, Tuple[int, int, int]] = {}
+        self._file = None
+        self._index_file = None
+        self._map: Optional[mmap.mmap] = None
+        self._open()
+
+    def save(self, chapter_name: str, chapter_data: Dict[str, Any],
+             on_durable: Optional[Callable[[], None]] = None) -> None:
+        """追加一条章节记录，on_durable在记录持久化后调用"""
+        payload = encode_chapter(chapter_data, self.compression, self.level)
+        crc = zlib.crc32(payload)
+        with self._lock:
+            offset = self._file.seek(0, os.SEEK_END)
+            self._file.write(SEGMENT_RECORD_HEADER.pack(len(payload), crc) + payload)
+            self._file.flush()
+            self._append_index(chapter_name, offset, len(payload), crc)
+            dirs = [os.path.dirname(os.path.abspath(self.segment_path))] if self._created else []
+            self._created = False
+        if self.sync_batcher is None:
+            if on_durable is not None:
+                on_durable()
+        else:
+            # 先同步段文件再同步索引：索引丢失的部分可以从段文件恢复
+            self.sync_batcher.sync([self.segment_path, self.index_path], dirs=dirs, on_durable=on_durable)
+
+    def load(self, chapter_name: str) -> Dict[str, Any]:
+        """按索引从mmap中读取章节记录"""
+        with self._lock:
+            offset, length, crc = self._index[chapter_name]
+            start = offset + SEGMENT_RECORD_HEADER.size
+            if self._map is None or len(self._map) < start + length:
+                self._remap()
+            payload = self._map[start:start + length]
+        if zlib.crc32(payload) != crc:
+            raise ValueError(f"章节记录校验失败: {chapter_name}")
+        return decode_chapter(payload)
+
+    def chapters(self) -> List[str]:
+        with self._lock:
+            return list(self._index)
+
+    def signature(self, chapter_name: str) -> List[int]:
+        """章节记录的crc32和长度，压缩段文件后不变（转换压缩格式的记录除外）"""
+        with self._lock:
+            _, length, crc = self._index[chapter_name]
+        return [crc, length]
+
+    def garbage_bytes(self) -> int:
+        """被覆盖的旧记录占用的字节数"""
+        with self._lock:
+            live = sum(SEGMENT_RECORD_HEADER.size + length for _, length, _ in self._index.values())
+            return self._file.seek(0, os.SEEK_END) - live
+
+    def compact(self, recompress: bool = True) -> int:
+        """
+        压缩段文件：按章节序号重写每个章节的最新记录，去掉被覆盖的旧记录
+
+        Args:
+            recompress: 是否将压缩格式与当前设置不同的记录转换为当前格式
+
+        Returns:
+            int: 释放的字节数
+        """
+        with self._lock:
+            if self._map is None or len(self._map) < self._file.seek(0, os.SEEK_END):
+                self._remap()
+            old_size = self._file.seek(0, os.SEEK_END)
+            segment_tmp = f"{self.segment_path}.tmp"
+            index_tmp = f"{self.index_path}.tmp"
+            with open(segment_tmp, 'wb') as segment_file, open(index_tmp, 'w', encoding='utf-8') as index_file:
+                # 按章节顺序排列，导出时顺序读取
+                for chapter_name in sorted(self._index, key=chapter_sort_key):
+                    offset, length, crc = self._index[chapter_name]
+                    new_offset = segment_file.tell()
+                    record = self._map[offset:offset + SEGMENT_RECORD_HEADER.size + length]
+                    payload = record[SEGMENT_RECORD_HEADER.size:]
+                    if recompress and chapter_compression(payload) != self.compression:
+                        payload = encode_chapter(decode_chapter(payload), self.compression, self.level)
+                        length, crc = len(payload), zlib.crc32(payload)
+                        record = SEGMENT_RECORD_HEADER.pack(length, crc) + payload
+                    segment_file.write(record)
+                    index_file.write(self._index_line(chapter_name, new_offset, length, crc))
+                new_size = segment_file.tell()
+                if self.sync_batcher is not None:
+                    for f in (segment_file, index_file):
+                        f.flush()
+                        os.fsync(f.fileno())
+            # 替换前关闭文件和映射（Windows下无法替换仍被映射的文件）
+            self._close_files()
+            # 先删除旧索引：替换中途退出时，下次打开会从段文件重建索引，不会用旧偏移读取新段文件
+            os.remove(self.index_path)
+            os.replace(segment_tmp, self.segment_path)
+            os.replace(index_tmp, self.index_path)
+            self._open()
+            return old_size - new_size
+
+    def close(self) -> None:
+        with self._lock:
+            self._close_files()
+
+    def _open(self) -> None:
+        """打开段文件和索引，必要时从段文件补齐索引"""
+        self._index = {}
+        index_end = 0
+        segment_size = os.path.getsize(self.segment_path) if os.path.exists(self.segment_path) else 0
+        stale = 0
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        chapter_name, offset, length, crc = json.loads(line)
+                    except ValueError:
+                        # 写入中途退出时留下的不完整行，对应的记录之后从段文件补齐
+                        continue
+                    end = offset + SEGMENT_RECORD_HEADER.size + length
+                    if end > segment_size:
+                        # 断电时索引先于段文件写入磁盘，记录本身已丢失，保留该章节之前的记录
+                        stale += 1
+                        continue
+                    self._index[chapter_name] = (offset, length, crc)
+                    index_end = max(index_end, end)
+        if stale:
+            # 重写索引，否则之后追加的记录会落在这些失效的偏移上
+            app_logger.warning(f"索引中有 {stale} 条记录超出段文件末尾，已丢弃: {self.index_path}")
+            index_tmp = f"{self.index_path}.tmp"
+            with open(index_tmp, 'w', encoding='utf-8') as f:
+                for chapter_name, (offset, length, crc) in self._index.items():
+                    f.write(self._index_line(chapter_name, offset, length, crc))
+            os.replace(index_tmp, self.index_path)
+        self._file = open(self.segment_path, 'a+b')
+        self._index_file = open(self.index_path, 'a', encoding='utf-8')
+        if self._file.seek(0, os.SEEK_END) > index_end:
+            self._recover(index_end)
+
+    def _recover(self, offset: int) -> None:
+        """从offset开始扫描段文件，把索引中缺失的记录补上，截断末尾不完整的记录"""
+        # 索引最后一行可能不完整，先补一个换行
+        if self._index_file.tell() > 0:
+            self._index_file.write("\n")
+        size = self._file.seek(0, os.SEEK_END)
+        recovered = 0
+        while offset + SEGMENT_RECORD_HEADER.size <= size:
+            self._file.seek(offset)
+            length, crc = SEGMENT_RECORD_HEADER.unpack(self._file.read(SEGMENT_RECORD_HEADER.size))
+            payload = self._file.read(length)
+            if len(payload) != length or zlib.crc32(payload) != crc:
+                break
+            self._append_index(decode_chapter(payload)["chapter_name"], offset, length, crc)
+            offset += SEGMENT_RECORD_HEADER.size + length
+            recovered += 1
+        if offset < size:
+            app_logger.warning(f"段文件末尾有不完整的记录，已截断: {self.segment_path} ({size - offset} 字节)")
+            self._file.truncate(offset)
+        if recovered:
+            app_logger.info(f"从段文件恢复了 {recovered} 条索引: {self.segment_path}")
+
+    def _append_index(self, chapter_name: str, offset: int, length: int, crc: int) -> None:
+        self._index_file.write(self._index_line(chapter_name, offset, length, crc))
+        self._index_file.flush()
+        self._index[chapter_name] = (offset, length, crc)
+
+    @staticmethod
+    def _index_line(chapter_name: str, offset: int, length: int, crc: int) -> str:
+        return json.dumps([chapter_name, offset, length, crc], ensure_ascii=False) + "\n"
+
+    def _remap(self) -> None:
+        """段文件变长后重新映射，需在持有self._lock时调用"""
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file.seek(0, os.SEEK_END) > 0:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _close_files(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._index_file is not None:
+            self._index_file.close()
+            self._index_file = None
+
+
+class SegmentChapterStore(ChapterStore):
+    """每部小说一个段文件和索引: novels/<小说>.seg, novels/<小说>.idx"""
+
+    def __init__(self, novels_dir: str = "novels", compression: str = "none", level: Optional[int] = None,
+                 sync_batcher: Optional[SyncBatcher] = None):
+        """
+        Args:
+            novels_dir: 小说根目录
+            compression: 新记录的压缩格式，"none"、"zlib"或"lzma"
+            level: 压缩级别
+            sync_batcher: 批量同步器，为None时不fsync
+        """
+        self.novels_dir = novels_dir
+        self.compression = compression
+        self.level = level
+        self.sync_batcher = sync_batcher
+        self._lock = threading.Lock()
+        self._segments: Dict[str, ChapterSegment] = {}
+
+    def save(self, novel_name: str, chapter_name: str, chapter_data: Dict[str, Any],
+             on_durable: Optional[Callable[[], None]] = None) -> None:
+        self.segment(novel_name, create=True).save(chapter_name, chapter_data, on_durable)
+
+    def load(self, novel_name: str, chapter_name: str) -> Dict[str, Any]:
+        segment = self.segment(novel_name)
+        if segment is None:
+            raise KeyError(chapter_name)
+        return segment.load(chapter_name)
+
+    def list_chapters(self, novel_name: str) -> List[str]:
+        segment = self.segment(novel_name)
+        return [] if segment is None else segment.chapters()
+
+    def list_novels(self) -> List[str]:
+        if not os.path.isdir(self.novels_dir):
+            return []
+        return [
+            entry.name[:-len(SEGMENT_SUFFIX)] for entry in os.scandir(self.novels_dir)
+            if entry.is_file() and entry.name.endswith(SEGMENT_SUFFIX)
+        ]
+
+    def signature(self, novel_name: str, chapter_name: str) -> List[int]:
+        return self.segment(novel_name).signature(chapter_name)
+
+    def compact(self, novel_name: str, recompress: bool = True) -> int:
+        """
+        压缩小说的段文件
+
+        Args:
+            novel_name: 小说名称
+            recompress: 是否将记录转换为当前的压缩格式
+
+        Returns:
+            int: 释放的字节数
+        """
+        segment = self.segment(novel_name)
+        if segment is None:
+            return 0
+        freed = segment.compact(recompress)
+        app_logger.log_novel_action("压缩章节段文件", novel_name, f"释放 {freed} 字节")
+        return freed
+
+    def segment(self, novel_name: str, create: bool = False) -> Optional[ChapterSegment]:
+        """
+        获取小说的段文件
+
+        Args:
+            novel_name: 小说名称
+            create: 段文件不存在时是否创建
+
+        Returns:
+            Optional[ChapterSegment]: 段文件，不存在且create为False时返回None
+        """
+        with self._lock:
+            segment = self._segments.get(novel_name)
+            if segment is None:
+                segment_path = os.path.join(self.novels_dir, novel_name + SEGMENT_SUFFIX)
+                if not create and not os.path.exists(segment_path):
+                    return None
+                os.makedirs(self.novels_dir, exist_ok=True)
+                segment = ChapterSegment(segment_path, os.path.join(self.novels_dir, novel_name + SEGMENT_INDEX_SUFFIX),
+                                         self.compression, self.level, self.sync_batcher)
+                self._segments[novel_name] = segment
+            return segment
+
+    def close(self) -> None:
+        with self._lock:
+            for segment in self._segments.values():
+                segment.close()
+            self._segments.clear()
+
+
+def create_chapter_store(storage: str, novels_dir: str = "novels", compression: str = "none",
+                         level: Optional[int] = None, durability: str = "batch", sync_window: float = 0.02,
+                         after_sync: Optional[Callable[[], None]] = None) -> ChapterStore:
+    """
+    根据存储格式名称创建章节存储
+
+    Args:
+        storage: 存储格式，"folder"或"segment"
+        novels_dir: 小说根目录
+        compression: 章节压缩格式，"none"、"zlib"或"lzma"
+        level: 压缩级别，默认为6
+        durability: 持久化方式，"none"、"batch"或"always"
+        sync_window: batch方式下合并同步的时间窗口（秒）
+        after_sync: 每轮同步后调用（如将进度记录刷到磁盘）
+
+    Returns:
+        ChapterStore: 章节存储实例
+    """
+    if compression not in CHAPTER_COMPRESSIONS:
+        app_logger.warning(f"未知的章节压缩格式: {compression}，不压缩")
+        compression = "none"
+    if durability not in CHAPTER_DURABILITIES:
+        app_logger.warning(f"未知的章节持久化方式: {durability}，使用batch")
+        durability = "batch"
+    sync_batcher = None
+    if durability != "none":
+        sync_batcher = SyncBatcher(sync_window if durability == "batch" else 0, after_sync)
+    if storage == "segment":
+        return SegmentChapterStore(novels_dir, compression, level, sync_batcher)
+    if storage != "folder":
+        app_logger.warning(f"未知的章节存储格式: {storage}，使用folder")
+    return FolderChapterStore(novels_dir, compression, level, sync_batcher)
+
+
+def convert_folder_to_segment(novel_name: str, novels_dir: str = "novels", compression: str = "none",
+                              level: Optional[int] = None) -> int:
+    """
+    将小说目录中的章节文件转换为段文件（按章节序号写入，已在段文件中的章节跳过）
+
+    原目录保留不动，确认无误后可以手动删除。
+
+    Args:
+        novel_name: 小说名称
+        novels_dir: 小说根目录
+        compression: 段文件中章节的压缩格式
+        level: 压缩级别
+
+    Returns:
+        int: 转换的章节数
+    """
+    folder_store = FolderChapterStore(novels_dir)
+    segment_store = SegmentChapterStore(novels_dir, compression, level)
+    try:
+        segment = segment_store.segment(novel_name, create=True)
+        existing = set(segment.chapters())
+        converted = 0
+        for chapter_name in sorted(folder_store.list_chapters(novel_name), key=chapter_sort_key):
+            if chapter_name in existing:
+                continue
+            segment.save(chapter_name, folder_store.load(novel_name, chapter_name))
+            converted += 1
+    finally:
+        segment_store.close()
+    app_logger.info(f"章节已转换到段文件: {novel_name}, {converted} 章")
+    return converted
+
+
+if __name__ == "__main__":
+    # 用法: python chapter_store.py convert|compact <小说名称> [novels目录] [none|zlib|lzma] [压缩级别]
+    # compact指定压缩格式时，同时将段文件中的记录转换为该格式
+    if len(sys.argv) < 3 or sys.argv[1] not in ("convert", "compact"):
+        print("用法: python chapter_store.py convert|compact <小说名称> [novels目录] [none|zlib|lzma] [压缩级别]")
+        sys.exit(1)
+    command, name = sys.argv[1], sys.argv[2]
+    directory = sys.argv[3] if len(sys.argv) > 3 else "novels"
+    compression_name = sys.argv[4] if len(sys.argv) > 4 else "none"
+    compression_level = int(sys.argv[5]) if len(sys.argv) > 5 else None
+    if command == "convert":
+        count = convert_folder_to_segment(name, directory, compression_name, compression_level)
+        print(f"转换完成: {count} 章，在config.json中设置 \"chapter_storage\": \"segment\" 以启用")
+    else:
+        store = SegmentChapterStore(directory, compression_name, compression_level)
+        try:
+            print(f"压缩完成: 释放 {store.compact(name, recompress=len(sys.argv) > 4)} 字节")
+        finally:
+            store.close()
@@ -0,0 +1,65 @@
+"""
+代币归档模块
+保存余额已用尽或已过期的代币，仅在需要查看时读取
+"""
+
+import json
+import os
+import threading
+from typing import Any, Dict, Iterable, List
+from logger import app_logger
+
+
+class CoinArchive:
+    """代币归档文件（JSON Lines，每行一个代币）"""
+
+    def __init__(self, file_path: str):
+        """
+        Args:
+            file_path: 归档文件路径
+        """
+        self.file_path = file_path
+        self._lock = threading.Lock()
+
+    def append(self, coins: Iterable[Dict[str, Any]]) -> int:
+        """
+        追加归档代币并同步到磁盘
+
+        Args:
+            coins: 代币列表
+
+        Returns:
+            int: 归档数量
+        """
+        lines = [json.dumps(coin, ensure_ascii=False) + "\n" for coin in coins]
+        if not lines:
+            return 0
+        with self._lock:
+            with open(self.file_path, 'a', encoding='utf-8') as f:
+                f.writelines(lines)
+                f.flush()
+                os.fsync(f.fileno())
+        return len(lines)
+
+    def load(self) -> List[Dict[str, Any]]:
+        """
+        读取所有归档代币（同一代币重复归档时以最后一次为准）
+
+        Returns:
+            List[Dict[str, Any]]: 归档代币列表
+        """
+        if not os.path.exists(self.file_path):
+            return []
+        coins: Dict[int, Dict[str, Any]] = {}
+        with self._lock, open(self.file_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    coin = json.loads(line)
+                except json.JSONDecodeError:
+                    app_logger.warning(f"忽略损坏的代币归档记录: {self.file_path}")
+                    continue
+                coins[coin["id"]] = coin
+        return list(coins.values())
@@ -0,0 +1,185 @@
+"""
+代币账本模块
+按过期时间维护有余额的代币，支持优先扣除即将过期的代币
+"""
+
+import heapq
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def to_epoch(time_str: str) -> float:
+    """将yyyy-MM-dd HH:mm:ss格式的时间转换为时间戳"""
+    return datetime.strptime(time_str, TIME_FORMAT).timestamp()
+
+
+class CoinLedger:
+    """
+    代币账本
+
+    有余额且未过期的代币保存在以(过期时间戳, 代币编号)为键的小顶堆中，
+    扣除k个代币的代价为O(k log n)；余额用尽或已过期的代币移入归档列表，不再参与计算。
+    总余额、每个设备的余额及最近过期时间随修改增量维护，并记录自上次读取以来变化的设备和代币。
+    """
+
+    def __init__(self, coins: Iterable[Dict[str, Any]] = (), archived: Iterable[Dict[str, Any]] = ()):
+        """
+        Args:
+            coins: 代币列表，余额为0的代币直接归档
+            archived: 已归档的代币列表
+        """
+        self._heap: List[tuple] = []
+        self._live: Dict[int, Dict[str, Any]] = {}
+        self.archived: List[Dict[str, Any]] = list(archived)
+        self.total = 0
+        # 每个设备的余额，以及每个设备的过期时间堆（惰性删除，查看堆顶时跳过已失效的代币）
+        self._device_totals: Dict[str, int] = {}
+        self._device_heaps: Dict[str, List[tuple]] = {}
+        # 自上次pop_changes()以来发生变化的设备和代币
+        self._changed_devices: Set[str] = set()
+        self._changed_coins: Set[int] = set()
+
+        archived_ids = {coin["id"] for coin in self.archived}
+        for coin in coins:
+            if coin["id"] not in archived_ids:
+                self.add(coin)
+
+    def __len__(self) -> int:
+        return len(self._live)
+
+    def add(self, coin: Dict[str, Any]) -> None:
+        """
+        添加代币
+
+        Args:
+            coin: 代币信息，需包含id、expire_time、balance
+        """
+        if coin["balance"] <= 0:
+            self.archived.append(coin)
+            return
+        entry = (to_epoch(coin["expire_time"]), coin["id"])
+        device_serial = coin["device_serial"]
+        self._live[coin["id"]] = coin
+        self.total += coin["balance"]
+        self._device_totals[device_serial] = self._device_totals.get(device_serial, 0) + coin["balance"]
+        heapq.heappush(self._heap, entry)
+        heapq.heappush(self._device_heaps.setdefault(device_serial, []), entry)
+        self._mark_changed(coin)
+
+    def expire(self, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        归档已过期的代币
+
+        Args:
+            now: 当前时间戳，默认为系统当前时间
+
+        Returns:
+            List[Dict[str, Any]]: 本次过期的代币
+        """
+        now = datetime.now().timestamp() if now is None else now
+        expired = []
+        while self._heap and self._heap[0][0] <= now:
+            _, coin_id = heapq.heappop(self._heap)
+            coin = self._live[coin_id]
+            self._adjust_balance(coin, -coin["balance"], consume_balance=False)
+            self._archive(coin)
+            expired.append(coin)
+        return expired
+
+    def spend(self, amount: int) -> Optional[List[List[int]]]:
+        """
+        扣除代币，优先扣除即将过期的代币
+
+        Args:
+            amount: 扣除数量
+
+        Returns:
+            Optional[List[List[int]]]: 每个代币的扣除明细[[代币编号, 扣除数量], ...]，余额不足时返回None且不做任何修改
+        """
+        if amount > self.total:
+            return None
+
+        splits = []
+        remaining = amount
+        while remaining > 0:
+            _, coin_id = self._heap[0]
+            coin = self._live[coin_id]
+            used = min(coin["balance"], remaining)
+            self._adjust_balance(coin, -used)
+            remaining -= used
+            splits.append([coin_id, used])
+            if coin["balance"] == 0:
+                heapq.heappop(self._heap)
+                self._archive(coin)
+        return splits
+
+    def live_coins(self) -> List[Dict[str, Any]]:
+        """获取所有有余额的代币（按添加顺序）"""
+        return list(self._live.values())
+
+    def take_archived(self) -> List[Dict[str, Any]]:
+        """取出并清空归档列表（交由归档文件保存）"""
+        archived = self.archived
+        self.archived = []
+        return archived
+
+    def get_coin(self, coin_id: int) -> Optional[Dict[str, Any]]:
+        """获取有余额的代币，代币不存在或已归档时返回None"""
+        return self._live.get(coin_id)
+
+    def nearest_expire_time(self) -> Optional[str]:
+        """获取最近的过期时间"""
+        if not self._heap:
+            return None
+        return self._live[self._heap[0][1]]["expire_time"]
+
+    def device_balance(self, device_serial: str) -> int:
+        """获取设备的代币余额"""
+        return self._device_totals.get(device_serial, 0)
+
+    def device_nearest_expire_time(self, device_serial: str) -> Optional[str]:
+        """获取设备最近的过期时间"""
+        heap = self._device_heaps.get(device_serial)
+        while heap and heap[0][1] not in self._live:
+            heapq.heappop(heap)
+        if not heap:
+            return None
+        return self._live[heap[0][1]]["expire_time"]
+
+    def devices(self) -> List[str]:
+        """获取持有代币的设备列表（包括余额已用尽的设备）"""
+        return list(self._device_totals)
+
+    def pop_changes(self) -> Tuple[Set[str], Set[int]]:
+        """
+        获取并清空自上次调用以来发生变化的设备和代币
+
+        Returns:
+            Tuple[Set[str], Set[int]]: (设备序列号集合, 代币编号集合)
+        """
+        changes = (self._changed_devices, self._changed_coins)
+        self._changed_devices = set()
+        self._changed_coins = set()
+        return changes
+
+    def _adjust_balance(self, coin: Dict[str, Any], delta: int, consume_balance: bool = True) -> None:
+        """调整代币余额及各项汇总值，consume_balance为False时仅调整汇总值（过期时保留代币剩余余额）"""
+        if consume_balance:
+            coin["balance"] += delta
+        self.total += delta
+        self._device_totals[coin["device_serial"]] += delta
+        self._mark_changed(coin)
+
+    def _archive(self, coin: Dict[str, Any]) -> None:
+        """将代币移出有效代币并归档"""
+        del self._live[coin["id"]]
+        self.archived.append(coin)
+        self._mark_changed(coin)
+
+    def _mark_changed(self, coin: Dict[str, Any]) -> None:
+        """记录发生变化的设备和代币"""
+        self._changed_devices.add(coin["device_serial"])
+        self._changed_coins.add(coin["id"])
@@ -0,0 +1,145 @@
+"""
+代币流水模块
+以仅追加的方式记录代币的获得、使用和过期，支持按时间范围分页查询
+"""
+
+import bisect
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from logger import app_logger
+
+
+class CoinTransactionLog:
+    """
+    代币流水（JSON Lines，每行一条流水）
+
+    每条流水包含: seq（序号）、type（grant/spend/expire）、timestamp、device_serial、amount，
+    使用流水还包含novel_name、chapter和splits（每个代币的扣除明细）。
+    首次查询时扫描一次文件建立(时间, 偏移)索引，之后随追加增量维护，分页查询只读取当前页的行。
+    """
+
+    def __init__(self, file_path: str):
+        """
+        Args:
+            file_path: 流水文件路径
+        """
+        self.file_path = file_path
+        self._lock = threading.Lock()
+        # 索引在首次使用时建立：每条流水的时间和在文件中的偏移（按追加顺序，时间不递减）
+        self._timestamps: Optional[List[str]] = None
+        self._offsets: List[int] = []
+
+    def append(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        追加一条流水
+
+        Args:
+            entry: 流水内容，需包含timestamp
+
+        Returns:
+            Dict[str, Any]: 带序号的流水
+        """
+        with self._lock:
+            self._ensure_index()
+            entry = dict(entry, seq=len(self._offsets))
+            line = (json.dumps(entry, ensure_ascii=False) + "\n").encode('utf-8')
+            with open(self.file_path, 'ab') as f:
+                offset = f.tell()
+                f.write(line)
+            self._timestamps.append(entry["timestamp"])
+            self._offsets.append(offset)
+            return entry
+
+    def count(self) -> int:
+        """流水总数"""
+        with self._lock:
+            self._ensure_index()
+            return len(self._offsets)
+
+    def query(self, start_time: Optional[str] = None, end_time: Optional[str] = None,
+              page: int = 0, page_size: int = 50, before_seq: Optional[int] = None) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        按时间范围分页查询流水，最新的在前
+
+        Args:
+            start_time: 起始时间（包含），yyyy-MM-dd HH:mm:ss
+            end_time: 结束时间（包含），yyyy-MM-dd HH:mm:ss
+            page: 页码，从0开始
+            page_size: 每页数量
+            before_seq: 只查询序号小于该值的流水，用于在不断追加的流水上稳定地向前翻页
+
+        Returns:
+            Tuple[List[Dict[str, Any]], int]: (当前页流水, 范围内流水总数)
+        """
+        with self._lock:
+            self._ensure_index()
+            low = bisect.bisect_left(self._timestamps, start_time) if start_time else 0
+            high = bisect.bisect_right(self._timestamps, end_time) if end_time else len(self._timestamps)
+            if before_seq is not None:
+                high = min(high, before_seq)
+            total = max(high - low, 0)
+            page_high = high - page * page_size
+            page_low = max(page_high - page_size, low)
+            if page_high <= low:
+                return [], total
+            entries = self._read(page_low, page_high)
+        entries.reverse()
+        return entries, total
+
+    def read_after(self, seq: int) -> List[Dict[str, Any]]:
+        """
+        读取序号大于seq的流水，最新的在前
+
+        Args:
+            seq: 起始序号（不包含），-1表示全部
+
+        Returns:
+            List[Dict[str, Any]]: 流水列表
+        """
+        with self._lock:
+            self._ensure_index()
+            entries = self._read(seq + 1, len(self._offsets))
+        entries.reverse()
+        return entries
+
+    def _read(self, low: int, high: int) -> List[Dict[str, Any]]:
+        """读取序号在[low, high)范围内的流水，需在持有self._lock时调用"""
+        if low >= high:
+            return []
+        entries = []
+        with open(self.file_path, 'rb') as f:
+            f.seek(self._offsets[low])
+            for _ in range(high - low):
+                entries.append(json.loads(f.readline().decode('utf-8')))
+        return entries
+
+    def _ensure_index(self) -> None:
+        """首次使用时扫描文件建立索引，需在持有self._lock时调用"""
+        if self._timestamps is not None:
+            return
+        self._timestamps = []
+        self._offsets = []
+        if not os.path.exists(self.file_path):
+            return
+
+        valid_size = 0
+        with open(self.file_path, 'rb') as f:
+            offset = 0
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    entry = json.loads(line.decode('utf-8'))
+                except (UnicodeDecodeError, json.JSONDecodeError):
+                    break
+                self._timestamps.append(entry["timestamp"])
+                self._offsets.append(offset)
+                offset += len(line)
+                valid_size = offset
+        if valid_size < os.path.getsize(self.file_path):
+            # 进程在写入中途退出会留下不完整的行，截断后继续追加
+            app_logger.warning(f"代币流水文件末尾存在不完整的记录，已截断: {self.file_path}")
+            with open(self.file_path, 'r+b') as f:
+                f.truncate(valid_size)
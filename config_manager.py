@@ -1,18 +1,62 @@
+import copy
 import json
 import os
+import threading
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, Callable, Iterable, Iterator, List, Optional, Set, Tuple
+from coin_archive import CoinArchive
+from coin_ledger import CoinLedger
+from coin_transactions import CoinTransactionLog
+from keyed_locks import KeyedLocks
 from logger import app_logger
+from stats_store import create_stats_store, apply_mutation
 
 
 class ConfigManager:
-    """配置和状态管理类"""
+    """
+    配置和状态管理类（线程安全）
 
-    def __init__(self, config_file: str = "config.json", stats_file: str = "stats.json"):
+    状态按领域分别加锁：代币（账本、流水、归档）共用一把锁，因为扣除顺序跨设备按过期时间排列；
+    章节进度按小说分别加锁；签到状态单独一把锁。需要同时持有多把锁时按 代币 -> 小说 -> 签到 的顺序获取。
+    """
+
+    def __init__(self, config_file: str = "config.json", stats_file: str = "stats.json",
+                 flush_interval: float = 1.0, journal_max_bytes: int = 1024 * 1024,
+                 stats_backend: str = None):
+        """
+        Args:
+            config_file: 配置文件路径
+            stats_file: 状态文件路径
+            flush_interval: 状态文件合并写入窗口（秒），为0时每次修改都同步写入
+            journal_max_bytes: 状态日志超过该大小后压缩为新的状态快照
+            stats_backend: 状态存储后端（"json"或"sqlite"），默认读取配置中的stats_backend
+        """
         self.config_file = config_file
         self.stats_file = stats_file
+        # 保护代币相关状态，后台写入线程持有它生成快照，保证快照与状态日志序号一致
+        self._coin_lock = threading.RLock()
+        # 每部小说的章节进度和领取状态各自加锁
+        self._progress_locks = KeyedLocks()
+        self._sign_in_lock = threading.RLock()
+        # 正在签到的设备，仅保存在内存中
+        self._signing_in: Set[str] = set()
+        # 正在处理中的章节: {小说名称: {章节: 设备ID}}，仅保存在内存中，重启后失效
+        self._chapter_claims: Dict[str, Dict[str, str]] = {}
+        self._next_coin_id = 1
+        # 代币变化监听器，参数为(发生变化的设备集合, 发生变化的代币编号集合)
+        self._coin_listeners: List[Callable[[Set[str], Set[int]], None]] = []
+        # 关闭后状态存储不可再写入，读取代币时不再过期归档
+        self._closed = False
         self.config = self._load_config()
+        self._store = create_stats_store(stats_backend or self.config.get("stats_backend", "json"),
+                                         self.stats_file, self._snapshot_stats, self._coin_lock,
+                                         flush_interval, journal_max_bytes)
+        self._coin_archive = CoinArchive(f"{os.path.splitext(self.stats_file)[0]}.archive.jsonl")
+        self._coin_transactions = CoinTransactionLog(f"{os.path.splitext(self.stats_file)[0]}.transactions.jsonl")
         self.stats = self._load_stats()
+        # 启动时清理一次过期和已用尽的代币
+        self.sweep_coins()
 
     def _load_config(self) -> Dict[str, Any]:
         """加载配置文件"""
@@ -24,24 +68,59 @@ class ConfigManager:
             default_config = {
                 "target_novel": "",
                 "start_chapter": "",
-                "end_chapter": ""
+                "end_chapter": "",
+                # 运行状态存储后端: json 或 sqlite
+                "stats_backend": "json",
+                # 章节存储格式: folder（每章一个JSON文件）或 segment（每部小说一个段文件）
+                "chapter_storage": "folder",
+                # 章节内容压缩: none、zlib 或 lzma，压缩级别0-9（留空为6）
+                "chapter_compression": "none",
+                "chapter_compression_level": None,
+                # 章节写入的持久化方式: none、batch（合并同步窗口内保存的章节，默认）或 always
+                "chapter_durability": "batch",
+                "chapter_sync_window": 0.02,
+                # 章节的打开和购买尚未实现，开启后每个章节直接识别设备上当前打开的页面，仅用于调试识别流程
+                "experimental_chapter_reading": False,
+                # 章节识别方式: online（设备逐屏识别）或 deferred（设备只截图，进程池识别）
+                "chapter_read_mode": "online",
+                # online模式下识别上一屏的同时滑动、截取下一屏（尚未在设备上验证，默认关闭）
+                "pipelined_reading": False,
+                # deferred模式下等待识别的截图数上限，以及识别进程数（0为CPU核数）
+                "capture_spool_pages": 200,
+                "ocr_workers": 0
             }
             self._save_config(default_config)
             return default_config
 
     def _load_stats(self) -> Dict[str, Any]:
-        """加载状态文件"""
-        if os.path.exists(self.stats_file):
-            with open(self.stats_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        else:
-            # 默认状态
-            default_stats = {
-                "coins": [],
-                "novel_progress": {}
-            }
-            self._save_stats(default_stats)
-            return default_stats
+        """加载状态"""
+        with self._coin_lock:
+            self.stats = self._store.load()
+            # 预先创建各领域的顶层键，之后的修改不再改变stats本身的键，快照时可以安全遍历
+            self.stats.setdefault("novel_progress", {})
+            self.stats.setdefault("device_sign_in_status", {})
+            self._assign_coin_ids()
+            # 代币由账本维护，stats中的coins/coin_archive仅在读取和保存时从账本同步
+            self._coin_ledger = CoinLedger(self.stats.get("coins", []), self.stats.get("coin_archive", []))
+            self._expire_coins()
+            self._coin_ledger.pop_changes()
+            self._sync_coin_views()
+            return self.stats
+
+    def _assign_coin_ids(self) -> None:
+        """为代币分配唯一编号（兼容旧版本没有编号的状态文件）"""
+        coins = self.stats.setdefault("coins", []) + self.stats.get("coin_archive", [])
+        self._next_coin_id = max(max((coin.get("id", 0) for coin in coins), default=0) + 1,
+                                 self.stats.get("next_coin_id", 1))
+        for coin in coins:
+            if "id" not in coin:
+                coin["id"] = self._next_coin_id
+                self._next_coin_id += 1
+
+    def _sync_coin_views(self) -> None:
+        """将账本中的有效代币和归档代币同步到stats，需在持有self._coin_lock时调用"""
+        self.stats["coins"] = self._coin_ledger.live_coins()
+        self.stats["coin_archive"] = self._coin_ledger.archived
 
     def _save_config(self, config: Dict[str, Any]) -> None:
         """保存配置文件"""
@@ -53,13 +132,115 @@ class ConfigManager:
             app_logger.error(f"保存配置文件失败: {e}")
 
     def _save_stats(self, stats: Dict[str, Any]) -> None:
-        """保存状态文件"""
+        """保存完整状态，需在持有_hold_all_locks()时调用，释放锁后调用_store.persist_pending()"""
+        self.stats = stats
+        self.stats.setdefault("novel_progress", {})
+        self.stats.setdefault("device_sign_in_status", {})
+        self._sync_coin_views()
+        self._store.save(self.stats)
+
+    @contextmanager
+    def _hold_all_locks(self) -> Iterator[None]:
+        """按顺序持有所有领域的锁，用于整体读取或替换状态"""
+        with self._coin_lock, self._progress_locks.hold_all(), self._sign_in_lock:
+            yield
+
+    def _snapshot_stats(self) -> Dict[str, Any]:
+        """获取状态快照，供存储后端序列化；各领域分别在自己的锁下复制"""
+        with self._coin_lock:
+            self._sync_coin_views()
+            snapshot = {
+                key: copy.deepcopy(value) for key, value in list(self.stats.items())
+                if key not in ("novel_progress", "device_sign_in_status")
+            }
+        novel_progress = self.stats["novel_progress"]
+        snapshot["novel_progress"] = {
+            novel_name: self.get_novel_progress(novel_name) for novel_name in list(novel_progress)
+        }
+        with self._sign_in_lock:
+            snapshot["device_sign_in_status"] = dict(self.stats["device_sign_in_status"])
+        return snapshot
+
+    def _record(self, op: str, data: Dict[str, Any]) -> None:
+        """
+        应用一次状态修改并交给存储后端持久化，需在持有对应领域的锁时调用，释放锁后调用_store.persist_pending()
+
+        Args:
+            op: 操作类型
+            data: 操作数据
+        """
+        apply_mutation(self.stats, op, data)
+        self._persist(op, data)
+
+    def _persist(self, op: str, data: Dict[str, Any]) -> None:
+        """
+        将已应用到内存的修改交给存储后端持久化，需在持有对应领域的锁时调用，释放锁后调用_store.persist_pending()
+
+        Args:
+            op: 操作类型
+            data: 操作数据
+        """
+        try:
+            self._store.record(op, data)
+        except Exception as e:
+            app_logger.error(f"保存状态修改失败: {e}")
+
+    def flush(self) -> None:
+        """立即写入所有未保存的状态修改"""
+        self._store.flush()
+
+    def sync(self) -> None:
+        """将已记录的状态修改刷到磁盘（断电后不丢失）"""
+        self._store.sync()
+
+    def close(self) -> None:
+        """关闭状态存储，并写入剩余的状态修改"""
+        with self._coin_lock:
+            self._closed = True
+        self._store.close()
+
+    def _log_transaction(self, transaction_type: str, device_serial: Optional[str], amount: int,
+                         **details: Any) -> None:
+        """
+        追加一条代币流水，需在持有self._coin_lock时调用，保证流水顺序与状态修改一致
+
+        Args:
+            transaction_type: 流水类型（grant/spend/expire）
+            device_serial: 设备序列号
+            amount: 代币数量
+            details: 其它流水信息
+        """
         try:
-            with open(self.stats_file, 'w', encoding='utf-8') as f:
-                json.dump(stats, f, ensure_ascii=False, indent=4)
-            app_logger.info(f"状态文件已保存: {self.stats_file}")
+            self._coin_transactions.append(dict(
+                type=transaction_type,
+                timestamp=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                device_serial=device_serial,
+                amount=amount,
+                **details
+            ))
         except Exception as e:
-            app_logger.error(f"保存状态文件失败: {e}")
+            app_logger.error(f"写入代币流水失败: {e}")
+
+    def add_coin_listener(self, callback: Callable[[Set[str], Set[int]], None]) -> None:
+        """
+        注册代币变化监听器，代币添加、使用、过期后在修改所在的线程中回调
+
+        Args:
+            callback: 回调函数，参数为(发生变化的设备集合, 发生变化的代币编号集合)
+        """
+        self._coin_listeners.append(callback)
+
+    def _publish_coin_changes(self) -> None:
+        """通知监听器代币发生的变化，需在释放self._coin_lock后调用，避免回调中再次加锁导致等待"""
+        with self._coin_lock:
+            devices, coin_ids = self._coin_ledger.pop_changes()
+        if not devices and not coin_ids:
+            return
+        for callback in list(self._coin_listeners):
+            try:
+                callback(devices, coin_ids)
+            except Exception as e:
+                app_logger.error(f"代币变化回调执行失败: {e}")
 
     def get_config(self) -> Dict[str, Any]:
         """获取配置"""
@@ -71,86 +252,337 @@ class ConfigManager:
         self._save_config(self.config)
 
     def get_stats(self) -> Dict[str, Any]:
-        """获取状态"""
-        return self.stats
+        """获取状态快照（副本，修改后需通过update_stats保存）"""
+        return self._snapshot_stats()
 
     def update_stats(self, stats: Dict[str, Any]) -> None:
         """更新状态"""
-        self.stats.update(stats)
-        self._save_stats(self.stats)
+        with self._hold_all_locks():
+            self.stats.update(stats)
+            self._save_stats(self.stats)
+        self._store.persist_pending()
 
     def add_coin(self, device_serial, amount: int, expire_time: str) -> None:
         """添加代币"""
-        coins = self.stats.get("coins", [])
-        coin = {
-            "device_serial": device_serial,
-            "amount": amount,
-            "expire_time": expire_time,
-            "balance": amount
-        }
-        coins.append(coin)
-        self.stats["coins"] = coins
-        self._save_stats(self.stats)
+        with self._coin_lock:
+            coin_id = self._next_coin_id
+            self._next_coin_id += 1
+            coin = {
+                "id": coin_id,
+                "device_serial": device_serial,
+                "amount": amount,
+                "expire_time": expire_time,
+                "balance": amount
+            }
+            self._coin_ledger.add(coin)
+            self._persist("add_coin", {"coin": coin})
+            self._log_transaction("grant", device_serial, amount, coin_id=coin_id, expire_time=expire_time)
+        self._store.persist_pending()
+        self._publish_coin_changes()
         app_logger.log_coin_action("添加代币", amount, f"过期时间: {expire_time}")
 
-    def use_coins(self, amount: int) -> bool:
-        """使用代币，优先使用即将过期的代币"""
-        coins = self.stats.get("coins", [])
-        if not coins:
-            app_logger.warning("代币不足，无法使用")
-            return False
-
-        # 记录使用前的余额
-        total_before = sum(coin["balance"] for coin in coins)
+    def use_coins(self, amount: int, device_serial: Optional[str] = None, novel_name: Optional[str] = None,
+                  chapter: Optional[str] = None) -> bool:
+        """
+        使用代币，优先使用即将过期的代币
 
-        # 按过期时间排序，即将过期的在前面
-        coins.sort(key=lambda x: x["expire_time"])
+        Args:
+            amount: 使用数量
+            device_serial: 使用代币的设备
+            novel_name: 购买的小说
+            chapter: 购买的章节
 
-        remaining = amount
-        for coin in coins:
-            if remaining <= 0:
-                break
-
-            if coin["balance"] > 0:
-                if coin["balance"] >= remaining:
-                    coin["balance"] -= remaining
-                    remaining = 0
-                else:
-                    remaining -= coin["balance"]
-                    coin["balance"] = 0
-
-        if remaining > 0:
+        Returns:
+            bool: 是否使用成功
+        """
+        with self._coin_lock:
+            self._expire_coins()
+            # 记录使用前的余额
+            total_before = self._coin_ledger.total
+            splits = self._coin_ledger.spend(amount)
+            if splits is not None:
+                self._persist("spend_coins", {"splits": splits})
+                self._log_transaction("spend", device_serial, amount, novel_name=novel_name, chapter=chapter, splits=[
+                    {"coin_id": coin_id, "device_serial": self._coin_device(coin_id), "amount": used}
+                    for coin_id, used in splits
+                ])
+        self._store.persist_pending()
+        self._publish_coin_changes()
+        if splits is None:
             # 代币不足
             app_logger.warning(f"代币不足，需要{amount}个，实际只有{total_before}个")
             return False
-
-        self.stats["coins"] = coins
-        self._save_stats(self.stats)
         app_logger.log_coin_action("使用代币", amount, f"使用前余额: {total_before}")
         return True
 
+    def _coin_device(self, coin_id: int) -> Optional[str]:
+        """获取代币所属设备（包括刚刚归档的代币），需在持有self._coin_lock时调用"""
+        coin = self._coin_ledger.get_coin(coin_id)
+        if coin is None:
+            coin = next((c for c in reversed(self._coin_ledger.archived) if c["id"] == coin_id), None)
+        return coin["device_serial"] if coin else None
+
     def get_total_coins(self) -> int:
         """获取代币总余额"""
-        coins = self.stats.get("coins", [])
-        return sum(coin["balance"] for coin in coins)
+        with self._coin_lock:
+            self._expire_coins()
+            total = self._coin_ledger.total
+        self._store.persist_pending()
+        self._publish_coin_changes()
+        return total
 
-    def update_novel_progress(self, novel_name: str, chapter: str, device_id: str) -> None:
-        """更新小说识别进度"""
-        novel_progress = self.stats.get("novel_progress", {})
-        if novel_name not in novel_progress:
-            novel_progress[novel_name] = {}
-
-        novel_progress[novel_name][chapter] = {
-            "device_id": device_id,
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    def get_coin_summary(self, device_serials: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """
+        获取代币汇总信息（增量维护，不遍历代币）
+
+        Args:
+            device_serials: 需要汇总的设备，默认为所有持有过代币的设备
+
+        Returns:
+            Dict[str, Any]: {"total": 总余额, "nearest_expire_time": 最近过期时间,
+                             "devices": {设备序列号: {"balance": 余额, "nearest_expire_time": 最近过期时间,
+                                                   "expired_unused": 累计过期未使用数量}}}
+        """
+        with self._coin_lock:
+            self._expire_coins()
+            if device_serials is None:
+                device_serials = self._coin_ledger.devices()
+            summary = {
+                "total": self._coin_ledger.total,
+                "nearest_expire_time": self._coin_ledger.nearest_expire_time(),
+                "devices": {
+                    device_serial: self._device_coin_summary(device_serial)
+                    for device_serial in device_serials
+                }
+            }
+        self._store.persist_pending()
+        self._publish_coin_changes()
+        return summary
+
+    def _device_coin_summary(self, device_serial: str) -> Dict[str, Any]:
+        """获取设备的代币汇总信息，需在持有self._coin_lock时调用"""
+        return {
+            "balance": self._coin_ledger.device_balance(device_serial),
+            "nearest_expire_time": self._coin_ledger.device_nearest_expire_time(device_serial),
+            "expired_unused": self.stats.get("expired_unused_coins", {}).get(device_serial, 0)
         }
 
-        self.stats["novel_progress"] = novel_progress
-        self._save_stats(self.stats)
+    def sweep_coins(self, now: Optional[float] = None) -> Dict[str, int]:
+        """
+        清理代币：将已过期和余额已用尽的代币移入归档文件，并统计每个设备过期未使用的代币数量
+
+        Args:
+            now: 当前时间戳，默认为系统当前时间
+
+        Returns:
+            Dict[str, int]: 本次每个设备过期未使用的代币数量
+        """
+        with self._coin_lock:
+            expired_unused = self._expire_coins(now)
+        self._store.persist_pending()
+        self._publish_coin_changes()
+        return expired_unused
+
+    def _expire_coins(self, now: Optional[float] = None) -> Dict[str, int]:
+        """
+        过期代币：记录过期流水，并将已过期和余额已用尽的代币移入归档文件，需在持有self._coin_lock时调用。
+        所有代币过期都经过这里，保证每个过期的代币都有一条过期流水
+
+        Args:
+            now: 当前时间戳，默认为系统当前时间
+
+        Returns:
+            Dict[str, int]: 本次归档的每个设备过期未使用的代币数量，归档失败或已关闭时为空
+        """
+        if self._closed:
+            # 已关闭时不再写入流水、归档和状态存储，读取代币的方法返回关闭时的余额
+            return {}
+        for coin in self._coin_ledger.expire(now):
+            if coin["balance"] > 0:
+                self._log_transaction("expire", coin["device_serial"], coin["balance"], coin_id=coin["id"])
+        archived = self._coin_ledger.take_archived()
+        expired_unused: Dict[str, int] = {}
+        if not archived:
+            return expired_unused
+        for coin in archived:
+            if coin["balance"] > 0:
+                device_serial = coin["device_serial"]
+                expired_unused[device_serial] = expired_unused.get(device_serial, 0) + coin["balance"]
+        try:
+            self._coin_archive.append(archived)
+        except Exception as e:
+            app_logger.error(f"写入代币归档失败: {e}")
+            # 归档失败时放回账本，下次清理时重试
+            self._coin_ledger.archived = archived + self._coin_ledger.archived
+            return {}
+        self._record("archive_coins", {
+            "ids": [coin["id"] for coin in archived],
+            "expired_unused": expired_unused,
+            "next_coin_id": self._next_coin_id
+        })
+        app_logger.info(f"已归档代币 {len(archived)} 条，过期未使用: {expired_unused or '无'}")
+        return expired_unused
+
+    def load_coin_archive(self) -> List[Dict[str, Any]]:
+        """读取归档的代币（已过期或余额已用尽）"""
+        with self._coin_lock:
+            self._sync_coin_views()
+            pending = list(self.stats.get("coin_archive", []))
+        archived = {coin["id"]: coin for coin in self._coin_archive.load()}
+        archived.update((coin["id"], dict(coin)) for coin in pending)
+        return list(archived.values())
+
+    def query_coin_transactions(self, start_time: Optional[str] = None, end_time: Optional[str] = None,
+                                page: int = 0, page_size: int = 50,
+                                before_seq: Optional[int] = None) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        按时间范围分页查询代币流水，最新的在前
+
+        Args:
+            start_time: 起始时间（包含），yyyy-MM-dd HH:mm:ss
+            end_time: 结束时间（包含），yyyy-MM-dd HH:mm:ss
+            page: 页码，从0开始
+            page_size: 每页数量
+            before_seq: 只查询序号小于该值的流水
+
+        Returns:
+            Tuple[List[Dict[str, Any]], int]: (当前页流水, 范围内流水总数)
+        """
+        return self._coin_transactions.query(start_time, end_time, page, page_size, before_seq)
+
+    def get_coin_transactions_after(self, seq: int) -> List[Dict[str, Any]]:
+        """
+        获取序号大于seq的代币流水，最新的在前
+
+        Args:
+            seq: 起始序号（不包含）
+
+        Returns:
+            List[Dict[str, Any]]: 流水列表
+        """
+        return self._coin_transactions.read_after(seq)
+
+    def get_expired_unused_coins(self) -> Dict[str, int]:
+        """获取每个设备累计过期未使用的代币数量"""
+        with self._coin_lock:
+            return dict(self.stats.get("expired_unused_coins", {}))
+
+    def get_coin(self, coin_id: int) -> Optional[Dict[str, Any]]:
+        """
+        获取有余额的代币
+
+        Args:
+            coin_id: 代币编号
+
+        Returns:
+            Optional[Dict[str, Any]]: 代币信息的副本，代币已用尽或已过期时返回None
+        """
+        with self._coin_lock:
+            coin = self._coin_ledger.get_coin(coin_id)
+            return dict(coin) if coin else None
+
+    def claim_chapter(self, novel_name: str, chapter: str, device_id: str) -> bool:
+        """
+        领取章节（原子操作）：章节未处理且未被其它设备领取时，由该设备领取
+
+        Args:
+            novel_name: 小说名称
+            chapter: 章节名称
+            device_id: 设备ID
+
+        Returns:
+            bool: 是否领取成功（同一设备重复领取视为成功）
+        """
+        with self._progress_locks.get(novel_name):
+            if chapter in self.stats["novel_progress"].get(novel_name, {}):
+                return False
+            claims = self._chapter_claims.setdefault(novel_name, {})
+            owner = claims.get(chapter)
+            if owner is not None and owner != device_id:
+                return False
+            claims[chapter] = device_id
+            return True
+
+    def release_chapter(self, novel_name: str, chapter: str, device_id: str) -> None:
+        """
+        放弃已领取但未完成的章节，之后其它设备可以重新领取
+
+        Args:
+            novel_name: 小说名称
+            chapter: 章节名称
+            device_id: 设备ID
+        """
+        with self._progress_locks.get(novel_name):
+            claims = self._chapter_claims.get(novel_name, {})
+            if claims.get(chapter) == device_id:
+                del claims[chapter]
+
+    def update_novel_progress(self, novel_name: str, chapter: str, device_id: str) -> None:
+        """更新小说识别进度（同时释放该章节的领取）"""
+        with self._progress_locks.get(novel_name):
+            self._record("chapter_completed", {
+                "novel_name": novel_name,
+                "chapter": chapter,
+                "device_id": device_id,
+                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            })
+            self._chapter_claims.get(novel_name, {}).pop(chapter, None)
+        self._store.persist_pending()
+
+    def get_novel_progress(self, novel_name: str) -> Dict[str, Dict[str, Any]]:
+        """
+        获取小说的章节进度
+
+        Args:
+            novel_name: 小说名称
+
+        Returns:
+            Dict[str, Dict[str, Any]]: 进度副本 {章节: {"device_id": 设备ID, "timestamp": 完成时间}}
+        """
+        with self._progress_locks.get(novel_name):
+            return copy.deepcopy(self.stats["novel_progress"].get(novel_name, {}))
+
+    def record_sign_in(self, device_serial: str, sign_in_date: str) -> None:
+        """记录设备签到日期"""
+        with self._sign_in_lock:
+            self._record("sign_in", {"device_serial": device_serial, "date": sign_in_date})
+        self._store.persist_pending()
+
+    def claim_sign_in(self, device_serial: str, sign_in_date: str) -> bool:
+        """
+        领取设备的签到（原子操作）：设备当天尚未签到、也没有正在进行的签到时才能领取，
+        签到结束后需调用finish_sign_in
+
+        Args:
+            device_serial: 设备序列号
+            sign_in_date: 签到日期
+
+        Returns:
+            bool: 是否领取成功，设备当天已签到或正在签到时返回False
+        """
+        with self._sign_in_lock:
+            if (self.stats["device_sign_in_status"].get(device_serial) == sign_in_date
+                    or device_serial in self._signing_in):
+                return False
+            self._signing_in.add(device_serial)
+            return True
+
+    def finish_sign_in(self, device_serial: str, sign_in_date: str, succeeded: bool) -> None:
+        """
+        结束claim_sign_in领取的签到，签到成功时记录签到日期，失败时其它调用方可以重新领取
+
+        Args:
+            device_serial: 设备序列号
+            sign_in_date: 签到日期
+            succeeded: 签到是否成功
+        """
+        with self._sign_in_lock:
+            self._signing_in.discard(device_serial)
+            if succeeded:
+                self._record("sign_in", {"device_serial": device_serial, "date": sign_in_date})
+        self._store.persist_pending()
 
     def is_chapter_processed(self, novel_name: str, chapter: str) -> bool:
         """检查章节是否已被处理"""
-        novel_progress = self.stats.get("novel_progress", {})
-        if novel_name not in novel_progress:
-            return False
-        return chapter in novel_progress[novel_name]
+        with self._progress_locks.get(novel_name):
+            return chapter in self.stats["novel_progress"].get(novel_name, {})
@@ -0,0 +1,215 @@
+"""
+设备识别流水线模块
+单台设备的双缓冲流水线: 识别上一屏的同时滑动并截取下一屏，利用MaaFramework任务句柄异步等待，
+并统计各阶段耗时和重叠程度
+"""
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy
+from maa.tasker import Tasker
+
+from capture_pipeline import SpooledImageController, capture_crop, frame_difference
+from chapter_reader import ChapterReader, line_pitch, ocr_results_to_rows
+from logger import app_logger
+from page_stitcher import PageStitcher
+
+
+@dataclass
+class StageStats:
+    """一个阶段的耗时统计"""
+    count: int = 0
+    seconds: float = 0.0
+
+    def add(self, seconds: float) -> None:
+        self.count += 1
+        self.seconds += seconds
+
+    @property
+    def average_ms(self) -> float:
+        return self.seconds / self.count * 1000 if self.count else 0.0
+
+
+class PendingOcr:
+    """已提交、尚未等待结果的识别任务"""
+
+    def __init__(self, pipeline: "DevicePipeline", job, posted_at: float):
+        self._pipeline = pipeline
+        self._job = job
+        self._posted_at = posted_at
+
+    def wait(self) -> List[Tuple[float, str]]:
+        """
+        等待识别完成
+
+        Returns:
+            List[Tuple[float, str]]: 从上到下的(行的垂直中心, 文本)
+        """
+        start = time.perf_counter()
+        detail = self._job.wait().get()
+        end = time.perf_counter()
+        self._pipeline.record_ocr(end - self._posted_at, end - start)
+        if not detail or not detail.nodes or detail.nodes[0].recognition is None:
+            return []
+        return ocr_results_to_rows(detail.nodes[0].recognition.all_results)
+
+
+class DevicePipeline:
+    """
+    单台设备的双缓冲识别流水线
+
+    设备的Tasker负责截图和滑动；识别使用另一个绑定同一资源的Tasker，它的控制器把指定的截图作为屏幕画面，
+    因此识别某一屏时设备可以同时滑动、截取下一屏。同一时间只有一个识别任务在进行。
+    """
+
+    STAGES = ("screencap", "swipe", "ocr", "ocr_wait", "page")
+
+    def __init__(self, tasker: Tasker, resource, ocr_node: str = "ocrChapterPage"):
+        """
+        Args:
+            tasker: 设备的Tasker实例
+            resource: 已加载的资源
+            ocr_node: 识别正文的流水线节点
+        """
+        self.tasker = tasker
+        self.ocr_node = ocr_node
+        self._ocr_controller = SpooledImageController()
+        self._ocr_controller.post_connection().wait()
+        self._ocr_tasker = Tasker()
+        self._ocr_tasker.bind(resource, self._ocr_controller)
+        if not self._ocr_tasker.inited:
+            raise RuntimeError("初始化识别Tasker失败")
+        self._lock = threading.Lock()
+        self._stats: Dict[str, StageStats] = {stage: StageStats() for stage in self.STAGES}
+
+    def screencap(self) -> numpy.ndarray:
+        """截取设备屏幕"""
+        start = time.perf_counter()
+        self.tasker.controller.post_screencap().wait()
+        image = self.tasker.controller.cached_image
+        self._record("screencap", time.perf_counter() - start)
+        return image
+
+    def post_ocr(self, image: numpy.ndarray) -> PendingOcr:
+        """
+        提交一屏截图的识别，不等待结果
+
+        Args:
+            image: 截图，需在上一个识别任务完成后提交
+
+        Returns:
+            PendingOcr: 识别任务
+        """
+        self._ocr_controller.image = image
+        posted_at = time.perf_counter()
+        return PendingOcr(self, self._ocr_tasker.post_task(self.ocr_node), posted_at)
+
+    def swipe(self, x: int, from_y: int, to_y: int, duration: int, settle: float) -> None:
+        """在设备上滑动并等待画面静止"""
+        start = time.perf_counter()
+        self.tasker.controller.post_swipe(x, from_y, x, to_y, duration).wait()
+        time.sleep(settle)
+        self._record("swipe", time.perf_counter() - start)
+
+    def record_ocr(self, latency: float, waited: float) -> None:
+        """记录识别任务从提交到完成的时间，以及其中设备线程空等的时间"""
+        with self._lock:
+            self._stats["ocr"].add(latency)
+            self._stats["ocr_wait"].add(waited)
+
+    def record_page(self, seconds: float) -> None:
+        """记录处理一屏的总时间"""
+        self._record("page", seconds)
+
+    def report(self) -> Dict[str, float]:
+        """
+        各阶段平均耗时和重叠程度
+
+        Returns:
+            Dict[str, float]: {各阶段_ms, overlap}，overlap为识别时间中被截图和滑动覆盖的比例
+        """
+        with self._lock:
+            report = {f"{stage}_ms": stats.average_ms for stage, stats in self._stats.items()}
+            ocr = self._stats["ocr"].seconds
+            report["overlap"] = (ocr - self._stats["ocr_wait"].seconds) / ocr if ocr else 0.0
+            return report
+
+    def _record(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self._stats[stage].add(seconds)
+
+
+class PipelinedChapterReader(ChapterReader):
+    """
+    双缓冲章节阅读器
+
+    识别第N屏的同时滑动并截取第N+1屏。滑动距离在第N屏识别完成前就要确定，因此按最近一屏已识别的布局计算；
+    滑动后画面没有变化，或识别出的新一屏与已拼接文本完全重叠时，说明已到章节末尾。
+    """
+
+    def __init__(self, tasker, pipeline: DevicePipeline, change_threshold: float = 2.0, **kwargs):
+        """
+        Args:
+            tasker: 设备的Tasker实例
+            pipeline: 设备的识别流水线
+            change_threshold: 两帧平均灰度差低于该值时视为画面没有变化
+            **kwargs: ChapterReader的其它参数
+        """
+        super().__init__(tasker, **kwargs)
+        self.pipeline = pipeline
+        self.change_threshold = change_threshold
+
+    def read(self, should_stop: Callable[[], bool] = lambda: False) -> str:
+        stitcher = PageStitcher()
+        layout: Optional[Tuple[float, int]] = None
+        if self.scroll_controller is not None:
+            layout = self.scroll_controller.layout(self.device)
+        image = self.pipeline.screencap()
+        pending = self.pipeline.post_ocr(image)
+        distance = 0
+        for page in range(self.max_pages):
+            start = time.perf_counter()
+            if should_stop():
+                pending.wait()
+                break
+            # 识别当前屏的同时滑动并截取下一屏
+            next_distance = self._distance(layout)
+            self.pipeline.swipe(self.swipe_x, self.swipe_from, self.swipe_from - next_distance,
+                                self.swipe_duration, self.settle)
+            next_image = self.pipeline.screencap()
+            rows = pending.wait()
+            lines = [text for _, text in rows]
+            pitch = line_pitch(rows)
+            overlap = stitcher.add_page(lines)
+            self.pipeline.record_page(time.perf_counter() - start)
+            if page > 0:
+                if self.scroll_controller is not None:
+                    self.scroll_controller.observe(self.device, pitch, distance, len(lines), overlap)
+                if overlap == len(lines):
+                    break
+                if overlap == 0:
+                    app_logger.warning(f"[{self.device}] 相邻两屏没有重叠，可能漏识别了部分内容，缩小滑动距离")
+            if pitch > 0:
+                layout = (pitch, len(lines))
+            if frame_difference(capture_crop(image), capture_crop(next_image)) < self.change_threshold:
+                # 滑动后画面没有变化，当前屏已是章节末尾
+                break
+            image, distance = next_image, next_distance
+            pending = self.pipeline.post_ocr(image)
+        else:
+            pending.wait()
+            app_logger.warning(f"章节超过 {self.max_pages} 屏，停止识别")
+        if self.scroll_controller is not None:
+            self.scroll_controller.record_chapter(self.device, len(stitcher.page_lines))
+        app_logger.debug(f"章节识别完成: {len(stitcher.page_lines)} 屏, {len(stitcher.lines)} 行, "
+                         f"每屏重叠行数 {stitcher.overlaps[1:]}")
+        return stitcher.text()
+
+    def _distance(self, layout: Optional[Tuple[float, int]]) -> int:
+        """按最近一屏已识别的布局计算滑动距离"""
+        if self.scroll_controller is None or layout is None:
+            return self.swipe_from - self.swipe_to
+        return self.scroll_controller.distance(self.device, *layout)
@@ -0,0 +1,53 @@
+"""
+分键锁模块
+为每个键分配独立的锁，不同键上的操作互不阻塞
+"""
+
+import threading
+from contextlib import contextmanager
+from typing import Dict, Hashable, Iterator
+
+
+class KeyedLocks:
+    """
+    分键锁表
+
+    每个键对应一把可重入锁，首次使用时创建。已存在的锁可无锁获取；
+    hold_all()会持有所有键的锁并阻止创建新键，用于整体替换受保护的数据。
+    持有某个键的锁时不要再获取其它键的锁，避免与hold_all()互相等待。
+    """
+
+    def __init__(self):
+        self._guard = threading.Lock()
+        self._locks: Dict[Hashable, threading.RLock] = {}
+
+    def get(self, key: Hashable) -> threading.RLock:
+        """
+        获取键对应的锁
+
+        Args:
+            key: 键
+
+        Returns:
+            threading.RLock: 该键的锁
+        """
+        lock = self._locks.get(key)
+        if lock is None:
+            with self._guard:
+                lock = self._locks.get(key)
+                if lock is None:
+                    lock = self._locks[key] = threading.RLock()
+        return lock
+
+    @contextmanager
+    def hold_all(self) -> Iterator[None]:
+        """持有所有键的锁"""
+        with self._guard:
+            locks = list(self._locks.values())
+            for lock in locks:
+                lock.acquire()
+            try:
+                yield
+            finally:
+                for lock in reversed(locks):
+                    lock.release()
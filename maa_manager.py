@@ -18,6 +18,9 @@ from maa.toolkit import Toolkit, AdbDevice
 from maa.resource import Resource
 from maa.controller import AdbController
 
+from node_matcher import load_pipeline_nodes
+from ocr_cache import CACHED_OCR, CachedOcrRecognition
+
 
 class MaaFrameworkManager:
     """
@@ -45,6 +48,17 @@ class MaaFrameworkManager:
         # 存储设备控制器的字典
         self.device_controllers: Dict[str, AdbController] = {}
 
+        # 各设备的双缓冲识别流水线（DevicePipeline），首次使用时创建
+        self.device_pipelines: Dict[str, Any] = {}
+
+        # 流水线节点定义，供在同一张截图上匹配多个节点
+        self.pipeline_nodes: Dict[str, Dict[str, Any]] = {}
+
+        # 带缓存的OCR识别，画面没有变化时复用上次的识别结果
+        self.ocr_cache = CachedOcrRecognition()
+        # {被包装的OCR节点: 带缓存的包装节点}
+        self.cached_ocr_nodes: Dict[str, str] = {}
+
         # 初始化日志
         self.logger = logging.getLogger(__name__)
 
@@ -58,7 +72,7 @@ class MaaFrameworkManager:
     def _register_custom_recognitions(self):
         """注册自定义识别"""
         # 这里可以注册项目特定的识别逻辑
-        pass
+        self.resource.register_custom_recognition(CACHED_OCR, self.ocr_cache)
 
     def _register_custom_actions(self):
         """注册自定义动作"""
@@ -79,6 +93,11 @@ class MaaFrameworkManager:
 
             if res_job.status.succeeded:
                 self.logger.info("资源包加载成功")
+                self.pipeline_nodes = load_pipeline_nodes(self.resource_path)
+                self.cached_ocr_nodes = {
+                    node["custom_recognition_param"]["node"]: name for name, node in self.pipeline_nodes.items()
+                    if node.get("custom_recognition") == CACHED_OCR
+                }
             else:
                 self.logger.error("资源包加载失败")
 
@@ -165,6 +184,7 @@ class MaaFrameworkManager:
                 # 清理资源
                 if device_serial in self.device_controllers:
                     del self.device_controllers[device_serial]
+                self.device_pipelines.pop(device_serial, None)
 
                 del self.device_instances[device_serial]
                 self.logger.info(f"设备已断开: {device_serial}")
@@ -183,6 +203,36 @@ class MaaFrameworkManager:
         """
         return self.device_instances.get(device_serial)
 
+    def get_device_pipeline(self, device_serial: str) -> Optional[Any]:
+        """
+        获取设备的双缓冲识别流水线（识别上一屏的同时滑动、截取下一屏）
+
+        Args:
+            device_serial: 设备序列号
+
+        Returns:
+            设备的识别流水线，设备未连接时返回None
+        """
+        tasker = self.device_instances.get(device_serial)
+        if tasker is None:
+            return None
+        pipeline = self.device_pipelines.get(device_serial)
+        if pipeline is None or pipeline.tasker is not tasker:
+            # 流水线识别是可选功能，使用时才导入
+            from device_pipeline import DevicePipeline
+            pipeline = DevicePipeline(tasker, self.resource)
+            self.device_pipelines[device_serial] = pipeline
+        return pipeline
+
+    def pipeline_report(self) -> Dict[str, Dict[str, float]]:
+        """
+        各设备识别流水线的阶段耗时和重叠程度
+
+        Returns:
+            {设备序列号: DevicePipeline.report()}
+        """
+        return {device_serial: pipeline.report() for device_serial, pipeline in list(self.device_pipelines.items())}
+
     def get_connected_devices(self) -> List[str]:
         """
         获取已连接的设备列表
@@ -1,5 +1,5 @@
 import sys
-import time
+import threading
 from datetime import datetime, timedelta
 
 from PySide6.QtWidgets import (
@@ -8,9 +8,15 @@ from PySide6.QtWidgets import (
     QGroupBox, QFormLayout, QTabWidget, QListWidget, QTableWidget, QTableWidgetItem,
     QDialog, QListWidgetItem, QHeaderView
 )
-from PySide6.QtCore import Qt, QThread, Signal
+from PySide6.QtCore import Qt, QThread, Signal, QTimer
+from chapter_index import parse_chapter_number
+from chapter_reader import ChapterReader
+from chapter_scheduler import ChapterScheduler, expand_chapter_range
 from config_manager import ConfigManager
 from novel_processor import NovelProcessor
+from node_matcher import NodeMatcher
+from roi_learner import RoiLearner, learnable_nodes
+from screen_waiter import ScreenWaiter
 from maa_manager import MaaFrameworkManager, AdbDevice
 from logger import app_logger
 from ui.home_tab import HomeTabWidget
@@ -21,17 +27,29 @@ import os
 import json
 import pathlib
 
+# 判断签到状态的最多截图次数
+SIGN_IN_STATE_ATTEMPTS = 5
+
 
 class NovelProcessorThread(QThread):
     """小说处理线程"""
     progress_updated = Signal(str)
     finished_signal = Signal(bool, str)
 
-    def __init__(self, config_manager, novel_processor):
+    def __init__(self, config_manager, novel_processor, maa_manager):
         super().__init__()
         self.config_manager = config_manager
         self.novel_processor = novel_processor
+        self.maa_manager = maa_manager
         self.running = False
+        self.target_novel = ""
+        self.total_chapters = 0
+        self.finished_chapters = 0
+        self._progress_lock = threading.Lock()
+        # 先截图后识别模式下的识别流水线
+        self.ocr_pipeline = None
+        # 识别或保存失败的章节（先截图后识别模式，在识别流水线线程中添加）
+        self.failed_chapters = []
 
     def run(self):
         """执行小说处理任务"""
@@ -40,55 +58,253 @@ class NovelProcessorThread(QThread):
             self.progress_updated.emit("开始处理小说...")
 
             config = self.config_manager.get_config()
-            target_novel = config.get("target_novel", "")
+            self.target_novel = config.get("target_novel", "")
             start_chapter = config.get("start_chapter", "")
             end_chapter = config.get("end_chapter", "")
 
-            if not target_novel:
+            if not self.target_novel:
                 self.finished_signal.emit(False, "请先设置目标小说")
                 return
 
-            self.progress_updated.emit(f"正在处理小说: {target_novel}")
-            self.progress_updated.emit(f"处理章节范围: {start_chapter} - {end_chapter}")
-
-            # 这里应该是实际的小说处理逻辑
-            # 包括使用MaaFramework进行自动化操作
-            # 暂时用模拟代码替代
-
-            import time
-            for i in range(10):
-                if not self.running:
-                    break
-                self.progress_updated.emit(f"处理进度: {i + 1}/10")
-                # 模拟章节处理
-                chapter_name = f"第{i + 1}章"
-                if not self.novel_processor.is_chapter_processed(target_novel, chapter_name):
-                    # 模拟章节内容
-                    content = {
-                        "text": f"这是{chapter_name}的内容...",
-                        "page": i + 1
-                    }
-                    # 保存章节内容
-                    self.novel_processor.save_chapter_content(
-                        target_novel,
-                        chapter_name,
-                        content,
-                        "device_001"  # 设备ID，实际应用中应该动态获取
-                    )
-                    self.progress_updated.emit(f"已保存章节: {chapter_name}")
-                else:
-                    self.progress_updated.emit(f"章节已存在，跳过: {chapter_name}")
-                time.sleep(0.5)
+            devices = self.maa_manager.get_connected_devices()
+            if not devices:
+                self.finished_signal.emit(False, "请先连接设备")
+                return
+
+            if not config.get("experimental_chapter_reading", False):
+                # 没有打开和购买章节的步骤，直接识别会把设备当前页面保存为每个章节的内容
+                self.finished_signal.emit(False, "章节的打开和购买尚未实现，"
+                                                 "如需调试识别流程请在配置中开启experimental_chapter_reading")
+                return
 
-            self.finished_signal.emit(True, "小说处理完成")
+            chapters = expand_chapter_range(start_chapter, end_chapter)
+            if not chapters:
+                self.finished_signal.emit(False, f"没有需要处理的章节，请检查章节范围: {start_chapter} - {end_chapter}")
+                return
+            # 通过章节索引按序号范围查出已保存的章节，只调度尚未保存的章节
+            index = self.novel_processor.get_chapter_index(self.target_novel)
+            saved_numbers = {
+                parse_chapter_number(chapter)
+                for chapter in index.range(parse_chapter_number(chapters[0]), parse_chapter_number(chapters[-1]))
+            }
+            pending = [chapter for chapter in chapters if parse_chapter_number(chapter) not in saved_numbers]
+            if not pending:
+                self.finished_signal.emit(True, f"没有需要处理的章节，{start_chapter} - {end_chapter} 已全部保存")
+                return
+            self.total_chapters = len(chapters)
+            self.finished_chapters = len(chapters) - len(pending)
+            self.progress_updated.emit(f"正在处理小说: {self.target_novel}")
+            self.progress_updated.emit(f"处理章节范围: {start_chapter} - {end_chapter}，共 {len(chapters)} 章，"
+                                       f"已保存 {self.finished_chapters} 章，使用 {len(devices)} 台设备")
+            self.progress_updated.emit(f"处理进度: {self.finished_chapters}/{self.total_chapters}")
+
+            # 先截图后识别模式: 设备只截图翻页，截图由进程池识别后再拼接保存
+            if config.get("chapter_read_mode", "online") == "deferred":
+                from capture_pipeline import DeferredOcrPipeline, PageSpool
+                self.ocr_pipeline = DeferredOcrPipeline(
+                    PageSpool(os.path.join(self.novel_processor.state_dir, "capture_spool"),
+                              config.get("capture_spool_pages", 200)),
+                    self.save_captured_chapter,
+                    self.maa_manager.resource_path,
+                    workers=config.get("ocr_workers") or None,
+                    scroll_controller=self.novel_processor.scroll_controller,
+                    lease_manager=self.novel_processor.lease_manager
+                )
+
+            # 每台设备一个工作线程，空闲设备从较慢设备的队列尾部窃取章节
+            scheduler = ChapterScheduler(pending, devices)
+            self.failed_chapters = []
+            pipeline_failed = 0
+            try:
+                scheduler.run(self.process_chapter, should_stop=lambda: not self.running)
+            finally:
+                if self.ocr_pipeline is not None:
+                    self.progress_updated.emit("等待暂存的截图识别完成...")
+                    self.ocr_pipeline.close()
+                    report = self.ocr_pipeline.report()
+                    pipeline_failed = report['failed']
+                    self.progress_updated.emit(
+                        f"识别截图 {report['pages']} 屏，平均每屏 {report['average_ocr_ms']:.0f}ms，"
+                        f"保存 {report['chapters']} 章，失败 {report['failed']} 章，"
+                        f"设备等待识别 {report['spool_wait_seconds']:.1f}s"
+                    )
+                    self.ocr_pipeline = None
+
+            summary = ", ".join(f"{device}: {count}章" for device, count in scheduler.completed.items())
+            self.progress_updated.emit(f"各设备处理章节数: {summary}")
+            scroll_controller = self.novel_processor.scroll_controller
+            scroll_controller.save()
+            for device, report in scroll_controller.report().items():
+                self.progress_updated.emit(
+                    f"[{device}] 平均每章 {report['screens_per_chapter']:.1f} 屏，"
+                    f"相邻两屏平均重叠 {report['average_overlap']:.1f} 行，无重叠 {report['missed']} 次"
+                )
+            for device, report in self.maa_manager.pipeline_report().items():
+                self.progress_updated.emit(
+                    f"[{device}] 每屏 {report['page_ms']:.0f}ms: 截图 {report['screencap_ms']:.0f}ms，"
+                    f"滑动 {report['swipe_ms']:.0f}ms，识别 {report['ocr_ms']:.0f}ms"
+                    f"（等待 {report['ocr_wait_ms']:.0f}ms），识别与截图滑动重叠 {report['overlap']:.0%}"
+                )
+            # 先截图后识别模式下设备完成截图即算处理完，章节是否保存以进度记录为准
+            unsaved = [chapter for chapter in pending
+                       if not self.novel_processor.is_chapter_processed(self.target_novel, chapter)]
+            if scheduler.unassigned:
+                self.finished_signal.emit(False, f"没有可用的设备，{len(scheduler.unassigned)} 章未处理: "
+                                                 f"{', '.join(scheduler.unassigned)}")
+            elif scheduler.skipped:
+                self.finished_signal.emit(False, f"{len(scheduler.skipped)} 章正在被其它设备处理，本次未完成: "
+                                                 f"{', '.join(scheduler.skipped)}")
+            elif scheduler.remaining():
+                self.finished_signal.emit(False, f"还有 {scheduler.remaining()} 章未处理")
+            elif pipeline_failed or self.failed_chapters or unsaved:
+                failed = sorted(set(self.failed_chapters) | set(unsaved), key=parse_chapter_number)
+                self.finished_signal.emit(False, f"部分完成，识别失败 {pipeline_failed} 章，"
+                                                 f"{len(failed)} 章未保存: {', '.join(failed)}")
+            else:
+                self.novel_processor.finish_novel(self.target_novel, chapters)
+                self.finished_signal.emit(True, "小说处理完成")
         except Exception as e:
             self.finished_signal.emit(False, f"处理出错: {str(e)}")
 
+    def process_chapter(self, device_serial, chapter_name):
+        """
+        在指定设备上处理一个章节（在调度器的设备线程中执行）
+
+        Returns:
+            bool: 章节正被其它设备处理、本次跳过时返回False
+        """
+        # 领取章节后才能购买，避免多个设备重复购买同一章节
+        lease = self.novel_processor.claim_chapter(self.target_novel, chapter_name, device_serial)
+        if lease is None:
+            if not self.novel_processor.is_chapter_processed(self.target_novel, chapter_name):
+                self.progress_updated.emit(f"章节正在被其它设备处理，跳过: {chapter_name}")
+                return False
+            self.progress_updated.emit(f"章节已存在，跳过: {chapter_name}")
+        else:
+            try:
+                with self.novel_processor.lease_manager.keep_alive(lease) as lease_lost:
+                    tasker = self.maa_manager.get_device_tasker(device_serial)
+                    if tasker is None:
+                        raise RuntimeError(f"无法获取设备 {device_serial} 的tasker实例")
+                    # 章节的打开和购买尚未实现（见experimental_chapter_reading），识别设备上当前打开的页面
+                    if self.ocr_pipeline is not None:
+                        # 只截图，识别和保存由流水线完成后调用save_captured_chapter
+                        self.capture_chapter(tasker, device_serial, chapter_name, lease, lease_lost)
+                        # 截图已交给流水线，是否保存成功在流水线结束后按识别报告和进度记录判断
+                        return True
+                    # 逐屏识别正文，相邻两屏的重叠部分在拼接时去重；流水线模式下识别与滑动、截图重叠进行
+                    if self.config_manager.get_config().get("pipelined_reading", False):
+                        from device_pipeline import PipelinedChapterReader
+                        reader = PipelinedChapterReader(tasker, self.maa_manager.get_device_pipeline(device_serial),
+                                                        scroll_controller=self.novel_processor.scroll_controller,
+                                                        device=device_serial)
+                    else:
+                        reader = ChapterReader(tasker, scroll_controller=self.novel_processor.scroll_controller,
+                                               device=device_serial)
+                    text = reader.read(
+                        should_stop=lambda: lease_lost.is_set() or not self.running
+                    )
+                    if lease_lost.is_set() or not self.running:
+                        raise RuntimeError(f"章节识别未完成: {chapter_name}")
+                    content = {
+                        "text": text,
+                        "device": device_serial
+                    }
+            except Exception:
+                self.novel_processor.release_chapter(lease)
+                raise
+            # 保存章节内容
+            if not self.novel_processor.save_chapter_content(
+                self.target_novel,
+                chapter_name,
+                content,
+                device_serial,
+                lease
+            ):
+                self.novel_processor.release_chapter(lease)
+                raise RuntimeError(f"保存章节失败: {chapter_name}")
+            self.progress_updated.emit(f"[{device_serial}] 已保存章节: {chapter_name}")
+
+        with self._progress_lock:
+            self.finished_chapters += 1
+            finished = self.finished_chapters
+        self.progress_updated.emit(f"处理进度: {finished}/{self.total_chapters}")
+        return True
+
+    def capture_chapter(self, tasker, device_serial, chapter_name, lease, lease_lost):
+        """截图章节并交给识别流水线（先截图后识别模式）"""
+        job = self.ocr_pipeline.create_job(self.target_novel, chapter_name, device_serial, lease)
+        from capture_pipeline import ChapterCapturer
+        capturer = ChapterCapturer(tasker, self.ocr_pipeline, scroll_controller=self.novel_processor.scroll_controller,
+                                   device=device_serial)
+        if not capturer.capture(job, should_stop=lambda: lease_lost.is_set() or not self.running):
+            self.ocr_pipeline.abandon(job)
+            raise RuntimeError(f"章节截图未完成: {chapter_name}")
+        self.progress_updated.emit(f"[{device_serial}] 已截图章节: {chapter_name}，等待识别")
+
+    def save_captured_chapter(self, job, text):
+        """保存识别完成的章节（在识别流水线线程中执行），识别失败时释放租约，下次运行重新处理"""
+        if text is None:
+            if job.lease is not None:
+                self.novel_processor.release_chapter(job.lease)
+            self._record_failed_chapter(job)
+            self.progress_updated.emit(f"[{job.device}] 章节识别失败: {job.chapter_name}")
+            return
+        # 上次运行遗留的截图没有租约，章节可能已被重新处理
+        if job.lease is None and self.novel_processor.is_chapter_processed(job.novel_name, job.chapter_name):
+            return
+        content = {
+            "text": text,
+            "device": job.device
+        }
+        if not self.novel_processor.save_chapter_content(job.novel_name, job.chapter_name, content, job.device,
+                                                         job.lease):
+            if job.lease is not None:
+                self.novel_processor.release_chapter(job.lease)
+            self._record_failed_chapter(job)
+            self.progress_updated.emit(f"[{job.device}] 保存章节失败: {job.chapter_name}")
+            return
+        self.progress_updated.emit(f"[{job.device}] 已保存章节: {job.chapter_name}")
+        if job.novel_name == self.target_novel:
+            with self._progress_lock:
+                self.finished_chapters += 1
+                finished = self.finished_chapters
+            self.progress_updated.emit(f"处理进度: {finished}/{self.total_chapters}")
+
+    def _record_failed_chapter(self, job):
+        """记录本次运行的小说中识别或保存失败的章节"""
+        if job.novel_name == self.target_novel:
+            with self._progress_lock:
+                self.failed_chapters.append(job.chapter_name)
+
     def stop(self):
         """停止处理"""
         self.running = False
 
 
+class NovelExportThread(QThread):
+    """小说导出线程"""
+    progress_updated = Signal(int, int)
+    finished_signal = Signal(bool, str)
+
+    def __init__(self, novel_processor, novel_name, output_path):
+        super().__init__()
+        self.novel_processor = novel_processor
+        self.novel_name = novel_name
+        self.output_path = output_path
+
+    def run(self):
+        """执行导出任务"""
+        success = self.novel_processor.export_novel_to_txt(
+            self.novel_name, self.output_path, progress_callback=self.report_progress)
+        self.finished_signal.emit(success, self.output_path)
+
+    def report_progress(self, written, total):
+        """每写入1%的章节通知一次界面，避免大量信号堆积"""
+        if written == total or written % max(total // 100, 1) == 0:
+            self.progress_updated.emit(written, total)
+
+
 class MainWindow(QMainWindow):
     """主窗口类"""
 
@@ -98,7 +314,11 @@ class MainWindow(QMainWindow):
         self.novel_processor = NovelProcessor(self.config_manager)
         # 直接使用MaaFrameworkManager
         self.maa_manager = MaaFrameworkManager()
+        # 签到等流程中没有固定roi的OCR节点学到的识别区域，先识别该区域，识别不到再识别全屏
+        self.roi_learner = RoiLearner(os.path.join(self.novel_processor.state_dir, "roi_profiles.json"),
+                                      learnable_nodes(self.maa_manager.pipeline_nodes))
         self.processor_thread = None
+        self.export_thread = None
         self.novels = []  # 小说列表
         # 存储设备签到状态 {device_serial: last_sign_in_date}
         self.device_sign_in_status = {}
@@ -106,6 +326,8 @@ class MainWindow(QMainWindow):
         self.load_device_sign_in_status()
         self.init_ui()
         self.load_data()
+        # 每天零点清理过期代币
+        self.schedule_coin_sweep()
 
     def init_ui(self):
         """初始化UI"""
@@ -171,22 +393,40 @@ class MainWindow(QMainWindow):
         try:
             stats = self.config_manager.get_stats()
             if "device_sign_in_status" in stats:
-                self.device_sign_in_status = stats["device_sign_in_status"]
+                self.device_sign_in_status = dict(stats["device_sign_in_status"])
             else:
                 self.device_sign_in_status = {}
         except Exception as e:
             app_logger.error(f"加载设备签到状态失败: {e}")
             self.device_sign_in_status = {}
 
-    def save_device_sign_in_status(self):
-        """保存设备签到状态"""
+    def finish_sign_in(self, device_serial, today, succeeded):
+        """结束领取的签到，签到成功时保存签到状态"""
         try:
-            stats = self.config_manager.get_stats()
-            stats["device_sign_in_status"] = self.device_sign_in_status
-            self.config_manager.update_stats(stats)
+            self.config_manager.finish_sign_in(device_serial, today, succeeded)
+            if succeeded:
+                self.device_sign_in_status[device_serial] = today
         except Exception as e:
             app_logger.error(f"保存设备签到状态失败: {e}")
 
+    def schedule_coin_sweep(self):
+        """在下一个零点触发代币清理"""
+        now = datetime.now()
+        next_midnight = now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        # 多等1秒，确保零点过期的代币已经过期
+        delay_ms = int((next_midnight - now).total_seconds() * 1000) + 1000
+        QTimer.singleShot(delay_ms, self.sweep_coins)
+
+    def sweep_coins(self):
+        """清理过期和已用尽的代币，并安排下一次清理"""
+        try:
+            expired_unused = self.config_manager.sweep_coins()
+            for device_serial, amount in expired_unused.items():
+                app_logger.log_coin_action("代币过期", amount, f"设备: {device_serial}")
+        except Exception as e:
+            app_logger.error(f"清理代币失败: {e}")
+        self.schedule_coin_sweep()
+
     def refresh_novel_list(self):
         """刷新小说列表"""
         self.home_tab.refresh_novel_list()
@@ -392,6 +632,9 @@ class MainWindow(QMainWindow):
 
     def export_current_novel(self):
         """导出当前小说"""
+        if self.export_thread and self.export_thread.isRunning():
+            return
+
         config = self.config_manager.get_config()
         target_novel = config.get("target_novel", "")
 
@@ -409,21 +652,30 @@ class MainWindow(QMainWindow):
             app_logger.info("用户取消了小说导出操作")
             return
 
-        # 导出小说
-        try:
-            success = self.novel_processor.export_novel_to_txt(target_novel, file_path)
-            if success:
-                self.novel_tab.novel_log.append(f"[成功] 小说已导出到: {file_path}")
-                QMessageBox.information(self, "成功", f"小说已导出到: {file_path}")
-                app_logger.log_novel_action("导出成功", target_novel, f"导出路径: {file_path}")
-            else:
-                self.novel_tab.novel_log.append("[错误] 导出小说失败")
-                QMessageBox.critical(self, "错误", "导出小说失败")
-                app_logger.error("小说导出失败")
-        except Exception as e:
-            self.novel_tab.novel_log.append(f"[错误] 导出小说失败: {str(e)}")
-            QMessageBox.critical(self, "错误", f"导出小说失败: {str(e)}")
-            app_logger.error(f"小说导出异常: {e}")
+        # 在后台线程中导出小说，避免大量章节读取阻塞界面
+        self.novel_tab.export_novel_btn.setEnabled(False)
+        self.novel_tab.novel_log.append(f"[{self.get_current_time()}] 开始导出小说: {target_novel}")
+        self.export_thread = NovelExportThread(self.novel_processor, target_novel, file_path)
+        self.export_thread.progress_updated.connect(self.update_export_progress)
+        self.export_thread.finished_signal.connect(self.export_finished)
+        self.export_thread.start()
+
+    def update_export_progress(self, written, total):
+        """更新导出进度"""
+        self.novel_tab.progress_label.setText(f"导出进度: {written}/{total}")
+
+    def export_finished(self, success, file_path):
+        """小说导出完成"""
+        self.novel_tab.export_novel_btn.setEnabled(True)
+        target_novel = self.export_thread.novel_name
+        if success:
+            self.novel_tab.novel_log.append(f"[成功] 小说已导出到: {file_path}")
+            QMessageBox.information(self, "成功", f"小说已导出到: {file_path}")
+            app_logger.log_novel_action("导出成功", target_novel, f"导出路径: {file_path}")
+        else:
+            self.novel_tab.novel_log.append("[错误] 导出小说失败")
+            QMessageBox.critical(self, "错误", "导出小说失败")
+            app_logger.error("小说导出失败")
 
     # 保留原来的方法，但进行适配
     def load_config(self):
@@ -453,30 +705,27 @@ class MainWindow(QMainWindow):
         today = date.today().strftime("%Y-%m-%d")
 
         for device_serial in connected_devices:
-            # 检查设备今天是否已经签到
-            if device_serial in self.device_sign_in_status and self.device_sign_in_status[device_serial] == today:
-                # 设备今天已经签到，跳过
-                app_logger.info(f"{device_serial}今日已签到")
+            # 领取签到：设备今天已经签到或正在签到时跳过
+            if not self.config_manager.claim_sign_in(device_serial, today):
+                app_logger.info(f"{device_serial}今日已签到或正在签到")
                 continue
 
+            succeeded = False
             try:
                 # 执行签到操作
-                # 设备签到
-                self.device_sign_in(device_serial)
-
-                # 更新签到状态并实时保存
-                self.device_sign_in_status[device_serial] = today
-                self.save_device_sign_in_status()
-                signed_in_count += 1
-
-                app_logger.log_device_action("设备签到", device_serial, "签到成功")
+                succeeded = bool(self.device_sign_in(device_serial))
+                if succeeded:
+                    signed_in_count += 1
+                    app_logger.log_device_action("设备签到", device_serial, "签到成功")
             except Exception as e:
                 app_logger.error(f"设备签到失败 {device_serial}: {e}")
+            finally:
+                # 签到成功时保存签到状态，失败时释放领取，之后可以重新签到
+                self.finish_sign_in(device_serial, today, succeeded)
 
         # 更新UI
         if signed_in_count > 0:
-            # 更新余额信息
-            self.update_balance_info()
+            # 余额信息由代币变化事件增量更新
             QMessageBox.information(self, "成功", f"成功为{signed_in_count}个设备签到")
         else:
             QMessageBox.information(self, "信息", "所有设备今天已经签到过了")
@@ -485,21 +734,21 @@ class MainWindow(QMainWindow):
         """根据设备序列号签到单个设备"""
         from datetime import date
 
-        # 检查设备今天是否已经签到
+        # 领取签到：设备今天已经签到或正在签到时不再签到
         today = date.today().strftime("%Y-%m-%d")
-        if device_serial in self.device_sign_in_status and self.device_sign_in_status[device_serial] == today:
-            QMessageBox.information(self, "信息", f"设备 {device_serial} 今天已经签到过了")
+        if not self.config_manager.claim_sign_in(device_serial, today):
+            QMessageBox.information(self, "信息", f"设备 {device_serial} 今天已经签到过了或正在签到")
             return
 
+        succeeded = False
         try:
             # 执行签到操作
-            if self.device_sign_in(device_serial):
-                # 更新签到状态并实时保存
-                self.device_sign_in_status[device_serial] = today
-                self.save_device_sign_in_status()
+            succeeded = bool(self.device_sign_in(device_serial))
+            if succeeded:
+                # 保存签到状态后再刷新设备列表
+                self.finish_sign_in(device_serial, today, True)
 
-                # 更新余额信息
-                self.update_balance_info()
+                # 余额信息由代币变化事件增量更新
                 self.refresh_device_list()  # 刷新设备列表以更新签到时间
 
                 QMessageBox.information(self, "成功", f"设备 {device_serial} 签到成功")
@@ -509,6 +758,9 @@ class MainWindow(QMainWindow):
         except Exception as e:
             app_logger.error(f"设备签到失败 {device_serial}: {e}")
             QMessageBox.critical(self, "错误", f"设备签到时发生错误: {e}")
+        finally:
+            if not succeeded:
+                self.finish_sign_in(device_serial, today, False)
 
     def device_sign_in(self, device_serial):
         """设备签到"""
@@ -519,26 +771,18 @@ class MainWindow(QMainWindow):
                 app_logger.error(f"无法获取设备 {device_serial} 的tasker实例")
                 return False
 
-            app_logger.info('启动应用，等待10秒启动时间...')
-            tasker.controller.post_start_app("com.xunyou.rb").wait()
-            time.sleep(10)
+            waiter = ScreenWaiter(tasker, device_serial, learner=self.roi_learner,
+                                  cached_nodes=self.maa_manager.cached_ocr_nodes)
             # 2. 进入我的页面进行签到
-            result = tasker.post_task("existsAndClickUser").wait()
-            # 如果存在，则循环点击跳过和手势引导
-            if result.succeeded is False:
-                app_logger.error(f"{device_serial}设备没有找到用户tabbar，关闭应用再次尝试")
-                tasker.controller.post_stop_app("com.xunyou.rb").wait()
-                app_logger.info('关闭应用，等待5秒...')
-                time.sleep(5)
-                app_logger.info('启动应用，等待10秒启动时间...')
-                tasker.controller.post_start_app("com.xunyou.rb").wait()
-                time.sleep(10)
-                tasker.post_task("existsAndClickUser").wait()
-            time.sleep(1)
+            self.open_user_page(tasker, waiter, device_serial)
             # 进入签到任务页面
-            tasker.post_task("existsAndClickSignInEntrance").wait()
-            time.sleep(3)
-            return self.ocr_sign_in_coin_num(device_serial, tasker)
+            waiter.wait_for_node("existsAndClickSignInEntrance", timeout=8, replaces=1)
+            # 等待签到页面加载完成（签到成功提示弹出）
+            waiter.wait_stable(timeout=5, replaces=3)
+            result = self.ocr_sign_in_coin_num(device_serial, tasker, waiter)
+            app_logger.info(f"[{device_serial}] 签到{waiter.summary()}")
+            self.save_recognition_stats()
+            return result
         except Exception as e:
             app_logger.error(f"设备签到失败 {device_serial}: {e}")
             return False
@@ -546,27 +790,59 @@ class MainWindow(QMainWindow):
         # 注意：这里需要使用MaaFramework来执行实际的签到操作
         # 由于我们没有具体的签到实现，这里只是模拟签到过程
 
-    def ocr_sign_in_coin_num(self, device_serial, tasker):
-        """识别签到硬币数量"""
-        if tasker.post_task("existsSignInSuccessTip").wait().succeeded:
-            app_logger.info('签到成功，识别代币数量')
-            result = tasker.post_task("ocrSignInCoinNum").wait().get()
-            if result and result.nodes and len(result.nodes) > 0:
-                coin_num_str = result.nodes[0].recognition.best_result.text
-                # 添加代币（模拟签到获得5个代币）
-                expire_time = (datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=7)).strftime("%Y-%m-%d %H:%M:%S")
-                self.config_manager.add_coin(device_serial, int(coin_num_str), expire_time)
-            else:
-                app_logger.error(f"{device_serial}设备没有识别到代币数量")
-            return True
-        else:
+    def open_user_page(self, tasker, waiter, device_serial):
+        """启动应用并进入我的页面，应用启动后找不到用户tabbar时重启应用再试一次"""
+        app_logger.info('启动应用，等待用户tabbar出现...')
+        tasker.controller.post_start_app("com.xunyou.rb").wait()
+        if waiter.wait_for_node("existsAndClickUser", timeout=20, replaces=10) is None:
+            app_logger.error(f"{device_serial}设备没有找到用户tabbar，关闭应用再次尝试")
+            tasker.controller.post_stop_app("com.xunyou.rb").wait()
+            app_logger.info('关闭应用，等待画面静止...')
+            waiter.wait_stable(timeout=5, replaces=5)
+            app_logger.info('启动应用，等待用户tabbar出现...')
+            tasker.controller.post_start_app("com.xunyou.rb").wait()
+            waiter.wait_for_node("existsAndClickUser", timeout=20, replaces=10)
+
+    def ocr_sign_in_coin_num(self, device_serial, tasker, waiter, attempts=SIGN_IN_STATE_ATTEMPTS):
+        """
+        识别签到状态和签到硬币数量
+
+        每次判断只截一次图：在同一张截图上依次匹配签到成功提示和签到页标志，
+        都不匹配时等待画面静止后重试，最多attempts次
+        """
+        matcher = NodeMatcher(tasker, self.maa_manager.pipeline_nodes, device_serial,
+                              learner=self.roi_learner)
+        for attempt in range(attempts):
+            match = matcher.match_first(["existsSignInSuccessTip", "existsSignInPageFlag"])
+            if match is not None and match.node == "existsSignInSuccessTip":
+                app_logger.info('签到成功，识别代币数量')
+                result = tasker.post_task("ocrSignInCoinNum").wait().get()
+                if result and result.nodes and len(result.nodes) > 0:
+                    coin_num_str = result.nodes[0].recognition.best_result.text
+                    # 添加代币（模拟签到获得5个代币）
+                    expire_time = (datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=7)).strftime("%Y-%m-%d %H:%M:%S")
+                    self.config_manager.add_coin(device_serial, int(coin_num_str), expire_time)
+                else:
+                    app_logger.error(f"{device_serial}设备没有识别到代币数量")
+                return True
             # 判断是否成功进入签到页面
-            if tasker.post_task("existsSignInPageFlag").wait().succeeded:
+            if match is not None:
                 app_logger.info('设备已签到')
                 return True
-            else:
-                time.sleep(3)
-                return self.ocr_sign_in_coin_num(device_serial, tasker)
+            if attempt + 1 < attempts:
+                waiter.wait_stable(timeout=3, replaces=3)
+        app_logger.error(f"{device_serial}设备 {attempts} 次都没有识别到签到页面")
+        return False
+
+    def save_recognition_stats(self):
+        """保存学到的识别区域，并记录各节点识别区域和OCR缓存的命中情况"""
+        self.roi_learner.save()
+        for node, report in self.roi_learner.report().items():
+            app_logger.debug(f"{node} 识别区域命中 {report['hits']} 次，未命中 {report['misses']} 次，"
+                             f"命中率 {report['hit_rate']:.0%}")
+        for node, report in self.maa_manager.ocr_cache.report().items():
+            app_logger.debug(f"{node} OCR缓存命中 {report['hits']} 次，未命中 {report['misses']} 次，"
+                             f"命中率 {report['hit_rate']:.0%}")
 
     def refresh_device_balance(self, device_serial):
         """刷新余额"""
@@ -576,32 +852,20 @@ class MainWindow(QMainWindow):
                 app_logger.error(f"无法获取设备 {device_serial} 的tasker实例")
                 return False
 
-            app_logger.info('启动应用，等待10秒启动时间...')
-            tasker.controller.post_start_app("com.xunyou.rb").wait()
-            time.sleep(10)
-            # 2. 进入我的页面进行签到
-            result = tasker.post_task("existsAndClickUser").wait()
-            # 如果存在，则循环点击跳过和手势引导
-            if result.succeeded is False:
-                app_logger.error(f"{device_serial}设备没有找到用户tabbar，关闭应用再次尝试")
-                tasker.controller.post_stop_app("com.xunyou.rb").wait()
-                app_logger.info('关闭应用，等待5秒...')
-                time.sleep(5)
-                app_logger.info('启动应用，等待10秒启动时间...')
-                tasker.controller.post_start_app("com.xunyou.rb").wait()
-                time.sleep(10)
-                tasker.post_task("existsAndClickUser").wait()
-            time.sleep(1)
+            waiter = ScreenWaiter(tasker, device_serial, learner=self.roi_learner,
+                                  cached_nodes=self.maa_manager.cached_ocr_nodes)
+            # 2. 进入我的页面
+            self.open_user_page(tasker, waiter, device_serial)
             # 进入代币账号页面
-            tasker.post_task("existsAndClickCoinEntrance").wait()
-            time.sleep(0.5)
+            waiter.wait_for_node("existsAndClickCoinEntrance", timeout=8, replaces=1)
             # 识别代币总数量
-            tasker.post_task("ocrTotalCoinNum").wait()
-            time.sleep(0.5)
+            waiter.wait_for_node("ocrTotalCoinNum", timeout=5, replaces=0.5)
             # 进入代币明细页
-            tasker.post_task("existsAndClickCoinEntrance").wait()
-            time.sleep(0.5)
+            waiter.wait_for_node("existsAndClickCoinEntrance", timeout=5, replaces=0.5)
+            waiter.wait_stable(timeout=3, replaces=0.5)
             # 识别代币明细
+            app_logger.info(f"[{device_serial}] 刷新余额{waiter.summary()}")
+            self.save_recognition_stats()
 
         except Exception as e:
             app_logger.error(f"刷新余额失败 {device_serial}: {e}")
@@ -619,9 +883,9 @@ class MainWindow(QMainWindow):
 
         # 更新小说Tab信息
         self.novel_tab.current_novel_label.setText(f"当前小说: {target_novel}")
-        self.novel_tab.progress_label.setText("进度: 0/10")
+        self.novel_tab.progress_label.setText("进度: 0")
 
-        self.processor_thread = NovelProcessorThread(self.config_manager, self.novel_processor)
+        self.processor_thread = NovelProcessorThread(self.config_manager, self.novel_processor, self.maa_manager)
         self.processor_thread.progress_updated.connect(self.update_novel_progress)
         self.processor_thread.finished_signal.connect(self.novel_process_finished)
 
@@ -677,6 +941,9 @@ class MainWindow(QMainWindow):
 
     def closeEvent(self, event):
         """窗口关闭事件"""
+        # 写入尚未保存的状态修改
+        self.config_manager.flush()
+        self.novel_processor.close()
         event.accept()
 
 
@@ -685,7 +952,10 @@ def main():
     app = QApplication(sys.argv)
     window = MainWindow()
     window.show()
-    sys.exit(app.exec())
+    exit_code = app.exec()
+    # 退出前停止状态写入线程，确保所有修改落盘
+    window.config_manager.close()
+    sys.exit(exit_code)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,182 @@
+"""
+多节点匹配模块
+截一次图、做一次全屏OCR，再按流水线中各OCR节点的expected/roi/replace在识别结果上逐个匹配，
+用于签到状态等需要在多个候选页面间判断分支的场景
+"""
+
+import json
+import os
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from logger import app_logger
+from roi_learner import RoiLearner, screen_resolution, union_box
+
+# 识别全屏所有文字的节点
+FULL_SCREEN_OCR_NODE = "ocrFullScreen"
+
+
+def load_pipeline_nodes(resource_path: str) -> Dict[str, Dict[str, Any]]:
+    """
+    读取资源包中所有流水线节点的定义
+
+    Args:
+        resource_path: 资源路径
+
+    Returns:
+        Dict[str, Dict[str, Any]]: {节点名称: 节点定义}
+    """
+    nodes: Dict[str, Dict[str, Any]] = {}
+    pipeline_dir = os.path.join(resource_path, "pipeline")
+    if not os.path.isdir(pipeline_dir):
+        return nodes
+    for root, _, files in os.walk(pipeline_dir):
+        for file_name in sorted(files):
+            if not file_name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(root, file_name), "r", encoding="utf-8") as f:
+                    nodes.update(json.load(f))
+            except (OSError, ValueError) as e:
+                app_logger.error(f"读取流水线文件失败 {file_name}: {e}")
+    return nodes
+
+
+@dataclass
+class NodeMatch:
+    """一个节点在截图上的匹配结果"""
+    node: str
+    text: str
+    # (x, y, w, h)
+    box: Tuple[int, int, int, int]
+
+
+class NodeMatcher:
+    """
+    单次截图的多节点匹配器
+
+    一次匹配只执行一个全屏OCR任务（一次截图、一次识别），候选节点按自身的roi筛选文字框，
+    按replace替换后用expected正则搜索，与MaaFramework的OCR节点判定方式一致。只支持OCR节点。
+    指定learner且所有候选节点都学到了识别区域时，先只识别这些区域的外接矩形，都不匹配时再识别全屏。
+    """
+
+    def __init__(self, tasker, nodes: Dict[str, Dict[str, Any]], device: str = "",
+                 learner: Optional[RoiLearner] = None):
+        """
+        Args:
+            tasker: 设备的Tasker实例
+            nodes: 流水线节点定义，见load_pipeline_nodes
+            device: 设备序列号（用于日志）
+            learner: 识别区域学习器，为None时总是识别全屏
+        """
+        self.tasker = tasker
+        self.nodes = nodes
+        self.device = device
+        self.learner = learner
+        self._resolution: Optional[str] = None
+        self._patterns: Dict[str, List["re.Pattern"]] = {}
+
+    def match_first(self, candidates: Sequence[str]) -> Optional[NodeMatch]:
+        """
+        截一次图，返回第一个匹配的候选节点
+
+        Args:
+            candidates: 候选节点名称，按优先级排列
+
+        Returns:
+            Optional[NodeMatch]: 匹配结果，都不匹配时返回None
+        """
+        matches = self._match(candidates, first=True)
+        return matches[0] if matches else None
+
+    def match_all(self, candidates: Sequence[str]) -> List[NodeMatch]:
+        """
+        截一次图，返回所有匹配的候选节点
+
+        Args:
+            candidates: 候选节点名称
+
+        Returns:
+            List[NodeMatch]: 按候选顺序排列的匹配结果
+        """
+        return self._match(candidates, first=False)
+
+    def _match(self, candidates: Sequence[str], first: bool) -> List[NodeMatch]:
+        region = None
+        if self.learner is not None:
+            if self._resolution is None:
+                self._resolution = screen_resolution(self.tasker)
+            for node in candidates:
+                roi = self.learner.roi(self._resolution, node)
+                if roi is None:
+                    region = None
+                    break
+                region = union_box(region, roi)
+        if region is not None:
+            matches = self._evaluate(candidates, self._ocr(region), first)
+            if matches:
+                for match in matches:
+                    self.learner.record_hit(self._resolution, match.node, match.box)
+                return matches
+        matches = self._evaluate(candidates, self._ocr(), first)
+        if self.learner is not None:
+            for match in matches:
+                self.learner.record_fallback(self._resolution, match.node, match.box, learned=region is not None)
+        return matches
+
+    def _evaluate(self, candidates: Sequence[str], results: Sequence[Any], first: bool) -> List[NodeMatch]:
+        matches = []
+        for node in candidates:
+            match = self._match_node(node, results)
+            if match is not None:
+                matches.append(match)
+                if first:
+                    break
+        return matches
+
+    def _ocr(self, roi: Optional[Sequence[int]] = None) -> List[Any]:
+        """执行一次OCR（默认全屏），返回所有文字框"""
+        # 只识别一次，不重复截图等待
+        override: Dict[str, Any] = {"timeout": 0}
+        if roi is not None:
+            override["roi"] = list(roi)
+        detail = self.tasker.post_task(FULL_SCREEN_OCR_NODE, {FULL_SCREEN_OCR_NODE: override}).wait().get()
+        if not detail or not detail.nodes or detail.nodes[0].recognition is None:
+            return []
+        return list(detail.nodes[0].recognition.all_results)
+
+    def _match_node(self, node: str, results: Sequence[Any]) -> Optional[NodeMatch]:
+        definition = self.nodes.get(node)
+        if definition is None or definition.get("recognition") != "OCR":
+            raise ValueError(f"{node} 不是OCR节点")
+        roi = definition.get("roi")
+        for result in results:
+            box = tuple(result.box)
+            if roi and not _contains(roi, box):
+                continue
+            text = result.text
+            for old, new in definition.get("replace", []):
+                text = re.sub(old, new, text)
+            if any(pattern.search(text) for pattern in self._node_patterns(node, definition)):
+                app_logger.debug(f"[{self.device}] {node} 匹配: {text} {box}")
+                return NodeMatch(node, text, box)
+        return None
+
+    def _node_patterns(self, node: str, definition: Dict[str, Any]) -> List["re.Pattern"]:
+        patterns = self._patterns.get(node)
+        if patterns is None:
+            expected = definition.get("expected", "")
+            if isinstance(expected, str):
+                expected = [expected]
+            # expected为空时匹配任意文字
+            patterns = [re.compile(pattern) for pattern in expected] or [re.compile("")]
+            self._patterns[node] = patterns
+        return patterns
+
+
+def _contains(roi: Sequence[int], box: Sequence[int]) -> bool:
+    """文字框的中心是否在roi内"""
+    center_x = box[0] + box[2] / 2
+    center_y = box[1] + box[3] / 2
+    return roi[0] <= center_x < roi[0] + roi[2] and roi[1] <= center_y < roi[1] + roi[3]
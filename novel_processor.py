@@ -5,10 +5,31 @@
 
 import os
 import json
+import re
+import threading
+import zlib
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, Any, List
+from itertools import islice
+from typing import BinaryIO, Callable, Deque, Dict, Any, List, Optional
+from chapter_index import ChapterIndex
+from chapter_lease import ChapterLease, ChapterLeaseManager
+from chapter_store import create_chapter_store
 from config_manager import ConfigManager
+from scroll_controller import ScrollController
+from search_index import SearchHit, SearchIndex
 from logger import app_logger
+from stats_persister import atomic_write_json
+
+
+# 导出TXT时的写缓冲区大小，以及每个读取任务包含的章节数
+EXPORT_BUFFER_SIZE = 1024 * 1024
+EXPORT_BATCH_SIZE = 16
+# 导出检查点文件后缀（位于输出文件旁）
+EXPORT_CHECKPOINT_SUFFIX = ".export.json"
+# 已经带有"第…章"的章节名称，导出标题不再包裹
+CHAPTER_TITLE_PATTERN = re.compile(r"^第.+章")
 
 
 class NovelProcessor:
@@ -20,30 +41,107 @@ class NovelProcessor:
         self.novels_dir = "novels"
         if not os.path.exists(self.novels_dir):
             os.makedirs(self.novels_dir)
+        # 章节存储格式: folder（每章一个JSON文件）或segment（每部小说一个段文件），章节内容可选zlib/lzma压缩
+        config = config_manager.config
+        # 每轮章节同步后把同一批章节的进度记录刷到磁盘，章节和进度一起持久化
+        self.chapter_store = create_chapter_store(config.get("chapter_storage", "folder"), self.novels_dir,
+                                                  config.get("chapter_compression", "none"),
+                                                  config.get("chapter_compression_level"),
+                                                  config.get("chapter_durability", "batch"),
+                                                  config.get("chapter_sync_window", 0.02),
+                                                  after_sync=config_manager.sync)
+        # 章节租约保存在状态文件所在目录，共享该目录的进程之间也不会重复购买章节
+        state_dir = os.path.dirname(os.path.abspath(config_manager.stats_file))
+        self.state_dir = state_dir
+        self.lease_manager = ChapterLeaseManager(os.path.join(state_dir, "leases"))
+        # 各设备的滚动特性（滑动距离与实际滚动的比例），下次运行继续使用
+        self.scroll_controller = ScrollController(os.path.join(state_dir, "scroll_profiles.json"))
+        # 全文检索索引，随章节保存增量更新
+        self.search_index = SearchIndex(os.path.join(state_dir, "search_index"), self._load_chapter_text)
+        # 每部小说的章节索引，首次使用时扫描章节存储，之后随保存增量更新
+        self._chapter_indexes: Dict[str, ChapterIndex] = {}
+        self._index_lock = threading.Lock()
+
+    def get_chapter_index(self, novel_name: str) -> ChapterIndex:
+        """
+        获取小说的章节索引
+
+        Args:
+            novel_name: 小说名称
+
+        Returns:
+            ChapterIndex: 按章节序号排序的章节索引
+        """
+        with self._index_lock:
+            index = self._chapter_indexes.get(novel_name)
+            if index is None:
+                index = ChapterIndex(lambda: self.chapter_store.list_chapters(novel_name))
+                self._chapter_indexes[novel_name] = index
+            return index
     
+    def claim_chapter(self, novel_name: str, chapter_name: str, device_id: str) -> Optional[ChapterLease]:
+        """
+        领取章节，领取成功后才能购买和识别，处理期间需通过lease_manager.keep_alive续约
+
+        Args:
+            novel_name: 小说名称
+            chapter_name: 章节名称
+            device_id: 设备ID
+
+        Returns:
+            Optional[ChapterLease]: 章节租约，章节已处理或正被其它设备处理时返回None
+        """
+        if self.is_chapter_processed(novel_name, chapter_name):
+            return None
+        # 先在进程内领取，避免同一进程的多个设备线程争抢租约文件
+        if not self.config_manager.claim_chapter(novel_name, chapter_name, device_id):
+            return None
+        lease = self.lease_manager.claim(novel_name, chapter_name, device_id)
+        if lease is None:
+            self.config_manager.release_chapter(novel_name, chapter_name, device_id)
+        return lease
+
+    def release_chapter(self, lease: ChapterLease) -> None:
+        """
+        放弃未完成的章节，其它设备可以重新领取
+
+        Args:
+            lease: 章节租约
+        """
+        self.lease_manager.release(lease)
+        self.config_manager.release_chapter(lease.novel_name, lease.chapter, lease.owner)
+
+    def finish_novel(self, novel_name: str, chapters: List[str]) -> int:
+        """
+        小说处理完成后清理章节的完成标记，只清理进度已记录的章节
+
+        Args:
+            novel_name: 小说名称
+            chapters: 本次处理的章节
+
+        Returns:
+            int: 清理的完成标记数量
+        """
+        recorded = [chapter for chapter in chapters if self.config_manager.is_chapter_processed(novel_name, chapter)]
+        return self.lease_manager.prune_done(novel_name, recorded)
+
     def save_chapter_content(self, novel_name: str, chapter_name: str, 
-                           content: Dict[str, Any], device_id: str) -> bool:
+                           content: Dict[str, Any], device_id: str,
+                           lease: Optional[ChapterLease] = None) -> bool:
         """
-        保存章节内容到JSON文件
+        保存章节内容到章节存储
         
         Args:
             novel_name: 小说名称
             chapter_name: 章节名称
             content: 章节内容
             device_id: 设备ID
+            lease: 章节租约，保存后提交
             
         Returns:
             bool: 是否保存成功
         """
         try:
-            # 创建小说目录
-            novel_dir = os.path.join(self.novels_dir, novel_name)
-            if not os.path.exists(novel_dir):
-                os.makedirs(novel_dir)
-            
-            # 创建章节文件路径
-            chapter_file = os.path.join(novel_dir, f"{chapter_name}.json")
-            
             # 准备章节数据
             chapter_data = {
                 "novel_name": novel_name,
@@ -53,12 +151,22 @@ class NovelProcessor:
                 "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             }
             
-            # 保存到JSON文件
-            with open(chapter_file, 'w', encoding='utf-8') as f:
-                json.dump(chapter_data, f, ensure_ascii=False, indent=4)
+            def commit_progress():
+                # 提交租约，租约已失效时内容已经购买，仍然保存
+                if lease is not None:
+                    self.lease_manager.commit(lease)
+                # 更新进度状态
+                self.config_manager.update_novel_progress(novel_name, chapter_name, device_id)
+
+            # 章节持久化后才记录进度，断电时不会出现进度已记录而章节内容不完整的情况
+            self.chapter_store.save(novel_name, chapter_name, chapter_data, on_durable=commit_progress)
             
-            # 更新进度状态
-            self.config_manager.update_novel_progress(novel_name, chapter_name, device_id)
+            self.get_chapter_index(novel_name).add(chapter_name)
+            try:
+                self.search_index.add(novel_name, chapter_name, self._content_text(content))
+            except Exception as e:
+                # 检索索引可以通过rebuild_search_index重建，不影响章节保存
+                app_logger.error(f"更新检索索引失败: {e}")
             
             app_logger.log_novel_action("保存章节", novel_name, f"章节: {chapter_name}, 设备: {device_id}")
             return True
@@ -77,7 +185,8 @@ class NovelProcessor:
         Returns:
             bool: 是否已处理
         """
-        return self.config_manager.is_chapter_processed(novel_name, chapter_name)
+        return (self.config_manager.is_chapter_processed(novel_name, chapter_name)
+                or self.lease_manager.is_done(novel_name, chapter_name))
     
     def get_novel_chapters(self, novel_name: str) -> List[str]:
         """
@@ -87,77 +196,259 @@ class NovelProcessor:
             novel_name: 小说名称
             
         Returns:
-            List[str]: 章节列表
+            List[str]: 按章节序号排序的章节列表
         """
-        novel_dir = os.path.join(self.novels_dir, novel_name)
-        if not os.path.exists(novel_dir):
-            return []
-        
-        chapters = []
-        for filename in os.listdir(novel_dir):
-            if filename.endswith(".json"):
-                chapter_name = filename[:-5]  # 去掉.json后缀
-                chapters.append(chapter_name)
-        
-        return chapters
+        return self.get_chapter_index(novel_name).chapters()
     
-    def export_novel_to_txt(self, novel_name: str, output_path: str) -> bool:
+    def search_chapters(self, query: str, novel_name: Optional[str] = None, limit: int = 100) -> List[SearchHit]:
+        """
+        在已保存的章节中检索文本
+
+        Args:
+            query: 查询文本
+            novel_name: 只检索该小说，为None时检索全部小说
+            limit: 最多返回的章节数
+
+        Returns:
+            List[SearchHit]: 命中的章节及命中位置（正文中的字符偏移）
+        """
+        return self.search_index.search(query, novel_name, limit)
+
+    def rebuild_search_index(self) -> int:
+        """
+        根据章节存储重建全文检索索引
+
+        Returns:
+            int: 索引的章节数
+        """
+        chapters = (
+            (novel_name, chapter_name)
+            for novel_name in self.chapter_store.list_novels()
+            for chapter_name in self.chapter_store.list_chapters(novel_name)
+        )
+        count = self.search_index.rebuild(chapters)
+        app_logger.info(f"检索索引已重建: {count} 章")
+        return count
+
+    def close(self) -> None:
+        """写入内存中的检索索引并释放打开的文件"""
+        self.search_index.close()
+        self.chapter_store.close()
+
+    def export_novel_to_txt(self, novel_name: str, output_path: str,
+                            progress_callback: Optional[Callable[[int, int], None]] = None,
+                            max_workers: int = 4, read_ahead: int = 64, incremental: bool = True) -> bool:
         """
         导出小说为TXT文件
+
+        线程池按章节顺序分批预读并解析章节，单个写入方按顺序取出结果写入带缓冲的输出文件；
+        预读的章节数不超过read_ahead，内存占用与小说长度无关。
+
+        每个输出文件旁保存一份导出检查点（每章的结束偏移和章节签名，以及最后一章内容的校验和）。再次导出时，
+        与检查点一致的章节前缀保留不动，只从第一个新增或修改的章节处截断并追加之后的章节；
+        输出文件被外部修改或检查点缺失时重新完整导出（写入临时文件，完成后替换目标文件）。
         
         Args:
             novel_name: 小说名称
             output_path: 输出文件路径
+            progress_callback: 进度回调，参数为(已写入章节数, 章节总数)，在调用线程中执行
+            max_workers: 读取章节的线程数
+            read_ahead: 最多预读的章节数
+            incremental: 是否根据检查点增量导出
             
         Returns:
             bool: 是否导出成功
         """
+        tmp_path = f"{output_path}.tmp"
+        checkpoint_path = f"{output_path}{EXPORT_CHECKPOINT_SUFFIX}"
         try:
-            novel_dir = os.path.join(self.novels_dir, novel_name)
-            if not os.path.exists(novel_dir):
-                raise FileNotFoundError(f"小说目录不存在: {novel_dir}")
-            
-            # 获取所有章节
+            # 获取所有章节（已按章节序号排序）
             chapters = self.get_novel_chapters(novel_name)
             if not chapters:
                 raise FileNotFoundError(f"未找到小说章节: {novel_name}")
-            
-            # 按章节名排序
-            chapters.sort()
-            
-            # 写入TXT文件
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write(f"小说: {novel_name}\n")
-                f.write("=" * 50 + "\n\n")
-                
-                for chapter_name in chapters:
-                    chapter_file = os.path.join(novel_dir, f"{chapter_name}.json")
-                    try:
-                        with open(chapter_file, 'r', encoding='utf-8') as cf:
-                            chapter_data = json.load(cf)
-                            
-                        # 写入章节标题
-                        f.write(f"\n\n第{chapter_name}章\n")
-                        f.write("-" * 30 + "\n")
-                        
-                        # 写入章节内容（这里假设内容在content字段中）
-                        content = chapter_data.get("content", {})
-                        # 根据实际内容结构调整提取方式
-                        if isinstance(content, dict):
-                            # 如果内容是字典，尝试提取文本
-                            text_content = content.get("text", str(content))
-                            f.write(text_content)
-                        else:
-                            # 如果内容是其他类型，直接转换为字符串
-                            f.write(str(content))
-                    except Exception as e:
-                        f.write(f"\n[无法读取章节 {chapter_name}: {str(e)}]\n")
-            
+            signatures = [self.chapter_store.signature(novel_name, chapter_name) for chapter_name in chapters]
+
+            checkpoint = self._load_export_checkpoint(checkpoint_path, novel_name, output_path) if incremental else None
+            header = self._encode_export_text(f"小说: {novel_name}\n" + "=" * 50 + "\n\n")
+            kept = 0
+            if checkpoint is not None:
+                for entry, chapter_name, signature in zip(checkpoint["chapters"], chapters, signatures):
+                    if entry["name"] != chapter_name or entry["signature"] != signature:
+                        break
+                    kept += 1
+
+            if kept == 0:
+                # 没有可复用的前缀，完整导出到临时文件
+                entries = []
+                with open(tmp_path, 'wb', buffering=EXPORT_BUFFER_SIZE) as f:
+                    f.write(header)
+                    self._write_chapters(f, novel_name, chapters, signatures, entries, len(header),
+                                         progress_callback, max_workers, read_ahead)
+                os.replace(tmp_path, output_path)
+            else:
+                entries = checkpoint["chapters"][:kept]
+                if kept == len(chapters) and len(checkpoint["chapters"]) == kept:
+                    if progress_callback is not None:
+                        progress_callback(kept, len(chapters))
+                    app_logger.log_novel_action("导出小说", novel_name, f"没有新章节: {output_path}")
+                    return True
+                # 先把检查点缩短到保留的前缀，追加中途退出时下次导出仍能从这里继续
+                self._save_export_checkpoint(checkpoint_path, output_path, novel_name, len(header), entries)
+                with open(output_path, 'r+b', buffering=EXPORT_BUFFER_SIZE) as f:
+                    f.truncate(entries[-1]["end"])
+                    f.seek(entries[-1]["end"])
+                    if progress_callback is not None:
+                        progress_callback(kept, len(chapters))
+                    self._write_chapters(f, novel_name, chapters[kept:], signatures[kept:], entries,
+                                         entries[-1]["end"], progress_callback, max_workers, read_ahead,
+                                         written_before=kept)
+                app_logger.info(f"增量导出: 保留 {kept} 章，写入 {len(chapters) - kept} 章")
+
+            self._save_export_checkpoint(checkpoint_path, output_path, novel_name, len(header), entries)
             app_logger.log_novel_action("导出小说", novel_name, f"导出路径: {output_path}")
             return True
         except Exception as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
             app_logger.error(f"导出小说失败: {e}")
             return False
+
+    def _write_chapters(self, f: BinaryIO, novel_name: str, chapters: List[str], signatures: List[List[int]],
+                        entries: List[Dict[str, Any]], offset: int,
+                        progress_callback: Optional[Callable[[int, int], None]],
+                        max_workers: int, read_ahead: int, written_before: int = 0) -> None:
+        """
+        由线程池预读章节并按顺序写入，同时记录每章的检查点信息
+
+        Args:
+            f: 输出文件（二进制模式，已定位到offset）
+            novel_name: 小说名称
+            chapters: 需要写入的章节
+            signatures: 章节签名
+            entries: 检查点章节列表，写入的章节追加到其中
+            offset: 当前写入位置
+            progress_callback: 进度回调
+            max_workers: 读取章节的线程数
+            read_ahead: 最多预读的章节数
+            written_before: 之前已导出的章节数（用于计算进度）
+        """
+        total = written_before + len(chapters)
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="export") as executor:
+            # 每个任务读取一批连续的章节，减少线程间交接的开销
+            batches = [chapters[i:i + EXPORT_BATCH_SIZE] for i in range(0, len(chapters), EXPORT_BATCH_SIZE)]
+            batch_iter = iter(batches)
+            pending: Deque[Future] = deque(
+                executor.submit(self._read_chapter_texts, novel_name, batch)
+                for batch in islice(batch_iter, max(read_ahead // EXPORT_BATCH_SIZE, 1))
+            )
+            written = 0
+            while pending:
+                contents = pending.popleft().result()
+                # 取出一批结果后再提交一批，保持预读窗口大小不变
+                for batch in islice(batch_iter, 1):
+                    pending.append(executor.submit(self._read_chapter_texts, novel_name, batch))
+                for data in contents:
+                    f.write(data)
+                    offset += len(data)
+                    entries.append({
+                        "name": chapters[written],
+                        "signature": signatures[written],
+                        "end": offset
+                    })
+                    written += 1
+                    if progress_callback is not None:
+                        progress_callback(written_before + written, total)
+
+    @staticmethod
+    def _encode_export_text(text: str) -> bytes:
+        """按系统换行符编码导出文本（与文本模式写入的结果一致）"""
+        if os.linesep != "\n":
+            text = text.replace("\n", os.linesep)
+        return text.encode('utf-8')
+
+    @classmethod
+    def _save_export_checkpoint(cls, checkpoint_path: str, output_path: str, novel_name: str, header_end: int,
+                                entries: List[Dict[str, Any]]) -> None:
+        """保存导出检查点，记录输出文件大小和最后一章内容的校验和"""
+        atomic_write_json(checkpoint_path, {
+            "novel_name": novel_name,
+            "header_end": header_end,
+            "file_size": entries[-1]["end"],
+            "last_chapter_crc32": cls._last_chapter_crc32(output_path, header_end, entries),
+            "chapters": entries
+        }, indent=None)
+
+    @staticmethod
+    def _last_chapter_crc32(output_path: str, header_end: int, entries: List[Dict[str, Any]]) -> int:
+        """读取输出文件中最后一章的内容并计算校验和"""
+        start = entries[-2]["end"] if len(entries) > 1 else header_end
+        with open(output_path, 'rb') as f:
+            f.seek(start)
+            return zlib.crc32(f.read(entries[-1]["end"] - start))
+
+    @classmethod
+    def _load_export_checkpoint(cls, checkpoint_path: str, novel_name: str,
+                                output_path: str) -> Optional[Dict[str, Any]]:
+        """
+        读取导出检查点，并校验输出文件仍是上次导出的结果
+
+        Returns:
+            Optional[Dict[str, Any]]: 检查点，不存在或与输出文件不一致时返回None
+        """
+        if not os.path.exists(checkpoint_path) or not os.path.exists(output_path):
+            return None
+        try:
+            with open(checkpoint_path, 'r', encoding='utf-8') as f:
+                checkpoint = json.load(f)
+            entries = checkpoint["chapters"]
+            if checkpoint["novel_name"] != novel_name or not entries:
+                return None
+            if os.path.getsize(output_path) != checkpoint["file_size"]:
+                return None
+            # 文件大小一致时再校验最后一章的内容，确认输出文件没有被外部修改
+            last_chapter_crc32 = cls._last_chapter_crc32(output_path, checkpoint["header_end"], entries)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            app_logger.warning(f"导出检查点无效，将重新完整导出: {e}")
+            return None
+        if last_chapter_crc32 != checkpoint["last_chapter_crc32"]:
+            return None
+        return checkpoint
+
+    def _read_chapter_texts(self, novel_name: str, chapter_names: List[str]) -> List[bytes]:
+        """读取一批章节，格式化并编码为导出内容（在线程池中执行）"""
+        return [self._encode_export_text(self._read_chapter_text(novel_name, chapter_name))
+                for chapter_name in chapter_names]
+
+    def _read_chapter_text(self, novel_name: str, chapter_name: str) -> str:
+        """读取章节并格式化为导出文本"""
+        try:
+            chapter_data = self.chapter_store.load(novel_name, chapter_name)
+        except Exception as e:
+            return f"\n[无法读取章节 {chapter_name}: {str(e)}]\n"
+
+        # 写入章节内容（这里假设内容在content字段中）
+        text_content = self._content_text(chapter_data.get("content", {}))
+        # 章节名称已经是"第…章"时不再重复包裹
+        title = chapter_name if CHAPTER_TITLE_PATTERN.match(chapter_name) else f"第{chapter_name}章"
+        return f"\n\n{title}\n" + "-" * 30 + "\n" + text_content
+
+    def _load_chapter_text(self, novel_name: str, chapter_name: str) -> Optional[str]:
+        """读取章节正文（检索索引使用），章节不存在或无法读取时返回None"""
+        try:
+            chapter_data = self.chapter_store.load(novel_name, chapter_name)
+        except (OSError, KeyError, ValueError):
+            return None
+        return self._content_text(chapter_data.get("content", {}))
+
+    @staticmethod
+    def _content_text(content: Any) -> str:
+        """从章节内容中提取正文"""
+        # 根据实际内容结构调整提取方式
+        if isinstance(content, dict):
+            # 如果内容是字典，尝试提取文本
+            return content.get("text", str(content))
+        # 如果内容是其他类型，直接转换为字符串
+        return str(content)
     
     def get_device_chapters(self, novel_name: str, device_id: str) -> List[str]:
         """
@@ -170,12 +461,8 @@ class NovelProcessor:
         Returns:
             List[str]: 该设备处理的章节列表
         """
-        novel_progress = self.config_manager.get_stats().get("novel_progress", {})
-        if novel_name not in novel_progress:
-            return []
-        
         device_chapters = []
-        for chapter, info in novel_progress[novel_name].items():
+        for chapter, info in self.config_manager.get_novel_progress(novel_name).items():
             if info.get("device_id") == device_id:
                 device_chapters.append(chapter)
         
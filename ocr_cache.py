@@ -0,0 +1,134 @@
+"""
+OCR结果缓存模块
+节点轮询等待页面或提示时（超时1-2秒），MaaFramework会对没有变化的画面反复做OCR。
+缓存识别包装器先比较识别区域的像素指纹，画面没有变化时直接复用上次的识别结果
+"""
+
+import json
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy
+from maa.context import Context
+from maa.custom_recognition import CustomRecognition
+
+# 包装器在流水线中注册的自定义识别名称
+CACHED_OCR = "CachedOCR"
+
+
+def frame_fingerprint(image: numpy.ndarray, roi: Sequence[int], block: int = 4) -> numpy.ndarray:
+    """
+    识别区域的像素指纹：隔行隔列取样的灰度图按block x block分块求平均
+
+    Args:
+        image: 截图（BGR，高 x 宽 x 3）
+        roi: 识别区域 (x, y, 宽, 高)，宽或高为0时表示到截图边缘
+        block: 取样后的分块边长，对应原图2*block像素
+
+    Returns:
+        numpy.ndarray: 各块的平均灰度（float32）
+    """
+    x, y, width, height = (int(value) for value in roi)
+    bottom = y + height if height > 0 else image.shape[0]
+    right = x + width if width > 0 else image.shape[1]
+    gray = image[y:bottom:2, x:right:2, :3].mean(axis=2, dtype=numpy.float32)
+    rows = gray.shape[0] // block * block
+    cols = gray.shape[1] // block * block
+    return gray[:rows, :cols].reshape(rows // block, block, cols // block, block).mean(axis=(1, 3))
+
+
+@dataclass
+class CacheStats:
+    """一个节点的缓存统计"""
+    hits: int = 0
+    misses: int = 0
+
+
+@dataclass
+class _CacheSlot:
+    """同一节点、同一识别区域最近的若干次识别"""
+    fingerprints: List[numpy.ndarray] = field(default_factory=list)
+    # (匹配框, 详情)，没有匹配时为None
+    results: List[Optional[Tuple[Tuple[int, int, int, int], str]]] = field(default_factory=list)
+
+
+class CachedOcrRecognition(CustomRecognition):
+    """
+    带缓存的OCR识别包装器
+
+    流水线中的包装节点使用该自定义识别，custom_recognition_param为{"node": 被包装的OCR节点}，roi与被包装节点一致
+    （覆盖包装节点的roi时同样作用于被包装节点）。每次识别先计算识别区域的像素指纹，与最近max_entries次识别
+    一次性比较：所有分块的灰度差都小于threshold时复用那次的结果（包括没有匹配），否则执行被包装节点的OCR并缓存。
+    按分块最大差而不是全图平均差判断，单行文字的出现或变化也不会被忽略。多台设备共用同一资源，线程安全。
+    """
+
+    def __init__(self, threshold: float = 4.0, max_entries: int = 8):
+        """
+        Args:
+            threshold: 分块平均灰度差（0-255）的上限
+            max_entries: 每个节点、识别区域保留的识别结果数量（多台设备轮流识别时各自命中）
+        """
+        super().__init__()
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._slots: Dict[Tuple[str, Tuple[int, ...]], _CacheSlot] = {}
+        self._stats: Dict[str, CacheStats] = {}
+
+    def analyze(self, context: Context, argv: CustomRecognition.AnalyzeArg) -> CustomRecognition.AnalyzeResult:
+        node = json.loads(argv.custom_recognition_param or "{}").get("node", "")
+        roi = tuple(int(value) for value in argv.roi)
+        fingerprint = frame_fingerprint(argv.image, roi)
+        key = (node, roi)
+        with self._lock:
+            stats = self._stats.setdefault(node, CacheStats())
+            slot = self._slots.get(key)
+            index = self._find(slot, fingerprint) if slot is not None else None
+            if index is not None:
+                stats.hits += 1
+                result = slot.results[index]
+                return CustomRecognition.AnalyzeResult(box=result[0] if result else None,
+                                                       detail=result[1] if result else "")
+            stats.misses += 1
+
+        result = None
+        detail = context.run_recognition(node, argv.image, {node: {"roi": list(roi)}})
+        if detail is not None and detail.hit and detail.box is not None:
+            best = detail.best_result
+            result = (tuple(int(value) for value in detail.box), best.text if best is not None else "")
+        with self._lock:
+            slot = self._slots.setdefault(key, _CacheSlot())
+            slot.fingerprints.append(fingerprint)
+            slot.results.append(result)
+            del slot.fingerprints[:-self.max_entries]
+            del slot.results[:-self.max_entries]
+        return CustomRecognition.AnalyzeResult(box=result[0] if result else None,
+                                               detail=result[1] if result else "")
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        """
+        各节点的缓存命中统计
+
+        Returns:
+            Dict[str, Dict[str, float]]: {节点名称: {hits, misses, hit_rate}}
+        """
+        with self._lock:
+            return {
+                node: {
+                    "hits": stats.hits,
+                    "misses": stats.misses,
+                    "hit_rate": stats.hits / (stats.hits + stats.misses) if stats.hits + stats.misses else 0.0
+                }
+                for node, stats in self._stats.items()
+            }
+
+    def _find(self, slot: _CacheSlot, fingerprint: numpy.ndarray) -> Optional[int]:
+        """一次比较所有缓存的指纹，返回最近一个没有变化的指纹的序号"""
+        candidates = [index for index, cached in enumerate(slot.fingerprints) if cached.shape == fingerprint.shape]
+        if not candidates:
+            return None
+        stacked = numpy.stack([slot.fingerprints[index] for index in candidates])
+        differences = numpy.abs(stacked - fingerprint).reshape(len(candidates), -1).max(axis=1)
+        unchanged = numpy.flatnonzero(differences < self.threshold)
+        return candidates[unchanged[-1]] if unchanged.size else None
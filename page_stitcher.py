@@ -0,0 +1,161 @@
+"""
+页面拼接模块
+将章节逐屏识别的文本行拼接为完整章节：相邻两屏有若干行重叠，找出已拼接文本末尾与新一屏开头的最长重叠后去重，
+容忍少量识别差异（个别字识别错误、首尾行只显示了一部分）
+"""
+
+import unicodedata
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Tuple
+
+
+def normalize_line(line: str) -> str:
+    """
+    归一化文本行用于比较：全角转半角，去掉空白和标点（标点最容易识别错误）
+
+    Args:
+        line: 识别出的文本行
+
+    Returns:
+        str: 归一化后的文本
+    """
+    return "".join(
+        char for char in unicodedata.normalize("NFKC", line)
+        if not char.isspace() and not unicodedata.category(char).startswith("P")
+    )
+
+
+def _prefix_function(keys: List[Optional[str]]) -> List[int]:
+    """KMP前缀函数: result[i]为keys[:i + 1]的最长相等真前缀和真后缀的长度"""
+    result = [0] * len(keys)
+    for i in range(1, len(keys)):
+        k = result[i - 1]
+        while k and keys[i] != keys[k]:
+            k = result[k - 1]
+        if keys[i] == keys[k]:
+            k += 1
+        result[i] = k
+    return result
+
+
+class PageStitcher:
+    """
+    章节页面拼接器
+
+    每一屏的文本行先归一化，再用KMP前缀函数在线性时间内找出"新一屏开头 == 已拼接文本末尾"的最长精确重叠；
+    存在识别差异时精确匹配会变短，此时以开头或结尾几个字相同的行作为锚点推算候选重叠长度，逐行按相似度校验，
+    候选数量有上限，整体仍接近线性。
+    """
+
+    def __init__(self, min_similarity: float = 0.8, min_anchor_chars: int = 4, max_candidates: int = 8):
+        """
+        Args:
+            min_similarity: 模糊匹配时两行视为相同的最低相似度
+            min_anchor_chars: 可作为锚点的行的最少字数，过短的行（如"……"）容易误匹配
+            max_candidates: 模糊匹配时最多校验的候选重叠长度数
+        """
+        self.min_similarity = min_similarity
+        self.min_anchor_chars = min_anchor_chars
+        self.max_candidates = max_candidates
+        self.lines: List[str] = []
+        self._keys: List[str] = []
+        # 统计信息: 每一屏的行数和与前一屏的重叠行数
+        self.page_lines: List[int] = []
+        self.overlaps: List[int] = []
+
+    def add_page(self, lines: List[str]) -> int:
+        """
+        追加一屏识别结果，去掉与已拼接文本重叠的部分
+
+        Args:
+            lines: 这一屏按从上到下顺序排列的文本行
+
+        Returns:
+            int: 与已拼接文本重叠的行数（等于len(lines)时说明这一屏没有新内容）
+        """
+        lines = [line for line in lines if line.strip()]
+        keys = [normalize_line(line) for line in lines]
+        overlap = self.find_overlap(keys) if self.lines else 0
+        if overlap:
+            # 上一屏最后一行可能只显示了一部分，以这一屏中完整的那一行为准
+            last = overlap - 1
+            if len(keys[last]) > len(self._keys[-1]):
+                self.lines[-1] = lines[last]
+                self._keys[-1] = keys[last]
+        self.lines.extend(lines[overlap:])
+        self._keys.extend(keys[overlap:])
+        self.page_lines.append(len(lines))
+        self.overlaps.append(overlap)
+        return overlap
+
+    def text(self) -> str:
+        """拼接后的章节文本"""
+        return "\n".join(self.lines)
+
+    def find_overlap(self, keys: List[str]) -> int:
+        """
+        计算已拼接文本末尾与新一屏开头的最长重叠行数
+
+        Args:
+            keys: 新一屏归一化后的文本行
+
+        Returns:
+            int: 重叠行数
+        """
+        window = min(len(keys), len(self._keys))
+        if window == 0:
+            return 0
+        tail = self._keys[-window:]
+        # 新一屏 + 分隔符 + 已拼接文本末尾，末位的前缀函数值即最长精确重叠
+        exact = _prefix_function(keys + [None] + tail)[-1]
+        if not self._is_valid_overlap(keys[:exact]):
+            exact = 0
+        if exact == window:
+            return exact
+        # 精确重叠可能因个别行识别差异而变短，尝试找更长的模糊重叠
+        return max(exact, self._fuzzy_overlap(tail, keys, exact))
+
+    def _fuzzy_overlap(self, tail: List[str], keys: List[str], longer_than: int) -> int:
+        """以开头或结尾相同的行为锚点推算候选重叠长度，按锚点数从多到少逐个校验，返回最长的通过校验的重叠"""
+        positions: Dict[Tuple[str, str], List[int]] = {}
+        for position, key in enumerate(tail):
+            for token in self._anchor_tokens(key):
+                positions.setdefault(token, []).append(position)
+        # 锚点: 新一屏第j行与末尾第p行的开头或结尾相同，则重叠长度为len(tail) - p + j
+        votes: Dict[int, int] = {}
+        for j, key in enumerate(keys):
+            for token in self._anchor_tokens(key):
+                for position in positions.get(token, ()):
+                    overlap = len(tail) - position + j
+                    if longer_than < overlap <= len(tail):
+                        votes[overlap] = votes.get(overlap, 0) + 1
+        candidates = sorted(votes, key=lambda overlap: (votes[overlap], overlap), reverse=True)
+        for overlap in sorted(candidates[:self.max_candidates], reverse=True):
+            if self._matches(tail[len(tail) - overlap:], keys[:overlap]):
+                return overlap
+        return 0
+
+    def _anchor_tokens(self, key: str) -> List[Tuple[str, str]]:
+        """行的锚点: 开头和结尾各min_anchor_chars个字，单个字识别错误时至少还有一个锚点相同，被截断的首行结尾仍相同"""
+        if len(key) < self.min_anchor_chars:
+            return []
+        return [("head", key[:self.min_anchor_chars]), ("tail", key[-self.min_anchor_chars:])]
+
+    def _matches(self, previous: List[str], current: List[str]) -> bool:
+        """逐行比较重叠区域，首尾两行允许只显示了一部分"""
+        last = len(previous) - 1
+        for i, (a, b) in enumerate(zip(previous, current)):
+            if a == b:
+                continue
+            # 新一屏第一行可能被屏幕顶部截断，上一屏最后一行可能被屏幕底部截断，只比较显示出来的部分
+            if i == 0 and len(b) < len(a):
+                a = a[len(a) - len(b):]
+            elif i == last and len(a) < len(b):
+                b = b[:len(a)]
+            if SequenceMatcher(None, a, b).ratio() < self.min_similarity:
+                return False
+        return self._is_valid_overlap(current)
+
+    def _is_valid_overlap(self, keys: List[str]) -> bool:
+        """重叠部分至少要有一行足够长，避免只凭空行或省略号之类的短行判定重叠"""
+        return any(len(key) >= self.min_anchor_chars for key in keys)
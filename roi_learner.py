@@ -0,0 +1,249 @@
+"""
+识别区域学习模块
+记录没有固定roi（或roi很大）的OCR节点在各分辨率下实际匹配到的位置，之后先只识别该位置附近的区域，
+识别不到再退回节点原来的识别区域，减少全屏OCR
+"""
+
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from logger import app_logger
+from stats_persister import atomic_write_json
+
+
+@dataclass
+class RoiProfile:
+    """节点在某个分辨率下学到的识别区域"""
+    # 最近若干次匹配框的外接矩形 (x, y, w, h)
+    box: Optional[Tuple[int, int, int, int]] = None
+    # 在学到的区域内识别成功的次数
+    hits: int = 0
+    # 学到的区域内识别不到、退回原识别区域才识别成功的次数
+    misses: int = 0
+    # 还没有学到区域时在原识别区域识别成功的次数
+    learns: int = 0
+    # 最近若干次匹配框，偶然一次远离常见位置的匹配会被之后的匹配挤出
+    boxes: List[Tuple[int, int, int, int]] = field(default_factory=list)
+
+
+def learnable_nodes(nodes: Dict[str, Dict[str, Any]]) -> Set[str]:
+    """
+    没有固定roi、需要识别全屏的OCR节点
+
+    Args:
+        nodes: 流水线节点定义
+
+    Returns:
+        Set[str]: 节点名称
+    """
+    return {name for name, node in nodes.items() if node.get("recognition") == "OCR" and not node.get("roi")}
+
+
+def screen_resolution(tasker) -> str:
+    """
+    设备截图（MaaFramework缩放后）的分辨率，节点的roi和识别框都在该坐标系下
+
+    Args:
+        tasker: 设备的Tasker实例
+
+    Returns:
+        str: "宽x高"
+    """
+    image = tasker.controller.cached_image
+    if image is None or not getattr(image, "size", 0):
+        tasker.controller.post_screencap().wait()
+        image = tasker.controller.cached_image
+    height, width = image.shape[:2]
+    return f"{width}x{height}"
+
+
+class RoiLearner:
+    """
+    识别区域学习器
+
+    节点匹配成功后记录匹配框，之后的识别先使用"最近history次匹配框的外接矩形 + padding"作为roi，
+    识别不到时由调用方退回原识别区域，成功后把匹配框并入学到的区域；退回次数多于命中次数时说明位置已经变化，
+    丢弃之前的匹配框重新学习。每个分辨率、每个节点分别维护，命中统计和学到的区域保存在文件中供下次运行使用。线程安全。
+    """
+
+    def __init__(self, profile_file: Optional[str] = None, nodes: Optional[Iterable[str]] = None,
+                 padding: int = 32, history: int = 8):
+        """
+        Args:
+            profile_file: 学到的区域的保存文件，为None时不保存
+            nodes: 需要学习的节点，为None时学习所有节点；有固定roi的节点学到的区域可能超出原roi，不应学习
+            padding: 学到的区域向四周扩展的像素数，容忍文字位置的轻微变化
+            history: 学到的区域由最近多少次匹配框合并而成
+        """
+        self.profile_file = profile_file
+        self.nodes = set(nodes) if nodes is not None else None
+        self.padding = padding
+        self.history = history
+        self._lock = threading.Lock()
+        self._profiles: Dict[Tuple[str, str], RoiProfile] = {}
+        self._load()
+
+    def roi(self, resolution: str, node: str) -> Optional[List[int]]:
+        """
+        节点学到的识别区域
+
+        Args:
+            resolution: 分辨率，见screen_resolution
+            node: 节点名称
+
+        Returns:
+            Optional[List[int]]: 扩展后的[x, y, w, h]（不超出屏幕），还没有学到或不学习该节点时返回None
+        """
+        if not self.learns(node):
+            return None
+        with self._lock:
+            profile = self._profiles.get((resolution, node))
+            if profile is None or profile.box is None:
+                return None
+            box = profile.box
+        width, height = (int(value) for value in resolution.split("x"))
+        left = max(box[0] - self.padding, 0)
+        top = max(box[1] - self.padding, 0)
+        right = min(box[0] + box[2] + self.padding, width)
+        bottom = min(box[1] + box[3] + self.padding, height)
+        return [left, top, right - left, bottom - top]
+
+    def learns(self, node: str) -> bool:
+        """是否学习该节点的识别区域"""
+        return self.nodes is None or node in self.nodes
+
+    def record_hit(self, resolution: str, node: str, box: Optional[Sequence[int]] = None) -> None:
+        """
+        记录一次在学到的区域内识别成功
+
+        Args:
+            resolution: 分辨率
+            node: 节点名称
+            box: 匹配框 (x, y, w, h)，为None时只记录命中次数
+        """
+        if not self.learns(node):
+            return
+        with self._lock:
+            profile = self._profiles.setdefault((resolution, node), RoiProfile())
+            profile.hits += 1
+            if box is not None:
+                self._add_box(profile, box)
+
+    def record_fallback(self, resolution: str, node: str, box: Sequence[int], learned: bool) -> None:
+        """
+        记录一次在原识别区域识别成功，并把匹配框并入学到的区域
+
+        Args:
+            resolution: 分辨率
+            node: 节点名称
+            box: 匹配框 (x, y, w, h)
+            learned: 是否先尝试过学到的区域（未命中）
+        """
+        if not self.learns(node):
+            return
+        with self._lock:
+            profile = self._profiles.setdefault((resolution, node), RoiProfile())
+            if learned:
+                profile.misses += 1
+                if profile.misses > profile.hits:
+                    # 学到的区域经常识别不到，文字位置已经变化，从这次的匹配框重新学习
+                    profile.boxes.clear()
+            else:
+                profile.learns += 1
+            self._add_box(profile, box)
+
+    def _add_box(self, profile: RoiProfile, box: Sequence[int]) -> None:
+        """把匹配框加入最近的匹配框，只保留最近history个并重新计算外接矩形（持有锁时调用）"""
+        profile.boxes.append(tuple(int(value) for value in box[:4]))
+        del profile.boxes[:-self.history]
+        profile.box = None
+        for recent in profile.boxes:
+            profile.box = union_box(profile.box, recent)
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        """
+        各节点的命中统计
+
+        Returns:
+            Dict[str, Dict[str, float]]: {"分辨率 节点": {hits, misses, learns, hit_rate}}
+        """
+        with self._lock:
+            return {
+                f"{resolution} {node}": {
+                    "hits": profile.hits,
+                    "misses": profile.misses,
+                    "learns": profile.learns,
+                    "hit_rate": profile.hits / (profile.hits + profile.misses) if profile.hits + profile.misses else 0.0
+                }
+                for (resolution, node), profile in self._profiles.items()
+            }
+
+    def save(self) -> None:
+        """保存学到的区域和命中统计"""
+        if self.profile_file is None:
+            return
+        with self._lock:
+            data: Dict[str, Dict[str, Dict[str, object]]] = {}
+            for (resolution, node), profile in self._profiles.items():
+                data.setdefault(resolution, {})[node] = {
+                    "box": list(profile.box) if profile.box is not None else None,
+                    "boxes": [list(box) for box in profile.boxes],
+                    "hits": profile.hits,
+                    "misses": profile.misses,
+                    "learns": profile.learns
+                }
+        try:
+            atomic_write_json(self.profile_file, data)
+        except OSError as e:
+            app_logger.error(f"保存识别区域失败: {e}")
+
+    def _load(self) -> None:
+        """加载保存的识别区域"""
+        if self.profile_file is None or not os.path.exists(self.profile_file):
+            return
+        try:
+            with open(self.profile_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            for resolution, nodes in data.items():
+                for node, profile in nodes.items():
+                    box = profile.get("box")
+                    # 旧文件只保存了外接矩形，作为唯一的匹配框
+                    boxes = profile.get("boxes") or ([box] if box else [])
+                    self._profiles[(resolution, node)] = RoiProfile(
+                        tuple(box) if box else None, profile.get("hits", 0),
+                        profile.get("misses", 0), profile.get("learns", 0),
+                        [tuple(recent) for recent in boxes[-self.history:]]
+                    )
+        except (OSError, ValueError, AttributeError, TypeError) as e:
+            app_logger.warning(f"识别区域文件无效，重新学习: {e}")
+
+
+def recognition_box(detail) -> Optional[Tuple[int, int, int, int]]:
+    """
+    任务详情中第一个节点的匹配框
+
+    Args:
+        detail: post_task(...).wait().get()的结果
+
+    Returns:
+        Optional[Tuple[int, int, int, int]]: (x, y, w, h)，没有识别结果时返回None
+    """
+    if not detail or not detail.nodes or detail.nodes[0].recognition is None:
+        return None
+    box = detail.nodes[0].recognition.box
+    if box is None:
+        return None
+    return tuple(int(value) for value in box[:4])
+
+
+def union_box(box: Optional[Sequence[int]], other: Sequence[int]) -> Tuple[int, int, int, int]:
+    """两个矩形的外接矩形，box为None时返回other"""
+    if box is None:
+        return tuple(other)
+    left = min(box[0], other[0])
+    top = min(box[1], other[1])
+    right = max(box[0] + box[2], other[0] + other[2])
+    bottom = max(box[1] + box[3], other[1] + other[3])
+    return left, top, right - left, bottom - top
@@ -0,0 +1,173 @@
+"""
+屏幕等待模块
+用"等待节点识别成功""等待画面静止"代替固定时长的sleep：界面就绪后立即继续，超过期限才放弃，
+并统计实际等待时间与原固定等待时间的差
+"""
+
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import numpy
+
+from capture_pipeline import frame_difference
+from logger import app_logger
+from roi_learner import RoiLearner, recognition_box, screen_resolution
+
+
+@dataclass
+class WaitRecord:
+    """一次等待"""
+    label: str
+    elapsed: float
+    # 被替代的固定等待时间（秒）
+    replaced: float
+    succeeded: bool
+
+
+class ScreenWaiter:
+    """
+    设备屏幕等待器
+
+    wait_for_node把节点的识别超时改为剩余期限交给MaaFramework轮询识别，识别成功（并执行节点动作）后立即返回；
+    指定learner时，期限的前learned_share先只识别学到的区域，之后退回节点原来的识别区域；
+    节点有带缓存的包装节点（见ocr_cache）时执行包装节点，轮询期间画面没有变化就不重复OCR；
+    wait_stable连续截图，相邻两帧的差异低于阈值并保持若干帧时认为界面加载和动画已结束。
+    """
+
+    def __init__(self, tasker, device: str = "", poll_interval: float = 0.2,
+                 learner: Optional[RoiLearner] = None, learned_share: float = 0.5,
+                 cached_nodes: Optional[Dict[str, str]] = None):
+        """
+        Args:
+            tasker: 设备的Tasker实例
+            device: 设备序列号（用于日志）
+            poll_interval: 截图间隔（秒）
+            learner: 识别区域学习器，为None时总是使用节点原来的识别区域
+            learned_share: 期限中只识别学到的区域的比例
+            cached_nodes: {节点: 带缓存的包装节点}
+        """
+        self.tasker = tasker
+        self.device = device
+        self.poll_interval = poll_interval
+        self.learner = learner
+        self.learned_share = learned_share
+        self.cached_nodes = cached_nodes or {}
+        self._resolution: Optional[str] = None
+        self.records: List[WaitRecord] = []
+
+    def wait_for_node(self, node: str, timeout: float, replaces: float = 0.0) -> Optional[Any]:
+        """
+        等待流水线节点识别成功
+
+        Args:
+            node: 节点名称
+            timeout: 期限（秒）
+            replaces: 被替代的固定等待时间（秒），用于统计
+
+        Returns:
+            Optional[Any]: 识别成功时返回任务详情，超过期限返回None
+        """
+        start = time.perf_counter()
+        deadline = start + timeout
+        roi = None
+        if self.learner is not None:
+            roi = self.learner.roi(self.resolution, node)
+        learned_deadline = start + timeout * self.learned_share if roi is not None else start
+        entry = self.cached_nodes.get(node, node)
+        detail = None
+        learned_hit = False
+        while True:
+            now = time.perf_counter()
+            remaining = deadline - now
+            if remaining <= 0:
+                break
+            override = {"timeout": int(remaining * 1000)}
+            use_learned = now < learned_deadline
+            if use_learned:
+                override = {"timeout": int((learned_deadline - now) * 1000), "roi": roi}
+            job = self.tasker.post_task(entry, {entry: override}).wait()
+            if job.succeeded:
+                detail = job.get()
+                learned_hit = use_learned
+                break
+            if use_learned:
+                # 学到的区域内识别不到，退回原识别区域
+                continue
+            # 任务提前失败（如截图失败）时稍后重试
+            time.sleep(min(self.poll_interval, max(deadline - time.perf_counter(), 0)))
+        if detail is not None and self.learner is not None:
+            if learned_hit:
+                self.learner.record_hit(self.resolution, node, recognition_box(detail))
+            else:
+                box = recognition_box(detail)
+                if box is not None:
+                    self.learner.record_fallback(self.resolution, node, box, learned=roi is not None)
+        self._record(node, time.perf_counter() - start, replaces, detail is not None)
+        return detail
+
+    def wait_stable(self, timeout: float, replaces: float = 0.0, threshold: float = 2.0,
+                    stable_frames: int = 2) -> bool:
+        """
+        等待画面静止
+
+        Args:
+            timeout: 期限（秒）
+            replaces: 被替代的固定等待时间（秒），用于统计
+            threshold: 两帧平均灰度差低于该值时视为没有变化
+            stable_frames: 需要连续没有变化的帧数
+
+        Returns:
+            bool: 期限内画面是否静止
+        """
+        start = time.perf_counter()
+        deadline = start + timeout
+        previous = None
+        unchanged = 0
+        stable = False
+        while time.perf_counter() < deadline:
+            frame = self._grab()
+            if previous is not None and frame_difference(previous, frame, step=1) < threshold:
+                unchanged += 1
+                if unchanged >= stable_frames:
+                    stable = True
+                    break
+            else:
+                unchanged = 0
+            previous = frame
+            time.sleep(self.poll_interval)
+        self._record("画面静止", time.perf_counter() - start, replaces, stable)
+        return stable
+
+    @property
+    def resolution(self) -> str:
+        """设备截图的分辨率，见screen_resolution"""
+        if self._resolution is None:
+            self._resolution = screen_resolution(self.tasker)
+        return self._resolution
+
+    @property
+    def waited(self) -> float:
+        """实际等待的总时间（秒）"""
+        return sum(record.elapsed for record in self.records)
+
+    @property
+    def replaced(self) -> float:
+        """被替代的固定等待总时间（秒）"""
+        return sum(record.replaced for record in self.records)
+
+    def summary(self) -> str:
+        """等待时间与原固定等待时间的对比"""
+        return (f"等待 {self.waited:.1f}s（{len(self.records)} 次），原固定等待 {self.replaced:.1f}s，"
+                f"节省 {self.replaced - self.waited:.1f}s")
+
+    def _grab(self) -> numpy.ndarray:
+        """截图并转为缩小的灰度图"""
+        self.tasker.controller.post_screencap().wait()
+        image = self.tasker.controller.cached_image
+        return image[::4, ::4, :3].mean(axis=2).astype(numpy.uint8)
+
+    def _record(self, label: str, elapsed: float, replaces: float, succeeded: bool) -> None:
+        self.records.append(WaitRecord(label, elapsed, replaces, succeeded))
+        if not succeeded:
+            app_logger.warning(f"[{self.device}] 等待{label}超时 ({elapsed:.1f}s)")
@@ -0,0 +1,225 @@
+"""
+滚动控制模块
+根据相邻两屏实际的重叠行数，按设备和字号自适应调整每次滑动的距离，在不漏行的前提下减少每章的截图和识别次数
+"""
+
+import json
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+from logger import app_logger
+from stats_persister import atomic_write_json
+
+
+# 行距按该像素数分档，同一档视为同一字号
+LINE_PITCH_BUCKET = 4
+
+
+@dataclass
+class ScrollProfile:
+    """设备在某个字号下的滚动特性"""
+    # 实际滚动的像素数 / 滑动距离（受滑动惯性、触摸阈值影响，每台设备不同）
+    ratio: float
+    # 上次使用的滑动距离
+    distance: int
+    samples: int = 0
+    # 比例测量值的平均偏差，滑动距离按 比例 + 2倍偏差 计算，抖动大的设备保留更多余量
+    deviation: float = 0.0
+
+
+@dataclass
+class ScrollStats:
+    """设备的识别统计"""
+    chapters: int = 0
+    screens: int = 0
+    overlap_lines: int = 0
+    scrolls: int = 0
+    missed: int = 0
+
+
+class ScrollController:
+    """
+    自适应滚动控制器
+
+    每次滑动后用拼接得到的重叠行数推算实际滚动距离: 滚过的行数 = 本屏行数 - 重叠行数，
+    由此更新"实际滚动 / 滑动距离"的比例及其平均偏差（指数平滑），下次按"只保留target_overlap行重叠"计算滑动距离，
+    并按偏差留出余量。
+    没有重叠时无法测量（可能已经漏行），滑动距离立即大幅缩小；滑动距离每次最多增大max_growth倍，逐步逼近目标。
+    每台设备、每档行距（字号）分别维护，保存在文件中供下次运行使用。线程安全。
+    """
+
+    def __init__(self, profile_file: Optional[str] = None, target_overlap: int = 2,
+                 min_distance: int = 150, max_distance: int = 900, initial_fraction: float = 0.5,
+                 smoothing: float = 0.5, max_growth: float = 1.5):
+        """
+        Args:
+            profile_file: 滚动特性的保存文件，为None时不保存
+            target_overlap: 相邻两屏的目标重叠行数
+            min_distance: 最小滑动距离（像素）
+            max_distance: 最大滑动距离（像素），不超过屏幕上可滑动的范围
+            initial_fraction: 没有历史数据时，首次滑动正文高度的该比例
+            smoothing: 新测量值的权重
+            max_growth: 滑动距离每次最多增大的倍数
+        """
+        self.profile_file = profile_file
+        self.target_overlap = target_overlap
+        self.min_distance = min_distance
+        self.max_distance = max_distance
+        self.initial_fraction = initial_fraction
+        self.smoothing = smoothing
+        self.max_growth = max_growth
+        self._lock = threading.Lock()
+        self._profiles: Dict[Tuple[str, int], ScrollProfile] = {}
+        self._stats: Dict[str, ScrollStats] = {}
+        # 各设备最近一次观测到的(行距, 每屏行数)
+        self._layouts: Dict[str, Tuple[float, int]] = {}
+        self._load()
+
+    def distance(self, device: str, line_pitch: float, page_lines: int) -> int:
+        """
+        计算下一次滑动的距离
+
+        Args:
+            device: 设备序列号
+            line_pitch: 当前屏的行距（像素）
+            page_lines: 当前屏的行数
+
+        Returns:
+            int: 滑动距离（像素）
+        """
+        if line_pitch <= 0 or page_lines <= 0:
+            return self.min_distance
+        with self._lock:
+            profile = self._profiles.get((device, self._bucket(line_pitch)))
+            if profile is None:
+                distance = page_lines * line_pitch * self.initial_fraction
+            else:
+                ratio = profile.ratio + 2 * profile.deviation
+                target = max(page_lines - self.target_overlap, 1) * line_pitch / ratio
+                distance = min(target, profile.distance * self.max_growth)
+            return int(min(max(distance, self.min_distance), self.max_distance))
+
+    def observe(self, device: str, line_pitch: float, distance: int, page_lines: int, overlap: int) -> None:
+        """
+        记录一次滑动的结果
+
+        Args:
+            device: 设备序列号
+            line_pitch: 行距（像素）
+            distance: 本次滑动距离
+            page_lines: 滑动后这一屏的行数
+            overlap: 与上一屏的重叠行数
+        """
+        if line_pitch <= 0 or page_lines <= 0:
+            return
+        key = (device, self._bucket(line_pitch))
+        with self._lock:
+            self._layouts[device] = (line_pitch, page_lines)
+            stats = self._stats.setdefault(device, ScrollStats())
+            stats.scrolls += 1
+            stats.overlap_lines += overlap
+            profile = self._profiles.get(key)
+            if overlap == 0:
+                # 滚过了整屏，实际比例至少是按整屏推算的值，下次缩短滑动距离
+                stats.missed += 1
+                ratio = page_lines * line_pitch / distance
+                if profile is None:
+                    self._profiles[key] = ScrollProfile(ratio * self.max_growth, distance, 0, ratio)
+                else:
+                    profile.deviation = max(profile.deviation * 2, ratio - profile.ratio)
+                    profile.ratio = max(profile.ratio, ratio)
+                    profile.distance = distance
+                return
+            if overlap >= page_lines:
+                # 没有滚动（已到章节末尾或滑动未生效），无法测量
+                return
+            ratio = (page_lines - overlap) * line_pitch / distance
+            if profile is None:
+                self._profiles[key] = ScrollProfile(ratio, distance, 1)
+            else:
+                profile.deviation += self.smoothing * (abs(ratio - profile.ratio) - profile.deviation)
+                profile.ratio += self.smoothing * (ratio - profile.ratio)
+                profile.distance = distance
+                profile.samples += 1
+
+    def layout(self, device: str) -> Optional[Tuple[float, int]]:
+        """
+        设备最近一次观测到的页面布局，供不识别文字就要决定滑动距离的场景（先截图后识别）使用
+
+        Args:
+            device: 设备序列号
+
+        Returns:
+            Optional[Tuple[float, int]]: (行距, 每屏行数)，没有观测过时返回None
+        """
+        with self._lock:
+            return self._layouts.get(device)
+
+    def record_chapter(self, device: str, screens: int) -> None:
+        """
+        记录设备识别完一个章节所用的屏数
+
+        Args:
+            device: 设备序列号
+            screens: 屏数
+        """
+        with self._lock:
+            stats = self._stats.setdefault(device, ScrollStats())
+            stats.chapters += 1
+            stats.screens += screens
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        """
+        各设备的识别统计
+
+        Returns:
+            Dict[str, Dict[str, float]]: {设备序列号: {chapters, screens_per_chapter, average_overlap, missed}}
+        """
+        with self._lock:
+            return {
+                device: {
+                    "chapters": stats.chapters,
+                    "screens_per_chapter": stats.screens / stats.chapters if stats.chapters else 0.0,
+                    "average_overlap": stats.overlap_lines / stats.scrolls if stats.scrolls else 0.0,
+                    "missed": stats.missed
+                }
+                for device, stats in self._stats.items()
+            }
+
+    def save(self) -> None:
+        """保存各设备的滚动特性"""
+        if self.profile_file is None:
+            return
+        with self._lock:
+            data: Dict[str, Dict[str, Dict[str, float]]] = {}
+            for (device, bucket), profile in self._profiles.items():
+                data.setdefault(device, {})[str(bucket)] = {
+                    "ratio": profile.ratio,
+                    "distance": profile.distance,
+                    "samples": profile.samples,
+                    "deviation": profile.deviation
+                }
+        try:
+            atomic_write_json(self.profile_file, data)
+        except OSError as e:
+            app_logger.error(f"保存滚动特性失败: {e}")
+
+    def _load(self) -> None:
+        """加载保存的滚动特性"""
+        if self.profile_file is None or not os.path.exists(self.profile_file):
+            return
+        try:
+            with open(self.profile_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            for device, buckets in data.items():
+                for bucket, profile in buckets.items():
+                    self._profiles[(device, int(bucket))] = ScrollProfile(
+                        profile["ratio"], profile["distance"], profile.get("samples", 0), profile.get("deviation", 0.0)
+                    )
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            app_logger.warning(f"滚动特性文件无效，重新测量: {e}")
+
+    @staticmethod
+    def _bucket(line_pitch: float) -> int:
+        return int(round(line_pitch / LINE_PITCH_BUCKET))
@@ -0,0 +1,428 @@
+"""
+全文检索模块
+以汉字二元组（相邻两个字）为词项建立章节倒排索引，保存在磁盘上，随章节保存增量更新，
+查询时先用倒排表求出候选章节，再在候选章节中定位命中位置
+"""
+
+import heapq
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from chapter_index import chapter_sort_key
+from logger import app_logger
+from stats_persister import atomic_write_json
+
+
+# 段文件: 文件头(标记, 词项数) + 按词项排序的词项表(两个字的码位, 倒排表偏移, 文档数) + 倒排表(文档编号, uint32)
+SEGMENT_MAGIC = b"MCSIDX1\0"
+SEGMENT_HEADER = struct.Struct("<8sQ")
+SEGMENT_ENTRY = struct.Struct("<IIQI")
+_KEY = struct.Struct("<II")
+
+
+@dataclass
+class SearchHit:
+    """检索命中"""
+    novel_name: str
+    chapter: str
+    # 命中位置（章节正文中的字符偏移）
+    offsets: List[int]
+
+
+def text_bigrams(text: str) -> Set[str]:
+    """文本中出现的所有二元组"""
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+class IndexSegment:
+    """不可变的索引段文件，通过mmap二分查找词项表，只读取查询用到的倒排表"""
+
+    def __init__(self, file_path: str):
+        """
+        Args:
+            file_path: 段文件路径
+        """
+        self.file_path = file_path
+        self._file = open(file_path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = SEGMENT_HEADER.unpack_from(self._map, 0)
+        if magic != SEGMENT_MAGIC:
+            self.close()
+            raise ValueError(f"无效的索引段文件: {file_path}")
+        self._postings_start = SEGMENT_HEADER.size + self.count * SEGMENT_ENTRY.size
+
+    @staticmethod
+    def write(file_path: str, entries: Iterable[Tuple[str, array]]) -> None:
+        """
+        写入段文件
+
+        Args:
+            file_path: 段文件路径
+            entries: 按词项排序的(二元组, 文档编号数组)
+        """
+        table = bytearray()
+        tmp_path = f"{file_path}.tmp"
+        with open(f"{tmp_path}.postings", 'w+b') as postings:
+            count = 0
+            offset = 0
+            for gram, doc_ids in entries:
+                table += SEGMENT_ENTRY.pack(ord(gram[0]), ord(gram[1]), offset, len(doc_ids))
+                postings.write(doc_ids)
+                offset += len(doc_ids) * doc_ids.itemsize
+                count += 1
+            postings.seek(0)
+            with open(tmp_path, 'wb') as f:
+                f.write(SEGMENT_HEADER.pack(SEGMENT_MAGIC, count))
+                f.write(table)
+                while True:
+                    chunk = postings.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+        os.remove(f"{tmp_path}.postings")
+        os.replace(tmp_path, file_path)
+
+    def postings(self, gram: str) -> array:
+        """二元组的倒排表（按文档编号排序）"""
+        key = (ord(gram[0]), ord(gram[1]))
+        position = self._bisect(key)
+        if position < self.count and self._key(position) == key:
+            return self._postings(position)
+        return array('I')
+
+    def prefix_postings(self, char: str) -> Iterator[array]:
+        """以该字开头的所有二元组的倒排表（用于单字查询）"""
+        position = self._bisect((ord(char), 0))
+        end = self._bisect((ord(char) + 1, 0))
+        for index in range(position, end):
+            yield self._postings(index)
+
+    def entries(self) -> Iterator[Tuple[str, array]]:
+        """按词项顺序遍历所有(二元组, 倒排表)，用于合并段文件"""
+        for index in range(self.count):
+            first, second = self._key(index)
+            yield chr(first) + chr(second), self._postings(index)
+
+    def close(self) -> None:
+        self._map.close()
+        self._file.close()
+
+    def _bisect(self, key: Tuple[int, int]) -> int:
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _key(self, index: int) -> Tuple[int, int]:
+        return _KEY.unpack_from(self._map, SEGMENT_HEADER.size + index * SEGMENT_ENTRY.size)
+
+    def _postings(self, index: int) -> array:
+        _, _, offset, count = SEGMENT_ENTRY.unpack_from(self._map, SEGMENT_HEADER.size + index * SEGMENT_ENTRY.size)
+        start = self._postings_start + offset
+        doc_ids = array('I')
+        doc_ids.frombytes(self._map[start:start + count * doc_ids.itemsize])
+        return doc_ids
+
+
+class SearchIndex:
+    """
+    章节全文检索索引
+
+    每个章节对应一个文档编号，章节重新保存时分配新编号，旧编号作废（查询时过滤，合并段文件时清除）。
+    新章节先索引在内存中，积累到flush_docs个后写成一个不可变的段文件；段文件超过max_segments个时合并为一个。
+    文档列表以仅追加的方式记录在docs.jsonl中，清单文件记录已写入段文件的最大文档编号，
+    程序异常退出时，之后的章节在下次打开时从章节存储重新索引。线程安全。
+    """
+
+    def __init__(self, index_dir: str, load_text: Callable[[str, str], Optional[str]],
+                 flush_docs: int = 256, max_segments: int = 8):
+        """
+        Args:
+            index_dir: 索引目录
+            load_text: 读取章节正文的函数，参数为(小说名称, 章节名称)，章节不存在时返回None
+            flush_docs: 内存中积累该数量的章节后写入段文件
+            max_segments: 段文件数超过该值时合并
+        """
+        self.index_dir = index_dir
+        self.load_text = load_text
+        self.flush_docs = flush_docs
+        self.max_segments = max_segments
+        self._lock = threading.Lock()
+        os.makedirs(self.index_dir, exist_ok=True)
+        self._docs_path = os.path.join(self.index_dir, "docs.jsonl")
+        self._manifest_path = os.path.join(self.index_dir, "manifest.json")
+        # 文档编号 -> (小说名称, 章节名称)，只包含有效的文档
+        self._docs: Dict[int, Tuple[str, str]] = {}
+        self._doc_ids: Dict[Tuple[str, str], int] = {}
+        self._next_doc_id = 0
+        self._segments: List[IndexSegment] = []
+        self._next_segment = 0
+        self._flushed_doc_id = -1
+        # 尚未写入段文件的章节: 二元组 -> 文档编号列表
+        self._buffer: Dict[str, List[int]] = {}
+        self._buffered_docs = 0
+        self._open()
+
+    def add(self, novel_name: str, chapter: str, text: str) -> None:
+        """
+        索引章节（章节已索引时替换）
+
+        Args:
+            novel_name: 小说名称
+            chapter: 章节名称
+            text: 章节正文
+        """
+        with self._lock:
+            doc_id = self._next_doc_id
+            self._next_doc_id += 1
+            with open(self._docs_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps([doc_id, novel_name, chapter], ensure_ascii=False) + "\n")
+            self._register(doc_id, novel_name, chapter)
+            self._index_text(doc_id, text)
+            if self._buffered_docs >= self.flush_docs:
+                self._flush()
+
+    def search(self, query: str, novel_name: Optional[str] = None, limit: int = 100) -> List[SearchHit]:
+        """
+        检索包含query的章节
+
+        Args:
+            query: 查询文本
+            novel_name: 只检索该小说，为None时检索全部
+            limit: 最多返回的章节数
+
+        Returns:
+            List[SearchHit]: 按小说和章节序号排序的命中列表
+        """
+        if not query:
+            return []
+        with self._lock:
+            candidates = self._candidates(query)
+            docs = [self._docs[doc_id] for doc_id in candidates if doc_id in self._docs]
+        if novel_name is not None:
+            docs = [doc for doc in docs if doc[0] == novel_name]
+        docs.sort(key=lambda doc: (doc[0], chapter_sort_key(doc[1])))
+
+        # 倒排表只保证包含所有二元组，需要在正文中确认并定位
+        hits = []
+        for doc_novel, doc_chapter in docs:
+            text = self.load_text(doc_novel, doc_chapter)
+            if text is None:
+                continue
+            offsets = []
+            position = text.find(query)
+            while position != -1:
+                offsets.append(position)
+                position = text.find(query, position + 1)
+            if offsets:
+                hits.append(SearchHit(doc_novel, doc_chapter, offsets))
+                if len(hits) >= limit:
+                    break
+        return hits
+
+    def rebuild(self, chapters: Iterable[Tuple[str, str]]) -> int:
+        """
+        清空索引后重新索引所有章节
+
+        Args:
+            chapters: (小说名称, 章节名称)
+
+        Returns:
+            int: 索引的章节数
+        """
+        with self._lock:
+            for segment in self._segments:
+                segment.close()
+                os.remove(segment.file_path)
+            self._segments = []
+            self._docs.clear()
+            self._doc_ids.clear()
+            self._buffer.clear()
+            self._buffered_docs = 0
+            self._next_doc_id = 0
+            self._flushed_doc_id = -1
+            open(self._docs_path, 'w', encoding='utf-8').close()
+            self._save_manifest()
+        count = 0
+        for novel_name, chapter in chapters:
+            text = self.load_text(novel_name, chapter)
+            if text is not None:
+                self.add(novel_name, chapter, text)
+                count += 1
+        self.flush()
+        return count
+
+    def flush(self) -> None:
+        """将内存中的章节写入段文件"""
+        with self._lock:
+            self._flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush()
+            for segment in self._segments:
+                segment.close()
+            self._segments = []
+
+    def _candidates(self, query: str) -> List[int]:
+        """所有二元组都出现过的文档编号，需在持有self._lock时调用"""
+        if len(query) == 1:
+            doc_ids: Set[int] = set()
+            for segment in self._segments:
+                for postings in segment.prefix_postings(query):
+                    doc_ids.update(postings)
+            for gram, buffered in self._buffer.items():
+                if gram[0] == query:
+                    doc_ids.update(buffered)
+            return sorted(doc_ids)
+
+        result: Optional[Set[int]] = None
+        # 从文档数最少的二元组开始求交集
+        postings_by_gram = []
+        for gram in text_bigrams(query):
+            doc_ids = set(self._buffer.get(gram, ()))
+            for segment in self._segments:
+                doc_ids.update(segment.postings(gram))
+            if not doc_ids:
+                return []
+            postings_by_gram.append(doc_ids)
+        for doc_ids in sorted(postings_by_gram, key=len):
+            result = doc_ids if result is None else result & doc_ids
+            if not result:
+                return []
+        return sorted(result)
+
+    def _register(self, doc_id: int, novel_name: str, chapter: str) -> None:
+        """登记文档，同一章节的旧文档作废，需在持有self._lock时调用"""
+        old_id = self._doc_ids.get((novel_name, chapter))
+        if old_id is not None:
+            self._docs.pop(old_id, None)
+        self._docs[doc_id] = (novel_name, chapter)
+        self._doc_ids[(novel_name, chapter)] = doc_id
+
+    def _index_text(self, doc_id: int, text: str) -> None:
+        """将章节的二元组加入内存索引，需在持有self._lock时调用"""
+        for gram in text_bigrams(text):
+            self._buffer.setdefault(gram, []).append(doc_id)
+        self._buffered_docs += 1
+
+    def _flush(self) -> None:
+        """将内存索引写入新的段文件，需在持有self._lock时调用"""
+        if not self._buffered_docs:
+            return
+        file_path = os.path.join(self.index_dir, f"seg-{self._next_segment:06d}.idx")
+        self._next_segment += 1
+        IndexSegment.write(file_path, ((gram, array('I', self._buffer[gram])) for gram in sorted(self._buffer)))
+        self._segments.append(IndexSegment(file_path))
+        self._buffer = {}
+        self._buffered_docs = 0
+        self._flushed_doc_id = self._next_doc_id - 1
+        if len(self._segments) > self.max_segments:
+            self._merge()
+        self._save_manifest()
+
+    def _merge(self) -> None:
+        """把所有段文件合并为一个，同时去掉作废的文档，需在持有self._lock时调用"""
+        file_path = os.path.join(self.index_dir, f"seg-{self._next_segment:06d}.idx")
+        self._next_segment += 1
+        live = self._docs
+
+        def merged_entries() -> Iterator[Tuple[str, array]]:
+            # 各段文件的文档编号区间按写入顺序递增，同一词项的倒排表按段文件顺序拼接后仍然有序
+            current_gram = None
+            current = array('I')
+            streams = [
+                ((gram, order, postings) for gram, postings in segment.entries())
+                for order, segment in enumerate(self._segments)
+            ]
+            for gram, _, postings in heapq.merge(*streams):
+                if gram != current_gram:
+                    if current:
+                        yield current_gram, current
+                    current_gram = gram
+                    current = array('I')
+                current.extend(doc_id for doc_id in postings if doc_id in live)
+            if current:
+                yield current_gram, current
+
+        IndexSegment.write(file_path, merged_entries())
+        old_segments = self._segments
+        self._segments = [IndexSegment(file_path)]
+        # 先保存清单再删除旧段文件，中途退出时清单仍指向完整的段文件
+        self._save_manifest()
+        for segment in old_segments:
+            segment.close()
+            os.remove(segment.file_path)
+        app_logger.info(f"检索索引已合并 {len(old_segments)} 个段文件")
+
+    def _save_manifest(self) -> None:
+        atomic_write_json(self._manifest_path, {
+            "segments": [os.path.basename(segment.file_path) for segment in self._segments],
+            "next_segment": self._next_segment,
+            "flushed_doc_id": self._flushed_doc_id
+        })
+
+    def _open(self) -> None:
+        """加载清单和文档列表，未写入段文件的章节重新索引"""
+        if os.path.exists(self._manifest_path):
+            with open(self._manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            self._next_segment = manifest["next_segment"]
+            self._flushed_doc_id = manifest["flushed_doc_id"]
+            self._segments = [IndexSegment(os.path.join(self.index_dir, name)) for name in manifest["segments"]]
+            # 清理合并或写入中途退出时留下的段文件
+            listed = set(manifest["segments"])
+            for name in os.listdir(self.index_dir):
+                if name.startswith("seg-") and name not in listed:
+                    os.remove(os.path.join(self.index_dir, name))
+
+        pending: List[Tuple[int, str, str]] = []
+        if os.path.exists(self._docs_path):
+            with open(self._docs_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        doc_id, novel_name, chapter = json.loads(line)
+                    except ValueError:
+                        # 写入中途退出时留下的不完整行
+                        continue
+                    self._register(doc_id, novel_name, chapter)
+                    self._next_doc_id = max(self._next_doc_id, doc_id + 1)
+                    if doc_id > self._flushed_doc_id:
+                        pending.append((doc_id, novel_name, chapter))
+        for doc_id, novel_name, chapter in pending:
+            text = self.load_text(novel_name, chapter)
+            if text is not None and self._docs.get(doc_id) == (novel_name, chapter):
+                self._index_text(doc_id, text)
+        if pending:
+            app_logger.info(f"检索索引: 重新索引 {len(pending)} 个未写入段文件的章节")
+
+
+if __name__ == "__main__":
+    # 用法: python search_index.py build | python search_index.py <查询文本> [小说名称]
+    from config_manager import ConfigManager
+    from novel_processor import NovelProcessor
+
+    if len(sys.argv) < 2:
+        print("用法: python search_index.py build | python search_index.py <查询文本> [小说名称]")
+        sys.exit(1)
+    processor = NovelProcessor(ConfigManager())
+    try:
+        if sys.argv[1] == "build":
+            print(f"索引完成: {processor.rebuild_search_index()} 章")
+        else:
+            for hit in processor.search_chapters(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None):
+                print(f"{hit.novel_name} {hit.chapter}: {len(hit.offsets)} 处, 位置 {hit.offsets[:10]}")
+    finally:
+        processor.close()
@@ -0,0 +1,138 @@
+"""
+状态日志模块
+以JSON Lines的形式追加记录每一次状态修改，启动时在快照基础上重放
+"""
+
+import json
+import os
+import tempfile
+import threading
+from typing import Any, Dict, Iterator
+from logger import app_logger
+
+
+class StatsJournal:
+    """
+    状态修改日志（仅追加）
+
+    每条记录占一行: {"seq": 序号, "op": 操作类型, "data": 操作数据}。
+    序号单调递增，快照中记录已包含的最大序号，重放时跳过快照已包含的记录。
+    进程在写入中途崩溃最多只会留下一行不完整的记录，读取时会被忽略。
+    """
+
+    def __init__(self, file_path: str):
+        """
+        初始化日志
+
+        Args:
+            file_path: 日志文件路径
+        """
+        self.file_path = file_path
+        self.last_seq = 0
+        self._lock = threading.Lock()
+        self._file = None
+
+    def entries(self, after_seq: int = 0) -> Iterator[Dict[str, Any]]:
+        """
+        读取日志中序号大于after_seq的记录
+
+        Args:
+            after_seq: 起始序号（不包含）
+
+        Returns:
+            Iterator[Dict[str, Any]]: 日志记录
+        """
+        if not os.path.exists(self.file_path):
+            return
+        with open(self.file_path, 'r', encoding='utf-8') as f:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    app_logger.warning(f"忽略损坏的状态日志记录: {self.file_path} 第{line_no}行")
+                    continue
+                self.last_seq = max(self.last_seq, entry.get("seq", 0))
+                if entry.get("seq", 0) > after_seq:
+                    yield entry
+
+    def append(self, op: str, data: Dict[str, Any]) -> int:
+        """
+        追加一条修改记录
+
+        Args:
+            op: 操作类型
+            data: 操作数据
+
+        Returns:
+            int: 记录序号
+        """
+        with self._lock:
+            self.last_seq += 1
+            line = json.dumps({"seq": self.last_seq, "op": op, "data": data}, ensure_ascii=False)
+            if self._file is None:
+                self._file = self._open_for_append()
+            self._file.write(line + "\n")
+            self._file.flush()
+            return self.last_seq
+
+    def _open_for_append(self):
+        """以追加方式打开日志文件，若上次写入中断留下不完整的行，先补齐换行"""
+        needs_newline = False
+        if os.path.exists(self.file_path) and os.path.getsize(self.file_path) > 0:
+            with open(self.file_path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                needs_newline = f.read(1) != b"\n"
+        journal_file = open(self.file_path, 'a', encoding='utf-8')
+        if needs_newline:
+            journal_file.write("\n")
+        return journal_file
+
+    def sync(self) -> None:
+        """将已追加的记录刷到磁盘"""
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+
+    def size(self) -> int:
+        """获取日志文件大小（字节）"""
+        with self._lock:
+            if self._file is not None:
+                return self._file.tell()
+        return os.path.getsize(self.file_path) if os.path.exists(self.file_path) else 0
+
+    def truncate_through(self, seq: int) -> None:
+        """
+        删除序号不大于seq的记录（这些记录已写入快照）
+
+        Args:
+            seq: 快照已包含的最大序号
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            remaining = [entry for entry in self.entries(seq)]
+            target_dir = os.path.dirname(os.path.abspath(self.file_path))
+            fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=".journal", dir=target_dir)
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    for entry in remaining:
+                        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.file_path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+    def close(self) -> None:
+        """关闭日志文件"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,134 @@
+"""
+状态文件持久化模块
+负责在后台线程中合并短时间内的多次状态修改，并以原子方式写入磁盘
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Optional
+from logger import app_logger
+
+
+def atomic_write_json(file_path: str, data: Any, indent: Optional[int] = 4) -> None:
+    """
+    以"临时文件 + 重命名"的方式原子写入JSON文件
+
+    Args:
+        file_path: 目标文件路径
+        data: 需要写入的数据
+        indent: JSON缩进
+    """
+    target_dir = os.path.dirname(os.path.abspath(file_path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=".json", dir=target_dir)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            # json.dumps可以使用C实现的编码器，比json.dump逐块写入快得多
+            f.write(json.dumps(data, ensure_ascii=False, indent=indent))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class StatsPersister:
+    """
+    状态文件后台写入器
+
+    修改方只需调用mark_dirty()标记脏数据，后台线程在合并窗口结束后
+    调用snapshot_func获取一次快照并原子写入，窗口内的多次修改只产生一次写盘。
+    """
+
+    def __init__(self, file_path: str, snapshot_func: Callable[[], Any], flush_interval: float = 1.0,
+                 after_write: Optional[Callable[[Any], None]] = None):
+        """
+        初始化写入器
+
+        Args:
+            file_path: 状态文件路径
+            snapshot_func: 获取待写入数据快照的函数，需自行保证线程安全
+            flush_interval: 合并窗口（秒），为0时每次标记都立即同步写入
+            after_write: 快照写入成功后的回调，参数为已写入的快照
+        """
+        self.file_path = file_path
+        self.snapshot_func = snapshot_func
+        self.after_write = after_write
+        self.flush_interval = flush_interval
+        # 实际写盘次数，便于统计合并效果
+        self.write_count = 0
+
+        self._dirty = False
+        self._stopped = False
+        self._condition = threading.Condition()
+        # 保证同一时刻只有一个线程在写文件
+        self._write_lock = threading.Lock()
+
+        self._thread = None
+        if self.flush_interval > 0:
+            self._thread = threading.Thread(target=self._run, name="StatsPersister", daemon=True)
+            self._thread.start()
+
+    def mark_dirty(self) -> None:
+        """标记状态已修改，等待后台线程写入"""
+        if self._thread is None:
+            self._dirty = True
+            self.flush()
+            return
+
+        with self._condition:
+            self._dirty = True
+            self._condition.notify()
+
+    def flush(self) -> None:
+        """立即将未写入的修改同步写入磁盘"""
+        with self._condition:
+            if not self._dirty:
+                return
+            self._dirty = False
+        self._write()
+
+    def stop(self) -> None:
+        """停止后台线程，并写入剩余的修改"""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _run(self) -> None:
+        """后台线程主循环"""
+        while True:
+            with self._condition:
+                while not self._dirty and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                # 在合并窗口内继续接收修改，窗口结束后统一写入
+                deadline = time.monotonic() + self.flush_interval
+                remaining = self.flush_interval
+                while remaining > 0 and not self._stopped:
+                    self._condition.wait(remaining)
+                    remaining = deadline - time.monotonic()
+                if self._stopped:
+                    return
+            self.flush()
+
+    def _write(self) -> None:
+        """获取快照并原子写入"""
+        with self._write_lock:
+            try:
+                snapshot = self.snapshot_func()
+                atomic_write_json(self.file_path, snapshot)
+                self.write_count += 1
+                app_logger.debug(f"状态文件已保存: {self.file_path}")
+                if self.after_write is not None:
+                    self.after_write(snapshot)
+            except Exception as e:
+                app_logger.error(f"保存状态文件失败: {e}")
@@ -0,0 +1,442 @@
+"""
+状态存储模块
+提供可替换的运行状态存储后端：JSON快照 + 状态日志，或SQLite数据库
+"""
+
+import copy
+import json
+import os
+import sqlite3
+import sys
+import threading
+from typing import Any, Callable, Dict, Optional
+from logger import app_logger
+from stats_journal import StatsJournal
+from stats_persister import StatsPersister
+
+
+# 由独立数据表保存的状态键，其余键以JSON形式保存在通用键值表中
+TABLE_KEYS = ("coins", "novel_progress", "device_sign_in_status")
+
+
+def default_stats() -> Dict[str, Any]:
+    """默认状态"""
+    return {
+        "coins": [],
+        "novel_progress": {}
+    }
+
+
+def apply_mutation(stats: Dict[str, Any], op: str, data: Dict[str, Any]) -> None:
+    """
+    将一条修改记录应用到内存状态
+
+    Args:
+        stats: 状态字典
+        op: 操作类型
+        data: 操作数据
+    """
+    if op == "add_coin":
+        stats.setdefault("coins", []).append(dict(data["coin"]))
+    elif op == "spend_coins":
+        coins_by_id = {coin["id"]: coin for coin in stats.get("coins", [])}
+        for coin_id, amount in data["splits"]:
+            coins_by_id[coin_id]["balance"] -= amount
+    elif op == "chapter_completed":
+        novel_progress = stats.setdefault("novel_progress", {})
+        novel_progress.setdefault(data["novel_name"], {})[data["chapter"]] = {
+            "device_id": data["device_id"],
+            "timestamp": data["timestamp"]
+        }
+    elif op == "sign_in":
+        stats.setdefault("device_sign_in_status", {})[data["device_serial"]] = data["date"]
+    elif op == "archive_coins":
+        archived_ids = set(data["ids"])
+        stats["coins"] = [coin for coin in stats.get("coins", []) if coin["id"] not in archived_ids]
+        stats["coin_archive"] = [coin for coin in stats.get("coin_archive", []) if coin["id"] not in archived_ids]
+        # 记录下一个代币编号，避免归档后的编号被重新分配
+        stats["next_coin_id"] = max(stats.get("next_coin_id", 1), data["next_coin_id"])
+        expired_unused = stats.setdefault("expired_unused_coins", {})
+        for device_serial, amount in data["expired_unused"].items():
+            expired_unused[device_serial] = expired_unused.get(device_serial, 0) + amount
+    else:
+        raise ValueError(f"未知的状态操作: {op}")
+
+
+class StatsStore:
+    """状态存储后端基类"""
+
+    def load(self) -> Dict[str, Any]:
+        """
+        加载完整状态
+
+        Returns:
+            Dict[str, Any]: 状态字典
+        """
+        raise NotImplementedError
+
+    def record(self, op: str, data: Dict[str, Any]) -> None:
+        """
+        持久化一条已应用到内存的修改记录
+
+        Args:
+            op: 操作类型
+            data: 操作数据
+        """
+        raise NotImplementedError
+
+    def save(self, stats: Dict[str, Any]) -> None:
+        """
+        持久化完整状态（用于无法表示为修改记录的整体更新）
+
+        Args:
+            stats: 状态字典
+        """
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        """立即写入所有未保存的修改"""
+
+    def persist_pending(self) -> None:
+        """写入record/save推迟的完整快照，需在释放调用方所有的锁后调用（生成快照时会重新加锁）"""
+
+    def sync(self) -> None:
+        """将已持久化的修改记录刷到磁盘，断电后不丢失"""
+
+    def close(self) -> None:
+        """关闭存储，写入剩余的修改"""
+
+
+class JsonStatsStore(StatsStore):
+    """
+    JSON状态存储
+
+    stats.json保存状态快照，每次修改以一行记录追加到状态日志；
+    日志超过阈值后由后台写入器生成新快照并删除快照已包含的记录。
+    record/save在调用方持锁时执行，只标记需要快照，由调用方释放锁后调用persist_pending写入，
+    同步写入（flush_interval为0）时生成快照不会与调用方持有的锁互相等待。
+    """
+
+    def __init__(self, stats_file: str, snapshot_func: Callable[[], Dict[str, Any]], lock: threading.RLock,
+                 flush_interval: float = 1.0, journal_max_bytes: int = 1024 * 1024):
+        """
+        Args:
+            stats_file: 状态快照文件路径
+            snapshot_func: 返回当前状态深拷贝的函数
+            lock: 生成快照时持有的锁，不可重复应用的修改（如代币增减）必须在持有它时应用并记录，
+                  其余修改（章节进度、签到）可能在快照期间并发写入，重放时重复应用不影响结果
+            flush_interval: 快照合并写入窗口（秒），为0时同步写入
+            journal_max_bytes: 状态日志超过该大小后压缩为新的状态快照
+        """
+        self.stats_file = stats_file
+        self.snapshot_func = snapshot_func
+        self.journal_max_bytes = journal_max_bytes
+        self._lock = lock
+        self._journal = StatsJournal(f"{os.path.splitext(stats_file)[0]}.journal")
+        self._snapshot_pending = False
+        self._persister = StatsPersister(stats_file, self._snapshot, flush_interval,
+                                         after_write=self._on_snapshot_written)
+
+    def load(self) -> Dict[str, Any]:
+        """加载状态快照，并在快照基础上重放状态日志"""
+        with self._lock:
+            if os.path.exists(self.stats_file):
+                with open(self.stats_file, 'r', encoding='utf-8') as f:
+                    stats = json.load(f)
+            else:
+                stats = default_stats()
+
+            snapshot_seq = stats.pop("journal_seq", 0)
+            replayed = 0
+            for entry in self._journal.entries(snapshot_seq):
+                try:
+                    apply_mutation(stats, entry["op"], entry["data"])
+                    replayed += 1
+                except Exception as e:
+                    app_logger.error(f"重放状态日志失败 (seq={entry.get('seq')}): {e}")
+            self._journal.last_seq = max(self._journal.last_seq, snapshot_seq)
+            if replayed:
+                app_logger.info(f"已重放状态日志 {replayed} 条")
+            return stats
+
+    def record(self, op: str, data: Dict[str, Any]) -> None:
+        """追加一条修改记录，日志过大时触发快照压缩"""
+        try:
+            self._journal.append(op, data)
+        except Exception as e:
+            app_logger.error(f"写入状态日志失败，改为保存完整快照: {e}")
+            self._snapshot_pending = True
+            return
+        if self._journal.size() >= self.journal_max_bytes:
+            self._snapshot_pending = True
+
+    def save(self, stats: Dict[str, Any]) -> None:
+        """标记需要保存完整快照，persist_pending后由后台写入器合并后原子写入"""
+        self._snapshot_pending = True
+
+    def flush(self) -> None:
+        self.persist_pending()
+        self._persister.flush()
+
+    def persist_pending(self) -> None:
+        if self._snapshot_pending:
+            self._snapshot_pending = False
+            self._persister.mark_dirty()
+
+    def sync(self) -> None:
+        self._journal.sync()
+
+    def close(self) -> None:
+        self.persist_pending()
+        self._persister.stop()
+        self._journal.close()
+
+    @property
+    def write_count(self) -> int:
+        """快照实际写盘次数"""
+        return self._persister.write_count
+
+    def journal_size(self) -> int:
+        """状态日志大小（字节）"""
+        return self._journal.size()
+
+    def _snapshot(self) -> Dict[str, Any]:
+        """获取带日志序号的状态快照"""
+        with self._lock:
+            # 先读取序号：修改总是先应用到内存再写入日志，序号不大于它的修改都已包含在随后复制的状态中
+            journal_seq = self._journal.last_seq
+            snapshot = self.snapshot_func()
+            snapshot["journal_seq"] = journal_seq
+            return snapshot
+
+    def _on_snapshot_written(self, snapshot: Dict[str, Any]) -> None:
+        """快照写入成功后，删除快照已包含的日志记录"""
+        self._journal.truncate_through(snapshot["journal_seq"])
+
+
+class SqliteStatsStore(StatsStore):
+    """
+    SQLite状态存储（WAL模式）
+
+    代币、章节进度、签到记录分别保存在独立的数据表中，每次修改只更新相关的行；
+    其它状态键以JSON形式保存在extra_stats表中。
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS coins (
+            id INTEGER PRIMARY KEY,
+            device_serial TEXT NOT NULL,
+            amount INTEGER NOT NULL,
+            expire_time TEXT NOT NULL,
+            balance INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_coins_device_expire ON coins (device_serial, expire_time);
+        CREATE INDEX IF NOT EXISTS idx_coins_expire ON coins (expire_time);
+        CREATE TABLE IF NOT EXISTS chapter_progress (
+            novel_name TEXT NOT NULL,
+            chapter TEXT NOT NULL,
+            device_id TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            PRIMARY KEY (novel_name, chapter)
+        );
+        CREATE INDEX IF NOT EXISTS idx_progress_device ON chapter_progress (device_id, novel_name);
+        CREATE TABLE IF NOT EXISTS sign_ins (
+            device_serial TEXT PRIMARY KEY,
+            date TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS extra_stats (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, db_file: str):
+        """
+        Args:
+            db_file: 数据库文件路径
+        """
+        self.db_file = db_file
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_file, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+
+    def load(self) -> Dict[str, Any]:
+        """从数据库组装完整状态"""
+        with self._lock:
+            stats = default_stats()
+            for key, value in self._conn.execute("SELECT key, value FROM extra_stats"):
+                stats[key] = json.loads(value)
+
+            stats["coins"] = [
+                {"id": row[0], "device_serial": row[1], "amount": row[2], "expire_time": row[3], "balance": row[4]}
+                for row in self._conn.execute(
+                    "SELECT id, device_serial, amount, expire_time, balance FROM coins ORDER BY id")
+            ]
+
+            novel_progress = stats["novel_progress"]
+            for novel_name, chapter, device_id, timestamp in self._conn.execute(
+                    "SELECT novel_name, chapter, device_id, timestamp FROM chapter_progress ORDER BY rowid"):
+                novel_progress.setdefault(novel_name, {})[chapter] = {"device_id": device_id, "timestamp": timestamp}
+
+            sign_ins = dict(self._conn.execute("SELECT device_serial, date FROM sign_ins"))
+            if sign_ins:
+                stats["device_sign_in_status"] = sign_ins
+            return stats
+
+    def record(self, op: str, data: Dict[str, Any]) -> None:
+        """将一条修改记录写入对应的数据表"""
+        with self._lock, self._transaction():
+            if op == "add_coin":
+                coin = data["coin"]
+                self._conn.execute(
+                    "INSERT INTO coins (id, device_serial, amount, expire_time, balance) VALUES (?, ?, ?, ?, ?)",
+                    (coin["id"], coin["device_serial"], coin["amount"], coin["expire_time"], coin["balance"]))
+            elif op == "spend_coins":
+                self._conn.executemany(
+                    "UPDATE coins SET balance = balance - ? WHERE id = ?",
+                    [(amount, coin_id) for coin_id, amount in data["splits"]])
+            elif op == "chapter_completed":
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO chapter_progress (novel_name, chapter, device_id, timestamp) "
+                    "VALUES (?, ?, ?, ?)",
+                    (data["novel_name"], data["chapter"], data["device_id"], data["timestamp"]))
+            elif op == "sign_in":
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO sign_ins (device_serial, date) VALUES (?, ?)",
+                    (data["device_serial"], data["date"]))
+            elif op == "archive_coins":
+                self._conn.executemany("DELETE FROM coins WHERE id = ?", [(coin_id,) for coin_id in data["ids"]])
+                extra_keys = ("coin_archive", "expired_unused_coins", "next_coin_id")
+                extra = {"coin_archive": [], "expired_unused_coins": {}}
+                for key, value in self._conn.execute(
+                        f"SELECT key, value FROM extra_stats WHERE key IN ({', '.join('?' * len(extra_keys))})",
+                        extra_keys):
+                    extra[key] = json.loads(value)
+                apply_mutation(extra, op, data)
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO extra_stats (key, value) VALUES (?, ?)",
+                    [(key, json.dumps(extra[key], ensure_ascii=False)) for key in extra_keys])
+            else:
+                raise ValueError(f"未知的状态操作: {op}")
+
+    def save(self, stats: Dict[str, Any]) -> None:
+        """用完整状态替换数据库内容"""
+        with self._lock, self._transaction():
+            self._conn.execute("DELETE FROM coins")
+            self._conn.executemany(
+                "INSERT INTO coins (id, device_serial, amount, expire_time, balance) VALUES (?, ?, ?, ?, ?)",
+                [(coin["id"], coin["device_serial"], coin["amount"], coin["expire_time"], coin["balance"])
+                 for coin in stats.get("coins", [])])
+
+            self._conn.execute("DELETE FROM chapter_progress")
+            self._conn.executemany(
+                "INSERT INTO chapter_progress (novel_name, chapter, device_id, timestamp) VALUES (?, ?, ?, ?)",
+                [(novel_name, chapter, info.get("device_id", ""), info.get("timestamp", ""))
+                 for novel_name, chapters in stats.get("novel_progress", {}).items()
+                 for chapter, info in chapters.items()])
+
+            self._conn.execute("DELETE FROM sign_ins")
+            self._conn.executemany(
+                "INSERT INTO sign_ins (device_serial, date) VALUES (?, ?)",
+                list(stats.get("device_sign_in_status", {}).items()))
+
+            self._conn.execute("DELETE FROM extra_stats")
+            self._conn.executemany(
+                "INSERT INTO extra_stats (key, value) VALUES (?, ?)",
+                [(key, json.dumps(value, ensure_ascii=False))
+                 for key, value in stats.items() if key not in TABLE_KEYS])
+
+    def sync(self) -> None:
+        """synchronous=NORMAL下提交不等待WAL落盘，检查点会先同步WAL"""
+        with self._lock:
+            self._conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _transaction(self):
+        """开启一个事务，正常结束时提交，出错时回滚"""
+        return _Transaction(self._conn)
+
+
+class _Transaction:
+    """SQLite事务上下文（连接处于自动提交模式，需要显式开启事务）"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+
+    def __enter__(self):
+        self._conn.execute("BEGIN")
+        return self._conn
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._conn.execute("COMMIT" if exc_type is None else "ROLLBACK")
+        return False
+
+
+def create_stats_store(backend: str, stats_file: str, snapshot_func: Callable[[], Dict[str, Any]],
+                       lock: threading.RLock, flush_interval: float = 1.0,
+                       journal_max_bytes: int = 1024 * 1024) -> StatsStore:
+    """
+    根据后端名称创建状态存储
+
+    Args:
+        backend: 后端名称，"json"或"sqlite"
+        stats_file: 状态文件路径，sqlite后端使用同名的.db文件
+        snapshot_func: 返回当前状态深拷贝的函数（json后端使用）
+        lock: 保护内存状态的锁（json后端使用）
+        flush_interval: 快照合并写入窗口（json后端使用）
+        journal_max_bytes: 状态日志压缩阈值（json后端使用）
+
+    Returns:
+        StatsStore: 状态存储实例
+    """
+    if backend == "sqlite":
+        return SqliteStatsStore(f"{os.path.splitext(stats_file)[0]}.db")
+    if backend != "json":
+        app_logger.warning(f"未知的状态存储后端: {backend}，使用json")
+    return JsonStatsStore(stats_file, snapshot_func, lock, flush_interval, journal_max_bytes)
+
+
+def migrate_json_to_sqlite(stats_file: str = "stats.json", db_file: Optional[str] = None) -> str:
+    """
+    将stats.json（含未压缩的状态日志）一次性迁移到SQLite数据库
+
+    Args:
+        stats_file: 状态快照文件路径
+        db_file: 目标数据库路径，默认为与状态文件同名的.db文件
+
+    Returns:
+        str: 数据库文件路径
+    """
+    db_file = db_file or f"{os.path.splitext(stats_file)[0]}.db"
+    lock = threading.RLock()
+    json_store = JsonStatsStore(stats_file, lambda: {}, lock, flush_interval=0)
+    stats = json_store.load()
+    json_store.close()
+
+    # 兼容旧版本没有编号的代币
+    next_coin_id = max((coin.get("id", 0) for coin in stats.get("coins", [])), default=0) + 1
+    for coin in stats.get("coins", []):
+        if "id" not in coin:
+            coin["id"] = next_coin_id
+            next_coin_id += 1
+
+    sqlite_store = SqliteStatsStore(db_file)
+    try:
+        sqlite_store.save(copy.deepcopy(stats))
+    finally:
+        sqlite_store.close()
+
+    chapter_count = sum(len(chapters) for chapters in stats.get("novel_progress", {}).values())
+    app_logger.info(f"状态已迁移到 {db_file}: 代币 {len(stats.get('coins', []))} 条, 章节进度 {chapter_count} 条")
+    return db_file
+
+
+if __name__ == "__main__":
+    # 用法: python stats_store.py [stats.json] [stats.db]
+    db_path = migrate_json_to_sqlite(*sys.argv[1:3])
+    print(f"迁移完成: {db_path}，在config.json中设置 \"stats_backend\": \"sqlite\" 以启用")
@@ -0,0 +1,165 @@
+"""
+批量同步模块
+把多个线程在短时间内提交的写入合并为一轮fsync（组提交），在保证写入持久化的前提下减少每次保存的等待
+"""
+
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Sequence
+from logger import app_logger
+
+
+def fsync_file(file_path: str) -> None:
+    """
+    按路径将文件内容刷到磁盘
+
+    Args:
+        file_path: 文件路径
+    """
+    # Windows下fsync需要可写的文件句柄
+    fd = os.open(file_path, os.O_RDWR)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def fsync_dir(dir_path: str) -> None:
+    """
+    将目录项（新建、重命名、删除的文件）刷到磁盘，Windows不支持打开目录，跳过
+
+    Args:
+        dir_path: 目录路径
+    """
+    if os.name == "nt":
+        return
+    fd = os.open(dir_path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+@dataclass
+class SyncRequest:
+    """一次等待持久化的写入"""
+    files: Sequence[str]
+    publish: Optional[Callable[[], None]]
+    dirs: Sequence[str]
+    on_durable: Optional[Callable[[], None]]
+    done: bool = False
+    error: Optional[BaseException] = None
+
+
+@dataclass
+class SyncStats:
+    """同步统计"""
+    rounds: int = 0
+    requests: int = 0
+    file_syncs: int = 0
+    dir_syncs: int = 0
+
+
+class SyncBatcher:
+    """
+    组提交同步器
+
+    保存方写好文件后调用sync()并阻塞等待。当前没有同步在进行时，调用方成为本轮的执行者，
+    等待window秒收集其它线程的提交，然后对整批写入依次执行:
+    fsync文件（同一文件只执行一次）-> 发布（如重命名临时文件）-> fsync目录（同一目录只执行一次）
+    -> 持久化回调（如记录进度）-> after_sync（如将进度记录刷到磁盘）。
+    同步进行期间到达的提交进入下一轮，由其中一个等待者执行。线程安全。
+    """
+
+    def __init__(self, window: float = 0.02, after_sync: Optional[Callable[[], None]] = None):
+        """
+        Args:
+            window: 收集同一批提交的等待时间（秒），为0时不等待，只合并同步期间到达的提交
+            after_sync: 每轮持久化回调执行完后调用一次
+        """
+        self.window = window
+        self.after_sync = after_sync
+        self.stats = SyncStats()
+        self._condition = threading.Condition()
+        self._pending: List[SyncRequest] = []
+        self._syncing = False
+
+    def sync(self, files: Sequence[str] = (), publish: Optional[Callable[[], None]] = None,
+             dirs: Sequence[str] = (), on_durable: Optional[Callable[[], None]] = None) -> None:
+        """
+        提交一次写入并等待其持久化
+
+        Args:
+            files: 需要fsync的文件
+            publish: 文件持久化后执行的发布操作
+            dirs: 发布后需要fsync的目录
+            on_durable: 写入持久化后执行的回调
+
+        Raises:
+            OSError: 同步或发布失败时，抛出对应的异常
+        """
+        request = SyncRequest(files, publish, dirs, on_durable)
+        with self._condition:
+            self._pending.append(request)
+            while self._syncing and not request.done:
+                self._condition.wait()
+            if not request.done:
+                self._syncing = True
+        if not request.done:
+            try:
+                if self.window > 0:
+                    time.sleep(self.window)
+                with self._condition:
+                    batch, self._pending = self._pending, []
+                self._run(batch)
+            finally:
+                with self._condition:
+                    self._syncing = False
+                    self._condition.notify_all()
+        if request.error is not None:
+            raise request.error
+
+    def _run(self, batch: List[SyncRequest]) -> None:
+        """执行一轮同步，每个请求的异常只影响它自己"""
+        synced = {}
+        for request in batch:
+            for file_path in request.files:
+                if file_path not in synced:
+                    synced[file_path] = self._call(fsync_file, file_path)
+                if request.error is None:
+                    request.error = synced[file_path]
+        for request in batch:
+            if request.error is None and request.publish is not None:
+                request.error = self._call(request.publish)
+        synced_dirs = {}
+        for request in batch:
+            if request.error is not None:
+                continue
+            for dir_path in request.dirs:
+                if dir_path not in synced_dirs:
+                    synced_dirs[dir_path] = self._call(fsync_dir, dir_path)
+                request.error = request.error or synced_dirs[dir_path]
+        for request in batch:
+            if request.error is None and request.on_durable is not None:
+                request.error = self._call(request.on_durable)
+        if self.after_sync is not None:
+            error = self._call(self.after_sync)
+            if error is not None:
+                app_logger.error(f"同步后回调失败: {error}")
+        with self._condition:
+            for request in batch:
+                request.done = True
+            self.stats.rounds += 1
+            self.stats.requests += len(batch)
+            self.stats.file_syncs += len(synced)
+            self.stats.dir_syncs += len(synced_dirs)
+
+    @staticmethod
+    def _call(func: Callable[..., None], *args) -> Optional[BaseException]:
+        try:
+            func(*args)
+            return None
+        except Exception as e:
+            return e
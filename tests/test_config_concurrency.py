@@ -0,0 +1,148 @@
+"""
+ConfigManager并发测试：多个设备线程同时添加、使用代币和签到，校验代币余额和签到次数
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config_manager import ConfigManager
+
+WORKERS = 32
+ROUNDS = 50
+BACKENDS = ("json", "sqlite")
+
+
+def run_threads(target, count=WORKERS):
+    """count个线程同时开始执行target(index)"""
+    barrier = threading.Barrier(count)
+
+    def worker(index):
+        barrier.wait()
+        target(index)
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+class ConfigConcurrencyTest(unittest.TestCase):
+
+    @staticmethod
+    def create(tmp_dir, backend, **options):
+        options.setdefault("flush_interval", 0.05)
+        return ConfigManager(os.path.join(tmp_dir, "config.json"), os.path.join(tmp_dir, "stats.json"),
+                             stats_backend=backend, **options)
+
+    def test_coin_totals(self):
+        expire_time = (datetime.now() + timedelta(days=30)).strftime("%Y-%m-%d %H:%M:%S")
+        for backend in BACKENDS:
+            with self.subTest(backend=backend), tempfile.TemporaryDirectory() as tmp_dir:
+                config_manager = self.create(tmp_dir, backend)
+                granted = [0] * WORKERS
+                spent = [0] * WORKERS
+
+                def worker(index):
+                    device_serial = f"device_{index:03d}"
+                    for _ in range(ROUNDS):
+                        config_manager.add_coin(device_serial, 5, expire_time)
+                        granted[index] += 5
+                        if config_manager.use_coins(7, device_serial):
+                            spent[index] += 7
+
+                run_threads(worker)
+                expected = sum(granted) - sum(spent)
+                self.assertEqual(config_manager.get_total_coins(), expected)
+                self.assertEqual(sum(coin["balance"] for coin in config_manager.get_stats()["coins"]), expected)
+                self.assertEqual(config_manager._coin_transactions.count(), WORKERS * ROUNDS + sum(spent) // 7)
+                config_manager.close()
+
+                reloaded = self.create(tmp_dir, backend)
+                self.assertEqual(reloaded.get_total_coins(), expected)
+                reloaded.close()
+
+    def test_sign_in_once_per_day(self):
+        today = datetime.now().strftime("%Y-%m-%d")
+        for backend in BACKENDS:
+            with self.subTest(backend=backend), tempfile.TemporaryDirectory() as tmp_dir:
+                config_manager = self.create(tmp_dir, backend)
+                claims = [0] * WORKERS
+
+                def worker(index):
+                    # 每台设备被4个线程同时签到，多轮签到
+                    device_serial = f"device_{index % 8}"
+                    for _ in range(ROUNDS):
+                        if config_manager.claim_sign_in(device_serial, today):
+                            claims[index] += 1
+                            config_manager.finish_sign_in(device_serial, today, True)
+
+                run_threads(worker)
+                self.assertEqual(sum(claims), 8)
+                config_manager.close()
+
+                reloaded = self.create(tmp_dir, backend)
+                status = reloaded.get_stats()["device_sign_in_status"]
+                self.assertEqual(status, {f"device_{index}": today for index in range(8)})
+                self.assertFalse(reloaded.claim_sign_in("device_0", today))
+                reloaded.close()
+
+    def test_synchronous_flush(self):
+        # flush_interval为0时每次修改同步写入快照，journal_max_bytes很小使每次修改都压缩日志
+        expire_time = (datetime.now() + timedelta(days=30)).strftime("%Y-%m-%d %H:%M:%S")
+        today = datetime.now().strftime("%Y-%m-%d")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            config_manager = self.create(tmp_dir, "json", flush_interval=0, journal_max_bytes=10)
+            claims = [0] * WORKERS
+
+            def worker(index):
+                device_serial = f"device_{index % 8}"
+                for round_index in range(5):
+                    config_manager.add_coin(device_serial, 5, expire_time)
+                    config_manager.update_novel_progress("小说", f"第{index * 5 + round_index}章", device_serial)
+                    if config_manager.claim_sign_in(device_serial, today):
+                        claims[index] += 1
+                        config_manager.finish_sign_in(device_serial, today, True)
+                config_manager.record_sign_in(device_serial, today)
+
+            # 死锁时线程不会结束，用守护线程加超时判定失败
+            runner = threading.Thread(target=run_threads, args=(worker,), daemon=True)
+            runner.start()
+            runner.join(30)
+            self.assertFalse(runner.is_alive(), "同步写入时发生死锁")
+            config_manager.update_stats({"x": 1})
+            self.assertEqual(sum(claims), 8)
+            self.assertEqual(config_manager.get_total_coins(), WORKERS * 5 * 5)
+            config_manager.close()
+
+            reloaded = self.create(tmp_dir, "json")
+            self.assertEqual(reloaded.get_total_coins(), WORKERS * 5 * 5)
+            self.assertEqual(len(reloaded.get_novel_progress("小说")), WORKERS * 5)
+            self.assertEqual(reloaded.get_stats()["x"], 1)
+            reloaded.close()
+
+    def test_failed_sign_in_can_be_retried(self):
+        today = datetime.now().strftime("%Y-%m-%d")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            self._check_retry(self.create(tmp_dir, "json"), today)
+
+    def _check_retry(self, config_manager, today):
+        self.assertTrue(config_manager.claim_sign_in("device_0", today))
+        # 签到进行中，其它调用方不能领取
+        self.assertFalse(config_manager.claim_sign_in("device_0", today))
+        config_manager.finish_sign_in("device_0", today, False)
+        self.assertNotIn("device_0", config_manager.get_stats()["device_sign_in_status"])
+        self.assertTrue(config_manager.claim_sign_in("device_0", today))
+        config_manager.finish_sign_in("device_0", today, True)
+        self.assertFalse(config_manager.claim_sign_in("device_0", today))
+        config_manager.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
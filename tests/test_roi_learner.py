@@ -0,0 +1,80 @@
+"""
+识别区域学习测试：外接矩形、学到的区域的扩展与裁剪、偶然匹配不会让区域一直扩大
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from roi_learner import RoiLearner, union_box
+
+RESOLUTION = "1280x720"
+
+
+class UnionBoxTest(unittest.TestCase):
+
+    def test_none_returns_other(self):
+        self.assertEqual(union_box(None, [10, 20, 30, 40]), (10, 20, 30, 40))
+
+    def test_bounding_box(self):
+        self.assertEqual(union_box((10, 20, 30, 40), (100, 5, 10, 10)), (10, 5, 100, 55))
+
+    def test_contained_box(self):
+        self.assertEqual(union_box((0, 0, 100, 100), (10, 10, 5, 5)), (0, 0, 100, 100))
+
+
+class RoiLearnerTest(unittest.TestCase):
+
+    def test_roi_padding(self):
+        learner = RoiLearner(padding=32)
+        self.assertIsNone(learner.roi(RESOLUTION, "node"))
+        learner.record_fallback(RESOLUTION, "node", (100, 200, 50, 20), learned=False)
+        self.assertEqual(learner.roi(RESOLUTION, "node"), [68, 168, 114, 84])
+
+    def test_roi_clamped_to_screen(self):
+        learner = RoiLearner(padding=32)
+        learner.record_fallback(RESOLUTION, "top_left", (10, 5, 50, 20), learned=False)
+        learner.record_fallback(RESOLUTION, "bottom_right", (1250, 700, 30, 20), learned=False)
+        self.assertEqual(learner.roi(RESOLUTION, "top_left"), [0, 0, 92, 57])
+        self.assertEqual(learner.roi(RESOLUTION, "bottom_right"), [1218, 668, 62, 52])
+
+    def test_ignores_other_nodes(self):
+        learner = RoiLearner(nodes={"node"})
+        learner.record_fallback(RESOLUTION, "other", (100, 200, 50, 20), learned=False)
+        self.assertIsNone(learner.roi(RESOLUTION, "other"))
+
+    def test_stray_match_ages_out(self):
+        learner = RoiLearner(padding=0, history=4)
+        learner.record_fallback(RESOLUTION, "node", (100, 200, 50, 20), learned=False)
+        learner.record_fallback(RESOLUTION, "node", (1000, 600, 50, 20), learned=False)
+        self.assertEqual(learner.roi(RESOLUTION, "node"), [100, 200, 950, 420])
+        for _ in range(4):
+            learner.record_hit(RESOLUTION, "node", (100, 200, 50, 20))
+        self.assertEqual(learner.roi(RESOLUTION, "node"), [100, 200, 50, 20])
+
+    def test_relearns_when_misses_outnumber_hits(self):
+        learner = RoiLearner(padding=0)
+        learner.record_fallback(RESOLUTION, "node", (100, 200, 50, 20), learned=False)
+        learner.record_hit(RESOLUTION, "node", (100, 200, 50, 20))
+        learner.record_fallback(RESOLUTION, "node", (600, 400, 50, 20), learned=True)
+        self.assertEqual(learner.roi(RESOLUTION, "node"), [100, 200, 550, 220])
+        learner.record_fallback(RESOLUTION, "node", (600, 400, 50, 20), learned=True)
+        self.assertEqual(learner.roi(RESOLUTION, "node"), [600, 400, 50, 20])
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            profile_file = os.path.join(tmp_dir, "roi_profiles.json")
+            learner = RoiLearner(profile_file, padding=0)
+            learner.record_fallback(RESOLUTION, "node", (100, 200, 50, 20), learned=False)
+            learner.record_hit(RESOLUTION, "node", (120, 210, 50, 20))
+            learner.save()
+            loaded = RoiLearner(profile_file, padding=0)
+            self.assertEqual(loaded.roi(RESOLUTION, "node"), [100, 200, 70, 30])
+            self.assertEqual(loaded.report(), learner.report())
+
+
+if __name__ == "__main__":
+    unittest.main()
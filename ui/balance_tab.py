@@ -1,17 +1,37 @@
 from PySide6.QtWidgets import (
-    QWidget, QVBoxLayout, QHBoxLayout, QGroupBox, QTextEdit,
-    QTableWidget, QTableWidgetItem, QHeaderView, QLabel
+    QWidget, QVBoxLayout, QHBoxLayout, QGroupBox,
+    QTableWidget, QTableWidgetItem, QHeaderView, QLabel, QPushButton
 )
+from PySide6.QtCore import Signal
+
+
+# 代币流水类型显示名称
+TRANSACTION_TYPE_NAMES = {"grant": "获得", "spend": "使用", "expire": "过期"}
 
 
 class BalanceTabWidget(QWidget):
     """余额Tab控件"""
 
+    # 代币使用记录每页加载的数量
+    TRANSACTION_PAGE_SIZE = 50
+
+    # 代币发生变化（可能由工作线程触发，通过信号切换到UI线程处理）
+    coins_changed = Signal(object, object)
+
     def __init__(self, main_window):
         super().__init__()
         self.main_window = main_window
+        # 设备序列号/代币编号 -> 所在行的首列单元格，用于只更新发生变化的行
+        self.device_items = {}
+        self.coin_items = {}
+        # 代币使用记录的加载状态：已显示的最早、最新流水序号
+        self.oldest_transaction_seq = None
+        self.newest_transaction_seq = -1
         self.init_ui()
 
+        self.coins_changed.connect(self.on_coins_changed)
+        self.main_window.config_manager.add_coin_listener(self.coins_changed.emit)
+
     def init_ui(self):
         """初始化UI"""
         layout = QVBoxLayout(self)
@@ -33,82 +53,161 @@ class BalanceTabWidget(QWidget):
         device_layout = QVBoxLayout()
 
         self.device_balance_table = QTableWidget()
-        self.device_balance_table.setColumnCount(3)
-        self.device_balance_table.setHorizontalHeaderLabels(["设备ID", "余额", "最近过期时间"])
+        self.device_balance_table.setColumnCount(4)
+        self.device_balance_table.setHorizontalHeaderLabels(["设备ID", "余额", "最近过期时间", "过期未使用"])
         self.device_balance_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
         device_layout.addWidget(self.device_balance_table)
 
         device_balance_group.setLayout(device_layout)
         layout.addWidget(device_balance_group)
 
-        # 代币使用记录
+        # 有效代币明细
+        coin_group = QGroupBox("有效代币")
+        coin_layout = QVBoxLayout()
+
+        self.coin_record_table = QTableWidget()
+        self.coin_record_table.setColumnCount(3)
+        self.coin_record_table.setHorizontalHeaderLabels(["过期时间", "设备ID", "余额/总额"])
+        self.coin_record_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        coin_layout.addWidget(self.coin_record_table)
+
+        coin_group.setLayout(coin_layout)
+        layout.addWidget(coin_group)
+
+        # 代币使用记录（分页加载）
         record_group = QGroupBox("代币使用记录")
         record_layout = QVBoxLayout()
 
-        self.coin_record_log = QTextEdit()
-        self.coin_record_log.setReadOnly(True)
-        record_layout.addWidget(self.coin_record_log)
+        self.transaction_table = QTableWidget()
+        self.transaction_table.setColumnCount(6)
+        self.transaction_table.setHorizontalHeaderLabels(["时间", "类型", "设备ID", "数量", "小说", "章节"])
+        self.transaction_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        record_layout.addWidget(self.transaction_table)
+
+        record_btn_layout = QHBoxLayout()
+        self.transaction_count_label = QLabel("共 0 条记录")
+        self.load_more_btn = QPushButton("加载更多")
+        self.load_more_btn.clicked.connect(self.load_more_transactions)
+        record_btn_layout.addWidget(self.transaction_count_label)
+        record_btn_layout.addStretch()
+        record_btn_layout.addWidget(self.load_more_btn)
+        record_layout.addLayout(record_btn_layout)
 
         record_group.setLayout(record_layout)
         layout.addWidget(record_group)
 
     def update_balance_info(self):
-        """更新余额信息"""
-        # 总余额
-        total_coins = self.main_window.config_manager.get_total_coins()
-        self.total_balance_label.setText(f"所有设备代币总余额: {total_coins}")
-
-        # 最近过期时间
-        coins = self.main_window.config_manager.get_stats().get("coins", [])
-        if coins:
-            # 过滤掉余额为0的代币，然后找出最近的过期时间
-            valid_coins = [coin for coin in coins if coin.get("balance", 0) > 0]
-            if valid_coins:
-                nearest_expire = min(valid_coins, key=lambda x: x.get("expire_time", "无"))["expire_time"]
-                self.nearest_expire_label.setText(f"最近过期时间: {nearest_expire}")
-            else:
-                self.nearest_expire_label.setText("最近过期时间: 无")
-        else:
-            self.nearest_expire_label.setText("最近过期时间: 无")
-
-        # 对coins列表按照device_serial进行分组，并计算每个设备的代币总余额和最近的过期时间
-        device_balance = {}
-        device_expire_time = {}
-        
-        for coin in coins:
-            device_serial = coin.get("device_serial", "无")
-            balance = coin.get("balance", 0)
-            expire_time = coin.get("expire_time", "无")
-            
-            # 累加设备余额
-            if device_serial in device_balance:
-                device_balance[device_serial] += balance
-            else:
-                device_balance[device_serial] = balance
-            
-            # 更新设备最近过期时间（选择最早的过期时间）
-            if device_serial in device_expire_time:
-                if expire_time != "无" and (device_expire_time[device_serial] == "无" or expire_time < device_expire_time[device_serial]):
-                    device_expire_time[device_serial] = expire_time
-            else:
-                device_expire_time[device_serial] = expire_time
+        """全量刷新余额信息"""
+        config_manager = self.main_window.config_manager
+        summary = config_manager.get_coin_summary()
+        self.update_total_labels(summary)
 
         # 对设备余额进行排序，先按照过期时间升序、余额降序
-        sorted_devices = sorted(device_balance.items(), key=lambda x: (device_expire_time.get(x[0], "无"), -x[1]))
-        
+        devices = summary["devices"]
+        sorted_devices = sorted(devices.items(), key=lambda x: (x[1]["nearest_expire_time"] or "无", -x[1]["balance"]))
+
         # 更新设备余额列表
-        self.device_balance_table.setRowCount(len(sorted_devices))
-        for i, (device_serial, balance) in enumerate(sorted_devices):
-            self.device_balance_table.setItem(i, 0, QTableWidgetItem(device_serial))
-            self.device_balance_table.setItem(i, 1, QTableWidgetItem(str(balance)))
-            expire_time = device_expire_time.get(device_serial, "无")
-            self.device_balance_table.setItem(i, 2, QTableWidgetItem(expire_time))
-
-        # 更新代币使用记录
-        self.coin_record_log.clear()
-        # 显示所有代币记录，按过期时间排序
-        sorted_coins = sorted(coins, key=lambda x: x.get("expire_time", "无"))
-        for coin in sorted_coins:
-            if coin.get("balance", 0) > 0:  # 只显示余额大于0的代币
-                record = f"[{coin.get('expire_time', '无')}] 设备 {coin.get('device_serial', '无')} 余额: {coin.get('balance', 0)}/{coin.get('amount', 0)}"
-                self.coin_record_log.append(record)
+        self.device_balance_table.setRowCount(0)
+        self.device_items = {}
+        for device_serial, device_summary in sorted_devices:
+            self.update_device_row(device_serial, device_summary)
+
+        # 更新代币使用记录，显示所有有余额的代币，按过期时间排序
+        coins = config_manager.get_stats().get("coins", [])
+        self.coin_record_table.setRowCount(0)
+        self.coin_items = {}
+        for coin in sorted(coins, key=lambda x: x.get("expire_time", "无")):
+            self.update_coin_row(coin["id"], coin)
+
+        # 代币使用记录重新从第一页加载
+        self.transaction_table.setRowCount(0)
+        self.oldest_transaction_seq = None
+        self.newest_transaction_seq = -1
+        self.load_more_transactions()
+
+    def on_coins_changed(self, devices, coin_ids):
+        """代币发生变化时，只更新发生变化的设备和代币所在的行"""
+        config_manager = self.main_window.config_manager
+        summary = config_manager.get_coin_summary(devices)
+        self.update_total_labels(summary)
+        for device_serial, device_summary in summary["devices"].items():
+            self.update_device_row(device_serial, device_summary)
+        for coin_id in coin_ids:
+            self.update_coin_row(coin_id, config_manager.get_coin(coin_id))
+
+        # 新增的流水插入到表格顶部
+        new_transactions = config_manager.get_coin_transactions_after(self.newest_transaction_seq)
+        for row, transaction in enumerate(new_transactions):
+            self.insert_transaction_row(row, transaction)
+        if new_transactions:
+            self.newest_transaction_seq = new_transactions[0]["seq"]
+            self.update_transaction_count()
+
+    def load_more_transactions(self):
+        """加载下一页（更早的）代币使用记录"""
+        config_manager = self.main_window.config_manager
+        transactions, total = config_manager.query_coin_transactions(
+            page_size=self.TRANSACTION_PAGE_SIZE, before_seq=self.oldest_transaction_seq)
+        for transaction in transactions:
+            self.insert_transaction_row(self.transaction_table.rowCount(), transaction)
+        if transactions:
+            self.oldest_transaction_seq = transactions[-1]["seq"]
+            self.newest_transaction_seq = max(self.newest_transaction_seq, transactions[0]["seq"])
+        # 剩余未加载的数量即为total，加上已显示的数量为总数
+        self.update_transaction_count(total - len(transactions) + self.transaction_table.rowCount())
+
+    def insert_transaction_row(self, row, transaction):
+        """在指定位置插入一条代币使用记录"""
+        self.transaction_table.insertRow(row)
+        time_item = QTableWidgetItem(transaction.get("timestamp", ""))
+        type_name = TRANSACTION_TYPE_NAMES.get(transaction.get("type"), transaction.get("type", ""))
+        self.transaction_table.setItem(row, 0, time_item)
+        self.transaction_table.setItem(row, 1, QTableWidgetItem(type_name))
+        self.transaction_table.setItem(row, 2, QTableWidgetItem(transaction.get("device_serial") or "无"))
+        self.transaction_table.setItem(row, 3, QTableWidgetItem(str(transaction.get("amount", 0))))
+        self.transaction_table.setItem(row, 4, QTableWidgetItem(transaction.get("novel_name") or ""))
+        self.transaction_table.setItem(row, 5, QTableWidgetItem(transaction.get("chapter") or ""))
+
+    def update_transaction_count(self, total=None):
+        """更新记录数量和加载更多按钮状态"""
+        if total is None:
+            total = self.newest_transaction_seq + 1
+        self.transaction_count_label.setText(f"共 {total} 条记录，已加载 {self.transaction_table.rowCount()} 条")
+        self.load_more_btn.setEnabled(self.transaction_table.rowCount() < total)
+
+    def update_total_labels(self, summary):
+        """更新总余额和最近过期时间"""
+        self.total_balance_label.setText(f"所有设备代币总余额: {summary['total']}")
+        self.nearest_expire_label.setText(f"最近过期时间: {summary['nearest_expire_time'] or '无'}")
+
+    def update_device_row(self, device_serial, device_summary):
+        """更新（或添加）设备余额行"""
+        item = self.device_items.get(device_serial)
+        if item is None:
+            row = self.device_balance_table.rowCount()
+            self.device_balance_table.insertRow(row)
+            item = QTableWidgetItem(device_serial)
+            self.device_balance_table.setItem(row, 0, item)
+            self.device_items[device_serial] = item
+        row = item.row()
+        self.device_balance_table.setItem(row, 1, QTableWidgetItem(str(device_summary["balance"])))
+        self.device_balance_table.setItem(row, 2, QTableWidgetItem(device_summary["nearest_expire_time"] or "无"))
+        self.device_balance_table.setItem(row, 3, QTableWidgetItem(str(device_summary["expired_unused"])))
+
+    def update_coin_row(self, coin_id, coin):
+        """更新（或添加、删除）代币行，coin为None表示代币已用尽或已过期"""
+        item = self.coin_items.get(coin_id)
+        if coin is None:
+            if item is not None:
+                self.coin_record_table.removeRow(item.row())
+                del self.coin_items[coin_id]
+            return
+        if item is None:
+            row = self.coin_record_table.rowCount()
+            self.coin_record_table.insertRow(row)
+            item = QTableWidgetItem(coin.get("expire_time", "无"))
+            self.coin_record_table.setItem(row, 0, item)
+            self.coin_items[coin_id] = item
+        row = item.row()
+        self.coin_record_table.setItem(row, 1, QTableWidgetItem(coin.get("device_serial", "无")))
+        self.coin_record_table.setItem(row, 2, QTableWidgetItem(f"{coin.get('balance', 0)}/{coin.get('amount', 0)}"))